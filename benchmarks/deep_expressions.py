@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Compile a single expression made of increasingly long `x * y + ...` chains, i.e. BinOp trees as deep as they are long
+
+Time per term should stay flat as depth grows, and no depth should raise RecursionError.
+
+    python benchmarks/deep_expressions.py [--terms 1000 10000 40000] [--target sbs]
+"""
+
+import sys
+import time
+import argparse
+
+from py2xyz.pipeline import compile_source
+
+def make_source(terms):
+    expression = ' + '.join([ 'x * y' ] * terms)
+    return f'def f(x: float, y: float):\n    z = {expression}\n    return z\n'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--terms', type=int, nargs='+', default=[ 1000, 10000, 40000 ], help='Chain lengths (default: %(default)s)')
+    parser.add_argument('--target', choices=[ 'sbs' ], help='Lower down to the SBS tree, codegen excluded (default: IR only)')
+    arguments = parser.parse_args(argv)
+
+    for terms in arguments.terms:
+        source = make_source(terms)
+        started = time.perf_counter()
+        compile_source(source, target=arguments.target)
+        elapsed = time.perf_counter() - started
+        print(f'{terms: >8} terms : {elapsed * 1000: >10.1f} ms, {elapsed / terms * 1e6: >6.1f} us/term')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
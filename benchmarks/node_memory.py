@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Memory footprint of IR and SBS trees of a single ~100k-node function
+
+Reports retained bytes per node (tracemalloc), a full garbage collection time with the trees alive, and the peak RSS of a
+process compiling the function down to the SBS tree.
+
+    python benchmarks/node_memory.py [--terms N]
+"""
+
+import gc
+import sys
+import time
+import argparse
+import resource
+import subprocess
+import tracemalloc
+
+def make_source(terms):
+    expression = ' + '.join([ 'x * y' ] * terms)
+    return f'def f(x: float, y: float):\n    z = {expression}\n    return z\n'
+
+def measure(terms):
+    from py2xyz.pipeline import parse, default_pass_managers
+    from py2xyz.profiling import count_nodes
+    from py2xyz.ir.compiler import ModuleTranspiler
+    from py2xyz.sbs.compiler import PackageTranspiler
+
+    pass_managers = default_pass_managers()
+    ast_source = parse(make_source(terms))
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    ast_ir = ModuleTranspiler().visit(ast_source)
+    ir_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    ast_ir = pass_managers.ir_post.run(ast_ir)
+    ast_ir = pass_managers.sbs_pre.run(ast_ir)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    ast_sbs = PackageTranspiler().visit(ast_ir)
+    sbs_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    gc.collect()
+    gc_time = time.perf_counter() - started
+
+    ir_nodes = count_nodes(ast_ir)
+    sbs_nodes = count_nodes(ast_sbs)
+    print(f'IR  : {ir_nodes: >8} nodes, {ir_bytes / ir_nodes: >6.1f} bytes/node')
+    print(f'SBS : {sbs_nodes: >8} nodes, {sbs_bytes / sbs_nodes: >6.1f} bytes/node')
+    print(f'gc.collect() with both trees alive : {gc_time * 1000:.1f} ms')
+    print(f'peak RSS : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--terms', type=int, default=25000, help='Number of `x * y` terms, about 4 IR nodes each (default: %(default)s)')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.measure:
+        measure(arguments.terms)
+        return 0
+
+    # NOTE measured in a fresh process, so peak RSS only accounts for this compilation
+    return subprocess.call([ sys.executable, __file__, '--measure', '--terms', str(arguments.terms) ])
+
+if __name__ == '__main__':
+    sys.exit(main())
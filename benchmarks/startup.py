@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Measure py2sbs CLI startup : import time of each module through `python -X importtime`, and wall time of an IR-only run
+
+    python benchmarks/startup.py [--runs N] [--target sbs] [--top N]
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+from pathlib import Path
+
+SOURCE = '''
+def add(x: float, y: float) -> float:
+    return x + y
+'''
+
+# NOTE modules loaded through importlib.import_module (i.e. backends) are not reported by -X importtime, only what they import
+HEAVY_MODULES = (
+    'pysbs.context',
+    'pysbs.sbsgenerator',
+    'pysbs.autograph.ag_layout',
+)
+
+def command(source_path, target=None):
+    argv = [ sys.executable, '-X', 'importtime', '-m', 'py2xyz.cli', str(source_path), '--no-cache' ]
+    if target:
+        argv += [ '--target', target, '--output', str(source_path.with_suffix('.sbs')) ]
+    return argv
+
+def parse_importtime(stderr):
+    """{ module: (self µs, cumulative µs) } out of `-X importtime` lines"""
+    timings = { }
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        timings[module.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Number of CLI runs (default: %(default)s)')
+    parser.add_argument('--target', choices=[ 'sbs' ], help='Benchmark this target instead of an IR-only run')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to list (default: %(default)s)')
+    arguments = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='py2sbs-startup-') as folder:
+        source_path = Path(folder) / 'add.py'
+        source_path.write_text(SOURCE, encoding='utf-8')
+
+        walls = []
+        timings = None
+        for _ in range(arguments.runs):
+            started = time.perf_counter()
+            process = subprocess.run(command(source_path, arguments.target), capture_output=True, text=True)
+            walls.append(time.perf_counter() - started)
+            timings = parse_importtime(process.stderr)
+
+    total_us = sum(self_us for self_us, _ in timings.values())
+    print(f'wall time over {arguments.runs} runs : median {statistics.median(walls) * 1000:.1f} ms, min {min(walls) * 1000:.1f} ms')
+    print(f'total import time : {total_us / 1000:.1f} ms')
+    for module in HEAVY_MODULES:
+        status = f'{timings[module][1] / 1000:.1f} ms' if module in timings else 'not imported'
+        print(f'  {module: <28} {status}')
+
+    print(f'slowest imports (cumulative) :')
+    for module, (self_us, cumulative_us) in sorted(timings.items(), key=lambda _: -_[1][1])[:arguments.top]:
+        print(f'  {cumulative_us / 1000: >8.1f} ms {self_us / 1000: >8.1f} ms  {module}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
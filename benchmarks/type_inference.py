@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Measure parameter type inference over generated functions with a growing number of untyped parameters
+
+Reports the overloads found, the time `py2xyz.sbs.analysis.infer_argument_types` takes, the constraint revisions it
+made and the size of the cartesian product of parameter types an enumeration of every combination would examine.
+
+    python benchmarks/type_inference.py [--parameters N,N,...] [--repeat N]
+"""
+
+import ast
+import sys
+import time
+import argparse
+
+from py2xyz.ir.ast import ANY_NUMERICAL_TYPES
+from py2xyz.ir.compiler import ModuleTranspiler
+from py2xyz.sbs.analysis import ArgumentTypeInference
+
+OPERATORS = ( '+', '*', '-', '/' )
+
+def make_source(parameters):
+    names = [ f'x{_}' for _ in range(parameters) ]
+    expression = names[0]
+    for idx, name in enumerate(names[1:]):
+        expression = f'{expression} {OPERATORS[idx % len(OPERATORS)]} {name}'
+    return '\n'.join([
+        f'def function({", ".join(names)}):',
+        f'    return {expression}',
+    ])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parameters', default='2,4,8,12,16', help='Comma separated numbers of untyped parameters (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs, the best one is reported (default: %(default)s)')
+    arguments = parser.parse_args(argv)
+
+    for parameters in map(int, arguments.parameters.split(',')):
+        function = ModuleTranspiler().visit(ast.parse(make_source(parameters))).content[0]
+
+        timings = []
+        for _ in range(arguments.repeat):
+            started = time.perf_counter()
+            inference = ArgumentTypeInference(function)
+            overloads = inference.overloads()
+            timings.append(time.perf_counter() - started)
+
+        # NOTE the product size is computed, not enumerated
+        product = len(ANY_NUMERICAL_TYPES) ** parameters
+        best = min(timings)
+        print(f'{parameters:>2} parameters : {len(overloads)} overloads in {best * 1000:.2f} ms, {inference.solver.revisions} revisions, {product} combinations in the product')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
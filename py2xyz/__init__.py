@@ -5,9 +5,14 @@ __version__     = '0.0.0'
 __author__      = 'Andréa Machizaud'
 
 import ast
+import logging
+
+from py2xyz.slotted import NODE_TYPES
+from py2xyz.traversal import trampoline
 
 # inspired by https://bitbucket.org/takluyver/greentreesnakes/src/default/astpp.py
 def dump(node, annotate_fields=True, include_attributes=False, indent='  ', depth=None):
+    # NOTE formatters are generators yielding the (subnode, depth) they need formatted, so deep trees do not recurse
     def _format(node, _depth, _max_depth=None):
         if (_max_depth is not None) and (_depth > _max_depth):
             return '<...>'
@@ -15,20 +20,14 @@ def dump(node, annotate_fields=True, include_attributes=False, indent='  ', dept
         _next_depth = _depth + 1
         _indent     = indent * (_depth - 1)
         _subindent  = indent * _depth
-        if isinstance(node, ast.AST):
-            formatted_fields = [
-                (name, _format(value, _depth=_next_depth, _max_depth=_max_depth))
-                for name, value in ast.iter_fields(node)
-            ]
+        if isinstance(node, NODE_TYPES):
+            formatted_fields = []
+            for name, value in ast.iter_fields(node):
+                formatted_fields.append((name, (yield (value, _next_depth))))
 
             if include_attributes and node._attributes:
-                formatted_fields.extend([
-                    (
-                        attributename,
-                        _format(getattr(node, attributename), _depth=_next_depth, _max_depth=_max_depth)
-                    )
-                    for attributename in node._attributes
-                ])
+                for attributename in node._attributes:
+                    formatted_fields.append((attributename, (yield (getattr(node, attributename), _next_depth))))
 
 
             if annotate_fields:
@@ -40,10 +39,8 @@ def dump(node, annotate_fields=True, include_attributes=False, indent='  ', dept
             nodes = node
 
             formatted_nodes = [ '[' ]
-            formatted_nodes.extend(
-                f'{_subindent}{_format(subnode, _depth=_next_depth, _max_depth=_max_depth)},'
-                for subnode in nodes
-            )
+            for subnode in nodes:
+                formatted_nodes.append(f'{_subindent}{(yield (subnode, _next_depth))},')
 
             if len(formatted_nodes) > 1:
                 formatted_nodes.append(f'{_indent}]')
@@ -54,10 +51,61 @@ def dump(node, annotate_fields=True, include_attributes=False, indent='  ', dept
         else:
             return repr(node)
 
-    if not isinstance(node, ast.AST):
+    if not isinstance(node, NODE_TYPES):
         raise TypeError('expected AST, got %r' % node.__class__.__name__)
 
-    return _format(node, _depth=1, _max_depth=depth)
+    def _format_step(request):
+        subnode, _depth = request
+        return _format(subnode, _depth, _max_depth=depth)
+
+    return trampoline(_format_step((node, 1)), _format_step)
+
+DUMP_STAGES = (
+    'py',
+    'ir',
+    'sbs',
+)
+
+_dump_depth = None
+
+class LazyDump:
+    """Defer `dump(node)` until the log record holding it is formatted, i.e. only if its logger and level are enabled
+
+    Without an explicit `depth`, the one given to `configure_dumps` applies.
+    """
+    __slots__ = ('node', 'kwargs')
+
+    def __init__(self, node, **kwargs):
+        self.node = node
+        self.kwargs = kwargs
+
+    def __str__(self):
+        kwargs = self.kwargs
+        if 'depth' not in kwargs:
+            kwargs = dict(kwargs, depth=_dump_depth)
+        return dump(self.node, **kwargs)
+
+class LazyFormat:
+    """Defer `formatter(*args)` until the log record holding it is formatted"""
+    __slots__ = ('formatter', 'args')
+
+    def __init__(self, formatter, *args):
+        self.formatter = formatter
+        self.args = args
+
+    def __str__(self):
+        return str(self.formatter(*self.args))
+
+def dump_logger(stage):
+    """Logger receiving the whole tree of `stage` after each pass, disabled unless opted-in through `configure_dumps`"""
+    return logging.getLogger(f'{__name__}.dump.{stage}')
+
+def configure_dumps(stages=(), depth=None):
+    global _dump_depth
+    _dump_depth = depth
+
+    for stage in DUMP_STAGES:
+        dump_logger(stage).setLevel(logging.DEBUG if stage in stages else logging.WARNING)
 
 class TranspilerError(RuntimeError):
     def __init__(self, msg=None, node=None):
@@ -71,3 +119,10 @@ class TranspilerError(RuntimeError):
             super().__init__()
 
         self.node = node
+
+def __getattr__(name):
+    # NOTE the compile API imports the whole pipeline, which imports this package : resolve it on first access
+    if name in ('compile_source', 'compile_many', 'CompiledSource'):
+        from py2xyz import api
+        return getattr(api, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
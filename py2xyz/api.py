@@ -0,0 +1,94 @@
+import logging
+import traceback
+import collections
+import collections.abc
+
+logger = logging.getLogger(__name__)
+
+from py2xyz.pipeline import (
+    PassManagers,
+    default_pass_managers,
+    generate_package_bytes,
+    compile_source as compile_pipeline,
+)
+
+OUTPUTS = (
+    'ast',
+    'package',
+)
+
+class CompiledSource(collections.namedtuple('CompiledSource', ['filename', 'result', 'error'])):
+    pass
+
+def compile_source(source, target='sbs', output='ast', filename='<string>', passes=None, cache=None, profiler=None, function_jobs=None, options=None):
+    """Compile `source` text, raise on invalid DSL or transpilation failure
+
+    `target` : None for the IR module, 'sbs' for the Substance package
+    `output` : 'ast' returns the tree of `target`, 'package' the serialized Substance package bytes, written to a
+               temporary file by pysbs then read back, see py2xyz.pipeline.generate_package_bytes
+    `passes` : regex patterns selecting passes, or a PassManagers (see py2xyz.pipeline.make_pass_managers)
+    `function_jobs` : number of worker processes lowering top-level functions, see py2xyz.pipeline.lower_functions
+    `options` : pass options by name, e.g. { 'unroll_budget': 8192 }, see py2xyz.pipeline.make_pass_managers
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f'Unknown output {output!r}, expected one of {", ".join(OUTPUTS)}')
+    if (output == 'package') and (target != 'sbs'):
+        raise ValueError(f'Package output requires the sbs target')
+
+    if isinstance(passes, PassManagers):
+        # NOTE custom pass managers cannot be described by a cache key
+        pass_managers, passes, cache = passes, None, None
+    else:
+        # NOTE API users compile many sources in one process, where memoized passes pay off
+        pass_managers = default_pass_managers(passes, options, memoize=True)
+
+    node = compile_pipeline(
+        source,
+        filename=filename,
+        target=target,
+        passes=passes,
+        cache=cache,
+        profiler=profiler,
+        pass_managers=pass_managers,
+        function_jobs=function_jobs,
+        options=options,
+    )
+    if output == 'ast':
+        return node
+
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(source, passes=passes, target=target, options=options)
+        package = cache.get_bytes(cache_key, 'package')
+        if package is not None:
+            return package
+
+    package = generate_package_bytes(node)
+    if (cache_key is not None) and (package is not None):
+        cache.put_bytes(cache_key, 'package', package)
+    return package
+
+def compile_many(sources, target='sbs', output='ast', passes=None, cache=None, profiler=None, raise_on_error=False, options=None):
+    """Compile `(filename, source)` pairs, or a `{ filename: source }` mapping, one after the other in this process
+
+    Pass managers are shared by every source. Return CompiledSource in input order, the `error` of sources that failed
+    holding their formatted traceback, unless `raise_on_error` is set.
+    """
+    if isinstance(sources, collections.abc.Mapping):
+        sources = sources.items()
+
+    results = []
+    for filename, source in sources:
+        try:
+            result = compile_source(source, target=target, output=output, filename=filename, passes=passes, cache=cache, profiler=profiler, options=options)
+        except (ValueError, SyntaxError):
+            if raise_on_error:
+                raise
+            results.append(CompiledSource(filename, None, f'Invalid DSL : {traceback.format_exc()}'))
+        except Exception:
+            if raise_on_error:
+                raise
+            results.append(CompiledSource(filename, None, f'Transpilation Failure : {traceback.format_exc()}'))
+        else:
+            results.append(CompiledSource(filename, result, None))
+    return results
@@ -0,0 +1,173 @@
+import os
+import pickle
+import hashlib
+import functools
+import logging
+import tempfile
+
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+from py2xyz import __version__ as moduleversion
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# entries stored between two scans of the cache folder, entries stored by other processes are only seen by a scan
+SCAN_PERIOD = 64
+
+PACKAGE_FOLDER = Path(__file__).parent
+
+@functools.lru_cache(maxsize=None)
+def package_digest(folder=PACKAGE_FOLDER):
+    """Digest of the package sources, so that cache entries do not outlive the passes which produced them"""
+    digest = hashlib.sha256()
+    for path in sorted(Path(folder).rglob('*.py')):
+        digest.update(path.relative_to(folder).as_posix().encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(path.read_bytes())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class CompilationCache:
+    """On-disk content-addressed cache of compilation stages
+
+    Entries are stored as `<folder>/<key[:2]>/<key>.<stage>`, the modification time of an entry is refreshed on every hit
+    so the least recently used entries are evicted first once `max_size` bytes are exceeded. The total size is tracked
+    as entries are stored, the folder is only scanned when it exceeds `max_size` or every SCAN_PERIOD stores.
+    """
+
+    def __init__(self, folder, max_size=DEFAULT_MAX_SIZE):
+        self.folder = Path(folder)
+        self.max_size = max_size
+        # NOTE None until the first scan
+        self.size = None
+        self.stores = 0
+
+    @staticmethod
+    def make_key(source, passes=None, target=None, version=None, options=None):
+        """Key of `source` compiled with `passes`, `target` and `options`, `version` defaults to the package version and sources digest"""
+        digest = hashlib.sha256()
+        for chunk in (
+            version or f'{moduleversion}+{package_digest()}',
+            target or '',
+            '\0'.join(sorted(passes or ())),
+            '\0'.join(f'{name}={value!r}' for name, value in sorted((options or {}).items())),
+            source,
+        ):
+            digest.update(chunk.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path(self, key, stage):
+        return self.folder / key[:2] / f'{key}.{stage}'
+
+    def get_bytes(self, key, stage):
+        path = self.path(key, stage)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            logger.debug(f'cache miss {key}.{stage}')
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        logger.debug(f'cache hit {key}.{stage}')
+        return data
+
+    def put_bytes(self, key, stage, data):
+        path = self.path(key, stage)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            replaced_size = path.stat().st_size
+        except OSError:
+            replaced_size = 0
+
+        # NOTE write then rename, so concurrent readers (i.e. batch workers) never observe partial entries
+        fd, temppath = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(data)
+            os.replace(temppath, path)
+        except OSError:
+            logger.warning(f'cannot write cache entry {path}', exc_info=True)
+            try:
+                os.remove(temppath)
+            except OSError:
+                pass
+            return
+
+        logger.debug(f'cache store {key}.{stage} ({len(data)} bytes)')
+        self.stores += 1
+        if self.size is not None:
+            self.size += len(data) - replaced_size
+        if (self.size is None) or (self.size > self.max_size) or (self.stores % SCAN_PERIOD == 0):
+            self.evict()
+
+    def get(self, key, stage):
+        data = self.get_bytes(key, stage)
+        if data is None:
+            return None
+
+        try:
+            return pickle.loads(data)
+        except Exception:
+            logger.warning(f'corrupted cache entry {key}.{stage}, discarding it', exc_info=True)
+            self.discard(key, stage)
+            return None
+
+    def put(self, key, stage, node):
+        try:
+            data = pickle.dumps(node, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            logger.warning(f'cannot serialize {stage} stage, skipping cache store', exc_info=True)
+            return
+
+        self.put_bytes(key, stage, data)
+
+    def discard(self, key, stage):
+        path = self.path(key, stage)
+        try:
+            size = path.stat().st_size
+            os.remove(path)
+        except OSError:
+            return
+        if self.size is not None:
+            self.size -= size
+
+    def evict(self):
+        """Scan the folder for its total size, remove the least recently used entries beyond `max_size`"""
+        entries = []
+        for path in self.folder.glob('*/*'):
+            if path.name.startswith('.'):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = self.size = sum(size for _, size, _ in entries)
+        if total_size <= self.max_size:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            logger.debug(f'cache evict {path.name}')
+            total_size = self.size = total_size - size
+            if total_size <= self.max_size:
+                break
+
+    def clear(self):
+        for path in self.folder.glob('*/*'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.size = None
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
-import re
-import ast
+import os
+import glob
+import time
 import logging
 import logging.config
 import argparse
-import tempfile
+import itertools
 import traceback
+import collections
+import concurrent.futures
 
 from pathlib import Path
 
@@ -16,44 +19,256 @@ from py2xyz import (
     __name__ as modulename,
     __version__ as moduleversion,
     __doc__ as moduledoc,
-    dump,
+    DUMP_STAGES,
+    configure_dumps,
 )
 
 from py2xyz import TranspilerError
 
-from py2xyz.ir.compiler import ModuleTranspiler as IRModuleTranspiler
+from py2xyz.pipeline import (
+    compile_source,
+    load_backend,
+)
+
+from py2xyz.ir.passes import UnrollLoops
 
-from py2xyz.ir.passes import (
-    DEFAULT_PRE_PASSES as DEFAULT_IR_PRE_PASSES,
-    DEFAULT_POST_PASSES as DEFAULT_IR_POST_PASSES,
+from py2xyz.watch import (
+    watch,
+    DEFAULT_POLL_INTERVAL as DEFAULT_WATCH_INTERVAL,
 )
 
-from py2xyz.py.passes import (
-    DEFAULT_PRE_PASSES as DEFAULT_PY_PRE_PASSES,
-    DEFAULT_POST_PASSES as DEFAULT_PY_POST_PASSES,
+from py2xyz.profiling import (
+    Profiler,
+    to_json as profile_to_json,
+    format_table as profile_format_table,
 )
 
-from py2xyz.sbs.passes import (
-    DEFAULT_PRE_PASSES as DEFAULT_SBS_PRE_PASSES,
-    DEFAULT_POST_PASSES as DEFAULT_SBS_POST_PASSES,
+from py2xyz.cache import (
+    CompilationCache,
+    DEFAULT_MAX_SIZE as DEFAULT_CACHE_MAX_SIZE,
 )
 
-from py2xyz.sbs.compiler import (
-    PackageTranspiler as SubstancePackageTranspiler,
+SETTINGS_FOLDER = Path.home() / f'.{modulename}' / moduleversion
+
+CACHE_FOLDER = SETTINGS_FOLDER / 'cache'
+
+# NOTE reported as a failure of the source, in batch and single file modes alike : back-ends raise NotImplementedError on
+# unsupported constructs, any other exception is a compiler bug, which propagates in single file mode and is reported as
+# an internal error of its file in batch mode
+TRANSPILATION_ERRORS = (
+    TranspilerError,
+    NotImplementedError,
 )
 
-from py2xyz.sbs.codegen import (
-    PackageGenerator as SubstancePackageGenerator,
+SOURCE_EXTENSIONS = (
+    '.py',
 )
 
-SETTINGS_FOLDER = Path.home() / f'.{modulename}' / moduleversion
+TARGET_EXTENSIONS = {
+    'sbs': '.sbs',
+}
+
+LOGGING_CONFIG = {
+    'version': 1,
+    'formatters': {
+        'debug': {
+            'format' : '[{levelname: >5}][{filename}:{lineno: >3}] {message}',
+            'datefmt': None,
+            'style'  : '{',
+        },
+        'brief': {
+            'format' : '[{name}] {message}',
+            'datefmt': None,
+            'style'  : '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'brief',
+            'stream': 'ext://sys.stdout',
+        },
+        'console_debug': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'debug',
+            'stream': 'ext://sys.stdout',
+        },
+        # 'file': {
+        #     'class': 'logging.handlers.RotatingFileHandler',
+        #     'formatter': 'debug',
+        #     'filename': Path('scanbox.log'),
+        #     'maxBytes': 1024*1024*1024*1024,
+        #     'backupCount': 5,
+        #     'encoding': 'utf-8',
+        # },
+        'null': {
+            'class': 'logging.NullHandler',
+        }
+    },
+    'loggers': {
+        '__main__': {
+            'level': 'DEBUG',
+            'handlers': [
+                'console',
+            ],
+        },
+        'py2xyz': {
+            'level': 'INFO',
+            'handlers': [
+                'console_debug',
+            ],
+        },
+        'py2xyz.dump': {
+            'level': 'WARNING',
+        },
+        'py2xyz.sbs.analysis': {
+            'level': 'DEBUG',
+            'handlers': [
+                'null',
+            ],
+            'propagate': False
+        },
+    },
+}
+
+def _parse_dump_stages(value):
+    stages = { _.strip() for _ in value.split(',') if _.strip() }
+    unknown_stages = stages - set(DUMP_STAGES)
+    if unknown_stages:
+        raise argparse.ArgumentTypeError(f'unknown stages {", ".join(sorted(unknown_stages))}, expected a subset of {",".join(DUMP_STAGES)}')
+    return stages
+
+class CompilationResult(collections.namedtuple('CompilationResult', ['source', 'output', 'status', 'elapsed', 'error', 'profile'])):
+    pass
+
+def compile_file(source_path, target=None, output_path=None, passes=None, cache=None, profile=False, function_jobs=None, options=None, trace_memory=False):
+    """Batch worker : compile one file, report invalid DSL and transpilation failures as its status"""
+    profiler = Profiler(source=source_path, trace_memory=trace_memory) if profile else None
+    records = profiler.records if profiler else None
+
+    started = time.perf_counter()
+    try:
+        with open(source_path, 'rt', encoding='utf-8') as source_file:
+            source = source_file.read()
 
-def main():
+        compile_source(source, filename=str(source_path), target=target, output=output_path, passes=passes, cache=cache, profiler=profiler, function_jobs=function_jobs, options=options)
+    except (ValueError, SyntaxError):
+        return CompilationResult(source_path, output_path, -1, time.perf_counter() - started, f'Invalid DSL : {traceback.format_exc()}', records)
+    except TRANSPILATION_ERRORS:
+        return CompilationResult(source_path, output_path, -1, time.perf_counter() - started, f'Transpilation Failure : {traceback.format_exc()}', records)
+    else:
+        return CompilationResult(source_path, output_path, 0, time.perf_counter() - started, None, records)
+
+def report_profile(records, profile_output=None):
+    logger.info(f'profile\n{profile_format_table(records)}')
+    if profile_output:
+        Path(profile_output).write_text(profile_to_json(records), encoding='utf-8')
+        logger.info(f'profile report written to {profile_output}')
+
+def iterate_source_files(sources):
+    """Expand files, directories and glob patterns into (source, root) pairs, root being the folder outputs are relative to"""
+    seen = set()
+    for source in sources:
+        if glob.has_magic(source):
+            root = Path(*itertools.takewhile(lambda _: not glob.has_magic(_), Path(source).parts))
+            paths = sorted(Path(_) for _ in glob.iglob(source, recursive=True))
+        elif Path(source).is_dir():
+            root = Path(source)
+            paths = sorted(
+                path
+                for extension in SOURCE_EXTENSIONS
+                for path in root.rglob(f'*{extension}')
+            )
+        else:
+            root = Path(source).parent
+            paths = [ Path(source) ]
+
+        for path in paths:
+            if not path.is_file() or path.suffix not in SOURCE_EXTENSIONS:
+                continue
+            if path.resolve() in seen:
+                continue
+            seen.add(path.resolve())
+            yield path, root
+
+def _initialize_worker(verbose=False, dump=(), dump_depth=None):
+    logging.config.dictConfig(LOGGING_CONFIG)
+    if verbose:
+        logging.getLogger(modulename).setLevel(logging.DEBUG)
+    configure_dumps(dump, depth=dump_depth)
+
+def compile_batch(sources, target=None, output_dir=None, passes=None, jobs=None, function_jobs=None, cache=None, verbose=False, dump=(), dump_depth=None, profile=False, profile_output=None, options=None, trace_memory=False):
+    jobs = jobs or os.cpu_count() or 1
+
+    workload = []
+    for source_path, root in iterate_source_files(sources):
+        output_path = None
+        if target:
+            if output_dir:
+                output_path = Path(output_dir) / source_path.relative_to(root)
+            else:
+                output_path = source_path
+            output_path = output_path.with_suffix(TARGET_EXTENSIONS[target])
+        workload.append((source_path, output_path))
+
+    if not workload:
+        logger.error(f'no source file found in {sources}')
+        return 1
+
+    logger.info(f'compiling {len(workload)} files with {jobs} workers')
+
+    started = time.perf_counter()
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_initialize_worker,
+        initargs=(verbose, dump, dump_depth),
+    ) as executor:
+        futures = {
+            executor.submit(compile_file, source_path, target, output_path, passes, cache, profile, function_jobs, options, trace_memory): (source_path, output_path)
+            for source_path, output_path in workload
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                # NOTE a compiler bug on one file, or a crashed worker, must not cost the report of the others
+                source_path, output_path = futures[future]
+                result = CompilationResult(source_path, output_path, -1, None, f'Internal Error : {traceback.format_exc()}', [] if profile else None)
+            if result.status != 0:
+                logger.error(f'{result.source} : {result.error}')
+            results.append(result)
+    elapsed = time.perf_counter() - started
+
+    failures = [ _ for _ in results if _.status != 0 ]
+
+    logger.info(f'summary')
+    for result in sorted(results, key=lambda _: str(_.source)):
+        status = 'ok' if result.status == 0 else 'FAILED'
+        output = f' -> {result.output}' if result.output else ''
+        # NOTE unknown for internal errors, raised from the worker
+        duration = '-' if result.elapsed is None else f'{result.elapsed:.3f}s'
+        logger.info(f'  [{status: >6}] {duration: >9} {result.source}{output}')
+    logger.info(
+        f'{len(results)} files in {elapsed:.3f}s ({len(results) / elapsed:.2f} files/s), '
+        f'{len(results) - len(failures)} succeeded, {len(failures)} failed'
+    )
+
+    if profile:
+        report_profile(
+            [ record for result in results for record in result.profile ],
+            profile_output,
+        )
+
+    return -1 if failures else 0
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description=moduledoc)
     parser.add_argument(
-        'source_file',
-        type=argparse.FileType('rt', encoding='utf-8'),
-        help='source filepath to process (supported extensions: .py)',
+        'sources',
+        nargs='+',
+        metavar='source',
+        help=f'source filepath, directory or glob pattern to process (supported extensions: {", ".join(SOURCE_EXTENSIONS)})',
     )
 
     parser.add_argument(
@@ -70,6 +285,24 @@ def main():
         help='Where to write to generated code',
     )
 
+    parser.add_argument(
+        '-O', '--output-dir',
+        type=Path,
+        help='Where to write generated code in batch mode, mirroring sources layout (default: next to each source)',
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        help='Number of worker processes in batch mode (default: CPU count)',
+    )
+
+    parser.add_argument(
+        '--function-jobs',
+        type=int,
+        help='Number of worker processes lowering the top-level functions of each module (default: none, in-process)',
+    )
+
     parser.add_argument(
         '-p', '--pass',
         dest='passes',
@@ -77,159 +310,179 @@ def main():
         action='append',
     )
 
-    arguments = parser.parse_args()
+    parser.add_argument(
+        '--unroll-budget',
+        type=int,
+        help=f'IR nodes the loops of a function may be unrolled to, longer loops are an error (default: {UnrollLoops.NODE_BUDGET})',
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        dest='cache',
+        action='store_false',
+        help=f'Do not read nor write the compilation cache ({CACHE_FOLDER})',
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=DEFAULT_CACHE_MAX_SIZE // (1024 * 1024),
+        help='Compilation cache size limit in MiB, least recently used entries are evicted beyond it (default: %(default)s)',
+    )
+
+    parser.add_argument(
+        '-w', '--watch',
+        action='store_true',
+        help='Keep running and recompile the functions of <source> that changed whenever it is modified',
+    )
+
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=DEFAULT_WATCH_INTERVAL,
+        help='Polling interval in seconds of --watch (default: %(default)s)',
+    )
+
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        help='Enable debug logging of the compiler internals',
+    )
+
+    parser.add_argument(
+        '--dump',
+        type=_parse_dump_stages,
+        default=set(),
+        help=f'Comma separated stages whose whole tree is logged after each pass (choices: {",".join(DUMP_STAGES)})',
+    )
+
+    parser.add_argument(
+        '--dump-depth',
+        type=int,
+        help='Maximum depth of the trees logged by --dump',
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Record wall time, CPU time and node counts of every pass and transpiler stage',
+    )
+
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='Record the peak memory of every stage instead of its times, tracing allocations slows stages down unevenly',
+    )
+
+    parser.add_argument(
+        '--profile-output',
+        type=Path,
+        default=Path('py2sbs-profile.json'),
+        help='Where to write the JSON report of --profile or --profile-memory (default: %(default)s)',
+    )
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.verbose:
+        logging.getLogger(modulename).setLevel(logging.DEBUG)
+    configure_dumps(arguments.dump, depth=arguments.dump_depth)
+
     logger.debug(f'Arguments: {arguments}')
 
-    if arguments.source_file is None:
-        logger.error(f'missing <source_file>')
+    profile = arguments.profile or arguments.profile_memory
+
+    # NOTE only options set on the command line, so defaults do not end up in cache keys
+    options = {}
+    if arguments.unroll_budget is not None:
+        options['unroll_budget'] = arguments.unroll_budget
+
+    cache = None
+    if arguments.cache:
+        cache = CompilationCache(CACHE_FOLDER, max_size=arguments.cache_size * 1024 * 1024)
+
+    if arguments.target:
+        try:
+            load_backend(arguments.target)
+        except ImportError as e:
+            logger.error(f'{arguments.target} target is unavailable : {e}')
+            return 1
+
+    is_batch = (
+        (len(arguments.sources) > 1)
+        or any(glob.has_magic(_) or Path(_).is_dir() for _ in arguments.sources)
+    )
+
+    if arguments.watch:
+        if is_batch:
+            logger.error(f'--watch expects a single <source> file')
+            return 1
+
+        return watch(
+            arguments.sources[0],
+            target=arguments.target,
+            output=arguments.output,
+            passes=arguments.passes,
+            interval=arguments.watch_interval,
+            options=options,
+        )
+
+    if is_batch:
+        if arguments.output:
+            logger.error(f'--output is not supported in batch mode, use --output-dir')
+            return 1
+
+        return compile_batch(
+            arguments.sources,
+            target=arguments.target,
+            output_dir=arguments.output_dir,
+            passes=arguments.passes,
+            jobs=arguments.jobs,
+            function_jobs=arguments.function_jobs,
+            cache=cache,
+            verbose=arguments.verbose,
+            dump=arguments.dump,
+            dump_depth=arguments.dump_depth,
+            profile=profile,
+            profile_output=arguments.profile_output,
+            options=options,
+            trace_memory=arguments.profile_memory,
+        )
+
+    source_path = arguments.sources[0]
+    try:
+        with open(source_path, 'rt', encoding='utf-8') as source_file:
+            source = source_file.read()
+    except OSError:
+        logger.error(f'cannot read <source_file> : {source_path}')
         return 1
 
-    if arguments.passes:
-        def __filter_pass(pass_clazz):
-            return any(
-                re.search(_, f'{pass_clazz.__module__}.{pass_clazz.__name__}')
-                for _ in arguments.passes
-            )
-    else:
-        __filter_pass = None
+    profiler = Profiler(source=source_path, trace_memory=arguments.profile_memory) if profile else None
 
-    # Source Language
     try:
-        ast_source = ast.parse(
-            source=arguments.source_file.read(),
-            filename=getattr(arguments.source_file, 'name', '<string>'),
+        compile_source(
+            source,
+            filename=source_path,
+            target=arguments.target,
+            output=arguments.output if arguments.target else None,
+            passes=arguments.passes,
+            cache=cache,
+            profiler=profiler,
+            function_jobs=arguments.function_jobs,
+            options=options,
         )
-        logger.debug(f'source\n{dump(ast_source)}')
     except (ValueError, SyntaxError):
         logger.error(f'Invalid DSL : {traceback.format_exc()}')
         return -1
-
-    try:
-        for idx, CompilationPassClazz in enumerate(filter(__filter_pass, DEFAULT_PY_POST_PASSES), 1):
-            compilation_pass = CompilationPassClazz()
-            logger.info(f'post-pass {idx} - {CompilationPassClazz.__name__}')
-            ast_source = compilation_pass.visit(ast_source)
-            logger.info(dump(ast_source))
-    except (TranspilerError):
-        logger.error(f'Transpilation Failure : {traceback.format_exc()}')
-        return -1
-
-    # IR Language
-    try:
-        for idx, CompilationPassClazz in enumerate(filter(__filter_pass, DEFAULT_IR_PRE_PASSES), 1):
-            compilation_pass = CompilationPassClazz()
-            logger.info(f'pre-pass {idx} - {CompilationPassClazz.__name__}')
-            ast_source = compilation_pass.visit(ast_source)
-            logger.info(dump(ast_source))
-
-        transformer = IRModuleTranspiler()
-        ast_ir = transformer.visit(ast_source)
-
-        logger.info(f'IR\n{dump(ast_ir)}')
-
-        for idx, CompilationPassClazz in enumerate(filter(__filter_pass, DEFAULT_IR_POST_PASSES), 1):
-            compilation_pass = CompilationPassClazz()
-            logger.info(f'post-pass {idx} - {CompilationPassClazz.__name__}')
-            ast_ir = compilation_pass.visit(ast_ir)
-            logger.info(dump(ast_ir))
-    except (TranspilerError):
+    except TRANSPILATION_ERRORS:
         logger.error(f'Transpilation Failure : {traceback.format_exc()}')
         return -1
-
-    # Target Language
-    if arguments.target == 'sbs':
-        logger.info(f'py -> sbs')
-
-        try:
-            for idx, CompilationPassClazz in enumerate(filter(__filter_pass, DEFAULT_SBS_PRE_PASSES), 1):
-                compilation_pass = CompilationPassClazz()
-                logger.info(f'pre-pass {idx} - {CompilationPassClazz.__name__}')
-                ast_ir = compilation_pass.visit(ast_ir)
-                logger.info(dump(ast_ir))
-
-            transformer = SubstancePackageTranspiler()
-            ast_sbs = transformer.visit(ast_ir)
-
-            logger.info(f'SBS IR\n{dump(ast_sbs)}')
-
-            for idx, CompilationPassClazz in enumerate(filter(__filter_pass, DEFAULT_SBS_POST_PASSES), 1):
-                compilation_pass = CompilationPassClazz()
-                logger.info(f'post-pass {idx} - {CompilationPassClazz.__name__}')
-                ast_sbs = compilation_pass.visit(ast_sbs)
-                logger.info(dump(ast_sbs))
-
-        except (TranspilerError):
-            logger.error(f'Transpilation Failure : {traceback.format_exc()}')
-            return -1
-
-    # Codegen Language
-    if arguments.output and arguments.target:
-        logger.info(f'codegen -> {arguments.output}')
-        if arguments.target == 'sbs':
-            with SubstancePackageGenerator(arguments.output) as codegen:
-                codegen.visit(ast_sbs)
+    finally:
+        if profiler:
+            report_profile(profiler.records, arguments.profile_output)
 
 if __name__ == '__main__':
 
-    logging.config.dictConfig({
-        'version': 1,
-        'formatters': {
-            'debug': {
-                'format' : '[{levelname: >5}][{filename}:{lineno: >3}] {message}',
-                'datefmt': None,
-                'style'  : '{',
-            },
-            'brief': {
-                'format' : '[{name}] {message}',
-                'datefmt': None,
-                'style'  : '{',
-            },
-        },
-        'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'brief',
-                'stream': 'ext://sys.stdout',
-            },
-            'console_debug': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'debug',
-                'stream': 'ext://sys.stdout',
-            },
-            # 'file': {
-            #     'class': 'logging.handlers.RotatingFileHandler',
-            #     'formatter': 'debug',
-            #     'filename': Path('scanbox.log'),
-            #     'maxBytes': 1024*1024*1024*1024,
-            #     'backupCount': 5,
-            #     'encoding': 'utf-8',
-            # },
-            'null': {
-                'class': 'logging.NullHandler',
-            }
-        },
-        'loggers': {
-            '__main__': {
-                'level': 'DEBUG',
-                'handlers': [
-                    'console',
-                ],
-            },
-            'py2xyz': {
-                'level': 'DEBUG',
-                'handlers': [
-                    'console_debug',
-                ],
-            },
-            'py2xyz.sbs.analysis': {
-                'level': 'DEBUG',
-                'handlers': [
-                    'null',
-                ],
-                'propagate': False
-            },
-        },
-    })
+    logging.config.dictConfig(LOGGING_CONFIG)
 
     import sys
     sys.exit(main())
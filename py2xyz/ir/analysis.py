@@ -0,0 +1,75 @@
+import collections
+
+from py2xyz import TranspilerError
+
+from py2xyz.slotted import NODE_TYPES
+
+from py2xyz.passmanager import Analysis
+
+from py2xyz.ir.ast import (
+    Assign    as IRAssign,
+    Attribute as IRAttribute,
+    Reference as IRReference,
+    Return    as IRReturn,
+)
+
+class DefUseChains(collections.namedtuple('DefUseChains', ['definitions', 'uses'])):
+    """Def-use chains of a function in SSA form, keyed by (variable, version)
+
+    definitions : the parameter or assignment defining a version
+    uses        : the statements reading a version, in order
+    """
+    pass
+
+def read_variables(expression):
+    """(variable, version) read by an expression, each shared subexpression is walked once"""
+    variables = set()
+    seen = set()
+    stack = [ expression ]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, NODE_TYPES) or id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, (IRReference, IRAttribute)):
+            variables.add((node.variable, node.version))
+        else:
+            stack.extend(getattr(node, field, None) for field in node._fields)
+    return variables
+
+def is_straight_line(function):
+    """Whether a function body is only assignments and returns, e.g. its loops were all unrolled"""
+    return all(
+        isinstance(statement, (IRAssign, IRReturn))
+        for statement in function.body
+    )
+
+class DefUseAnalysis(Analysis):
+    """Def-use chains of an IR function, requires py2xyz.ir.passes.StaticSingleAssignment
+
+    Query it through `get_analysis(DefUseAnalysis, function)` of the pass or of its manager.
+    """
+
+    def run(self, node):
+        definitions = {
+            (argument.identifier, 0): argument
+            for argument in node.arguments
+        }
+        uses = collections.defaultdict(list)
+
+        for statement in node.body:
+            for variable in read_variables(statement.expression):
+                uses[variable].append(statement)
+
+            if isinstance(statement, IRAssign):
+                if statement.version is None:
+                    raise TranspilerError(f'Def-use chains require SSA form, {statement.identifier} definition is not versioned', statement)
+                definitions[(statement.identifier, statement.version)] = statement
+
+        return DefUseChains(
+            definitions=definitions,
+            uses=dict(uses),
+        )
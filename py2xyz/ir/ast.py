@@ -2,6 +2,9 @@
 import abc
 import ast
 import enum
+import collections
+
+from py2xyz.slotted import SlottedAST
 
 class TextTypes(enum.Enum):
     String = 's'
@@ -55,9 +58,73 @@ ANY_VECTOR_TYPES = ANY_VECTOR_INTEGRAL_TYPES | ANY_VECTOR_FLOAT_TYPES
 
 ANY_TYPES = ANY_TEXT_TYPES | ANY_LOGICAL_TYPES | ANY_NUMERICAL_TYPES
 
-class Operator(ast.AST, abc.ABC):
-    def signatures():
-        return self.SIGNATURES
+class Signature(collections.namedtuple('Signature', ['arguments', 'result'])):
+    pass
+
+class OverloadIndex:
+    """Signatures of an operator indexed by argument types, built once per operator class
+
+    `resolve(*types)` returns the result type of the overload taking exactly `types`, `match(*types)` the overloads
+    whose arguments match `types`, None being a wildcard (e.g. `match(NumericalTypes.Float2, None)`). Both are dict
+    lookups : the most selective (position, type) bucket is filtered, instead of scanning every signature.
+    """
+
+    def __init__(self, signatures):
+        self.signatures = tuple( Signature(tuple(arguments), result) for arguments, result in signatures )
+
+        # argument types -> result type
+        self.results = { _.arguments: _.result for _ in self.signatures }
+
+        # (arity, position, argument type) -> signatures
+        self.buckets = collections.defaultdict(list)
+        # arity -> signatures
+        self.arities = collections.defaultdict(list)
+        for signature in self.signatures:
+            self.arities[len(signature.arguments)].append(signature)
+            for position, argument in enumerate(signature.arguments):
+                self.buckets[(len(signature.arguments), position, argument)].append(signature)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def resolve(self, *types):
+        return self.results.get(types)
+
+    def match(self, *types):
+        arity = len(types)
+        candidates = self.arities.get(arity, ())
+        for position, argument in enumerate(types):
+            if argument is None:
+                continue
+            bucket = self.buckets.get((arity, position, argument), ())
+            if len(bucket) < len(candidates):
+                candidates = bucket
+
+        return [
+            signature
+            for signature in candidates
+            if all((expected is None) or (expected == argument) for expected, argument in zip(types, signature.arguments))
+        ]
+
+    def argument_types(self, position, arity):
+        """Types the argument at `position` takes in some overload"""
+        return { _.arguments[position] for _ in self.arities.get(arity, ()) }
+
+    def result_types(self):
+        return { _.result for _ in self.signatures }
+
+class Operator(SlottedAST, abc.ABC):
+    """Operators declare `SIGNATURES`, ((argument types), result type) pairs, indexed once into `OVERLOADS`"""
+
+    SIGNATURES = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.OVERLOADS = OverloadIndex(cls.SIGNATURES)
+
+    @classmethod
+    def signatures(cls):
+        return cls.SIGNATURES
 
 _BOOLEAN_UNARY_OPERATION_SIGNATURES = [
     ( (_,), _ )
@@ -160,6 +227,10 @@ class NaturalExponential(Operator):
 class Power(Operator):
     SIGNATURES = _FLOAT_BINARY_OPERATION_SIGNATURES
 
+# NOTE 2 ** x, see py2xyz.ir.passes.AlgebraicSimplifier
+class Power2(Operator):
+    SIGNATURES = _FLOAT_UNARY_OPERATION_SIGNATURES
+
 # Logicals
 
 class And(Operator):
@@ -178,7 +249,7 @@ class Equals(Operator):
 
 # TODO >, >=, <, <=
 
-class AST(ast.AST, abc.ABC):
+class AST(SlottedAST, abc.ABC):
     pass
 
 class Statement(AST, abc.ABC):
@@ -213,10 +284,25 @@ class Return(Statement):
         'expression',
     )
 
+# NOTE `version` is None until SSA construction (see py2xyz.ir.passes.StaticSingleAssignment), which numbers each
+# definition of a variable from 1, parameters being version 0
+
 class Assign(Statement):
     _fields = (
         'identifier',
         'expression',
+        'version',
+    )
+
+# NOTE loops iterate a constant integer range, they are unrolled by py2xyz.ir.passes.UnrollLoops
+
+class For(Statement):
+    _fields = (
+        'identifier',
+        'start',
+        'stop',
+        'step',
+        'body',
     )
 
 class Function(Statement):
@@ -225,6 +311,7 @@ class Function(Statement):
         'arguments',
         'body',
         'returns',
+        'decorators',
     )
 
 class OverloadedFunction(Function):
@@ -250,12 +337,14 @@ class Constant(Expression):
 class Reference(Expression):
     _fields = (
         'variable',
+        'version',
     )
 
 class Attribute(Expression):
     _fields = (
         'variable',
         'fields',
+        'version',
     )
 
 class BinaryOperation(Expression):
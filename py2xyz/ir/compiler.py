@@ -1,15 +1,19 @@
-
 import ast
-import itertools
 
 from py2xyz import TranspilerError
 
+from py2xyz.traversal import NodeTransformer, trampoline
+
+from py2xyz.ir import swizzle
+from py2xyz.ir.interning import Interner
+
 from py2xyz.ir.ast import (
     Assign          as IRAssign,
     Attribute       as IRAttribute,
     BinaryOperation as IRBinaryOperation,
     Call            as IRCall,
     Constant        as IRConstant,
+    For             as IRFor,
     Function        as IRFunction,
     Module          as IRModule,
     Parameter       as IRParameter,
@@ -22,6 +26,7 @@ from py2xyz.ir.ast import (
     Modulo          as IRModulo,
     Multiplication  as IRMultiplication,
     Division        as IRDivision,
+    Power           as IRPower,
     Negation        as IRNegation,
     And             as IRAnd,
     Or              as IROr,
@@ -29,63 +34,254 @@ from py2xyz.ir.ast import (
     Equals          as IREquals,
 )
 
-class Transpiler(ast.NodeTransformer):
+class Transpiler(NodeTransformer):
+    """Dispatch on the exact node class through a table built once per transpiler class
+
+    Handlers are the `visit_<ast node class>` methods, looked up by `type(node)` instead of `ast.NodeVisitor` building
+    their name and resolving it with getattr on every visit. Handlers visiting subnodes are generators yielding them, so
+    arbitrarily deep expressions are lowered on an explicit stack (see py2xyz.traversal).
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.DISPATCH = {
+            getattr(ast, name[len('visit_'):]): function
+            for klass in reversed(cls.__mro__)
+            for name, function in vars(klass).items()
+            if name.startswith('visit_') and isinstance(getattr(ast, name[len('visit_'):], None), type)
+        }
+
+    def visit_step(self, node):
+        handler = self.DISPATCH.get(node.__class__)
+        if handler is None:
+            return self.generic_visit(node)
+        return handler(self, node)
+
     def generic_visit(self, node):
         raise TranspilerError(node=node)
 
-class CallOperandsTranspiler(Transpiler):
+    generic_visit_steps = generic_visit
+
+class FunctionTranspiler(Transpiler):
+    """Function, statements and expressions, a single instance is reused for every function of a module
+
+    Statements handlers return a tuple of IR statements, expressions handlers a single IR expression. Expressions are
+    hash-consed per function : structurally identical subexpressions are the same node (see py2xyz.ir.interning).
+    """
+
+    # NOTE operator nodes have no field, they are shared instead of allocated per operation
+    BINARY_OPERATORS = {
+        ast.Add     : IRAddition(),
+        ast.Sub     : IRSubstraction(),
+        ast.Mult    : IRMultiplication(),
+        ast.Div     : IRDivision(),
+        ast.Mod     : IRModulo(),
+        ast.Pow     : IRPower(),
+    }
+
+    UNARY_OPERATORS = {
+        ast.USub    : IRNegation(),
+        ast.Not     : IRNot(),
+    }
 
-    def visit_Num(self, node):
+    def __init__(self):
+        self.interner = Interner()
+
+    # Function
+
+    def visit_FunctionDef(self, node : ast.FunctionDef):
+        # NOTE dispatched as a statement, i.e. nested in a function body : top-level functions go through `function`
+        raise TranspilerError(f'Nested function definition not supported', node)
+
+    def function(self, node : ast.FunctionDef):
+        self.interner = Interner()
+
+        body = []
+        for statement in node.body:
+            body.extend((yield statement))
+
+        return IRFunction(
+            identifier=node.name,
+            arguments=self.visit_arguments(node.args),
+            body=body,
+            returns=None,
+            decorators=self.visit_decorators(node.decorator_list),
+        )
+
+    def visit_decorators(self, nodes):
+        # NOTE decorators are hints to passes (e.g. @inline), only their names are kept
+        decorators = []
+        for node in nodes:
+            if not isinstance(node, ast.Name):
+                raise TranspilerError(f'Decorator other than Name not supported', node)
+            decorators.append(node.id)
+        return decorators
+
+    def visit_arguments(self, node : ast.arguments):
+        if node.vararg:
+            raise TranspilerError(f'varargs arguments not supported', node)
+
+        defaults = [ None ] * (len(node.args) - len(node.defaults)) + list(map(self.visit, node.defaults))
+        return [
+            IRParameter(
+                identifier=node_parameter.arg,
+                annotation=self.visit_annotation(node_parameter.annotation),
+                expression=node_default,
+            )
+            for node_parameter, node_default in zip(node.args, defaults)
+        ]
+
+    def visit_annotation(self, node):
+        # NOTE parameters without annotation are typed later on, see py2xyz.ir.passes.ResolveFunctionOverloads
+        if node is None:
+            return None
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        raise TranspilerError(f'Annotation other than Name not supported', node)
+
+    # Statements
+
+    def visit_Return(self, node):
+        expression = yield node.value
+        return (
+            IRReturn(expression=expression),
+        )
+
+    def visit_Assign(self, node):
+        # NOTE definitions are versioned later on, see py2xyz.ir.passes.StaticSingleAssignment
+        if len(node.targets) > 1:
+            raise TranspilerError(f'Assignements with multiple targets not supported', node)
+
+        target = node.targets[0]
+        if not isinstance(target, ast.Name):
+            raise TranspilerError(f'Assignement target other than Name not supported', target)
+
+        assert isinstance(target.ctx, ast.Store)
+
+        expression = yield node.value
         return (
-            IRConstant(value=node.n),
+            IRAssign(identifier=target.id, expression=expression, version=None),
         )
 
-class BinaryOperationOperatorTranspiler(Transpiler):
+    def visit_AugAssign(self, node):
+        if not isinstance(node.target, ast.Name):
+            raise TranspilerError(f'Assignement target other than Name not supported', node.target)
 
-    def visit_Add(self, node):
-        return IRAddition()
+        operator = self.BINARY_OPERATORS.get(node.op.__class__)
+        if operator is None:
+            raise TranspilerError(f'Binary operator unsupported', node.op)
 
-    def visit_Sub(self, node):
-        return IRSubstraction()
+        # NOTE `a += b` is `a = a + b`, the target is read before being redefined
+        value = yield node.value
+        expression = self.interner.binary_operation(
+            left=self.interner.reference(node.target.id),
+            operator=operator,
+            right=value,
+        )
+        return (
+            IRAssign(identifier=node.target.id, expression=expression, version=None),
+        )
+
+    def visit_For(self, node):
+        if not isinstance(node.target, ast.Name):
+            raise TranspilerError(f'Loop target other than Name not supported', node.target)
+        if node.orelse:
+            raise TranspilerError(f'Loop else clause not supported', node)
+
+        iterator = node.iter
+        is_range = (
+            isinstance(iterator, ast.Call)
+            and isinstance(iterator.func, ast.Name) and (iterator.func.id == 'range')
+            and not iterator.keywords
+            and (1 <= len(iterator.args) <= 3)
+        )
+        if not is_range:
+            raise TranspilerError(f'Loop other than over range() not supported', iterator)
 
-    def visit_Mul(self, node):
-        return IRMultiplication()
+        bounds = []
+        for arg in iterator.args:
+            bound = yield arg
+            if not (isinstance(bound, IRConstant) and isinstance(bound.value, int)):
+                raise TranspilerError(f'range() arguments other than integer constants not supported', arg)
+            bounds.append(bound.value)
 
-    def visit_Div(self, node):
-        return IRDivision()
+        if (len(bounds) == 3) and (bounds[2] == 0):
+            raise TranspilerError(f'range() step must not be zero', iterator)
+        iterations = range(*bounds)
 
-class FunctionBodyExpressionTranspiler(Transpiler):
+        body = []
+        for statement in node.body:
+            body.extend((yield statement))
+
+        if any(isinstance(_, IRReturn) for _ in body):
+            raise TranspilerError(f'Return inside loops not supported', node)
+
+        return (
+            IRFor(
+                identifier=node.target.id,
+                start=iterations.start,
+                stop=iterations.stop,
+                step=iterations.step,
+                body=body,
+            ),
+        )
+
+    # Expressions
 
     def visit_Name(self, node):
         if not isinstance(node.ctx, ast.Load):
             raise TranspilerError(f'Unexpected node encounter during visit', node)
-        return IRReference(variable=node.id)
+        return self.interner.reference(node.id)
 
-    def visit_Num(self, node):
-        return IRConstant(value=node.n)
+    def visit_Constant(self, node):
+        # NOTE bool is an int, but not a numerical constant
+        if node.value.__class__ not in (int, float):
+            raise TranspilerError(f'Constant type unsupported', node)
+        return self.interner.constant(node.value)
 
     def visit_Tuple(self, node):
         count = len(node.elts)
         if count not in {1, 2, 3, 4}:
             raise TranspilerError(f'Tuple count unusupported', node)
 
-        subnodes = list(map(self.visit, node.elts))
+        subnodes = []
+        for element in node.elts:
+            subnodes.append((yield element))
 
         are_subnodes_constants = all(
-            isinstance(_, Constant)
+            isinstance(_, IRConstant)
             for _ in subnodes
         )
         if not are_subnodes_constants:
             # TODO if not constants, we need to transpile to Vector XYZW or Cast operator
             raise TranspilerError(f'Tuple elements unusupported', node)
 
-        return Constant(value=[_.value for _ in subnodes])
+        return self.interner.constant([_.value for _ in subnodes])
 
     def visit_BinOp(self, node):
-        return IRBinaryOperation(
-            left=self.visit(node.left),
-            right=self.visit(node.right),
-            operator=BinaryOperationOperatorTranspiler().visit(node.op),
+        operator = self.BINARY_OPERATORS.get(node.op.__class__)
+        if operator is None:
+            raise TranspilerError(f'Binary operator unsupported', node.op)
+
+        left = yield node.left
+        right = yield node.right
+        return self.interner.binary_operation(
+            left=left,
+            operator=operator,
+            right=right,
+        )
+
+    def visit_UnaryOp(self, node):
+        operator = self.UNARY_OPERATORS.get(node.op.__class__)
+        if operator is None:
+            raise TranspilerError(f'Unary operator unsupported', node.op)
+
+        operand = yield node.operand
+        return self.interner.unary_operation(
+            operator=operator,
+            operand=operand,
         )
 
     def visit_Call(self, node):
@@ -95,119 +291,59 @@ class FunctionBodyExpressionTranspiler(Transpiler):
         if node.keywords:
             raise TranspilerError(f'Call keywords not yet supported', node.keywords)
 
-        operands_transpiler = CallOperandsTranspiler()
-        return IRCall(
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+
+        return self.interner.call(
             function=node.func.id,
-            args=list(
-                # i.e. flatmap
-                itertools.chain.from_iterable(map(operands_transpiler.visit, node.args)),
-            ),
-            kwargs=list(
-                # i.e. flatmap
-                itertools.chain.from_iterable(
-                    zip(map(operands_transpiler.visit, node.keywords)),
-                )
-            ),
+            args=args,
+            kwargs=[],
         )
 
     def visit_Attribute(self, node):
         assert isinstance(node.ctx, ast.Load)
-        assert isinstance(node.value, ast.Name)
-        assert isinstance(node.value.ctx, ast.Load)
-
-        return IRAttribute(
-            variable=node.value.id,
-            fields=node.attr,
-        )
-
-class FunctionBodyStatementTranspiler(Transpiler):
-
-    def visit_Return(self, node):
-        subtranspiler = FunctionBodyExpressionTranspiler()
-        return (
-            IRReturn(expression=subtranspiler.visit(node.value)),
-        )
-
-    def visit_Assign(self, node):
-        # TODO https://en.wikipedia.org/wiki/Static_single_assignment_form
-        if len(node.targets) > 1:
-            raise TranspilerError(f'Assignements with multiple targets not supported', node)
-
-        target = node.targets[0]
-        if not isinstance(target, ast.Name):
-            raise TranspilerError(f'Assignement target other than Name not supported', target)
-
-        assert isinstance(target.ctx, ast.Store)
-
-        subtranspiler = FunctionBodyExpressionTranspiler()
-        return (
-            IRAssign(identifier=target.id, expression=subtranspiler.visit(node.value)),
-        )
-
-class FunctionTranspiler(Transpiler):
 
-    def visit_FunctionDef(self, node : ast.FunctionDef):
-        subtranspiler = FunctionBodyStatementTranspiler()
-        return IRFunction(
-            identifier=node.name,
-            arguments=self.visit_arguments(node.args),
-            body=list(
-                # i.e. flatmap
-                itertools.chain.from_iterable(map(subtranspiler.visit, node.body))
-            ),
+        # NOTE chained swizzles, e.g. `v.xyz.xy`, are composed into a single one
+        fields = node.attr
+        value = node.value
+        while isinstance(value, ast.Attribute):
+            composed = swizzle.compose(fields, value.attr)
+            if composed is None:
+                raise TranspilerError(f'{fields} swizzle of {value.attr} swizzle unsupported', node)
+            fields = composed
+            value = value.value
+
+        assert isinstance(value, ast.Name)
+        assert isinstance(value.ctx, ast.Load)
+
+        return self.interner.attribute(
+            variable=value.id,
+            fields=fields,
         )
 
-    def visit_arguments(self, node : ast.arguments):
-        if node.vararg:
-            raise TranspilerError(f'varargs arguments not supported', node)
-
-        if node.defaults:
-            defaults_count = len(node.defaults)
-            return [
-                IRParameter(
-                    identifier=node_parameter.arg,
-                    annotation=node_parameter.annotation.id,
-                    expression=None
-                )
-                for node_parameter in node.args[:-defaults_count]
-            ] + [
-                IRParameter(
-                    identifier=node_parameter.arg,
-                    annotation=node_parameter.annotation.id,
-                    expression=node_default
-                )
-                for node_parameter, node_default in zip(node.args[-defaults_count:], node.defaults)
-            ]
-        else:
-            return [
-                IRParameter(
-                    identifier=node_parameter.arg,
-                    annotation=node_parameter.annotation.id,
-                    expression=None
-                )
-                for node_parameter in node.args
-            ]
-
-class ModuleTranspiler(Transpiler):
+class ModuleTranspiler(FunctionTranspiler):
 
     def visit_Module(self, node):
         node_description = next((
             # subnode
             subnode
-            for subnode in ast.iter_child_nodes(node)
+            for subnode in node.body
             if isinstance(subnode, ast.Expr)
-            if isinstance(subnode.value, ast.Str)
+            if isinstance(subnode.value, ast.Constant) and isinstance(subnode.value.value, str)
         ), None)
         if node_description is not None:
             node.body.remove(node_description)
         return IRModule(
-            description=ast.literal_eval(node_description.value) if node_description else None,
+            description=node_description.value.value if node_description else None,
             content=list(filter(None,(
-                self.visit(node)
-                for node in ast.iter_child_nodes(node)
+                self.visit_module_statement(subnode)
+                for subnode in node.body
             )))
         )
 
-    def visit_FunctionDef(self, node):
-        return FunctionTranspiler().visit(node)
-
+    def visit_module_statement(self, node):
+        # NOTE statement handlers are shared with function bodies, only functions are supported at module level
+        if not isinstance(node, ast.FunctionDef):
+            raise TranspilerError(f'Module level statement unsupported', node)
+        return trampoline(self.function(node), self.visit_step)
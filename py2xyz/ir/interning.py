@@ -0,0 +1,79 @@
+import math
+
+from py2xyz.ir.ast import (
+    Attribute       as IRAttribute,
+    BinaryOperation as IRBinaryOperation,
+    Call            as IRCall,
+    Constant        as IRConstant,
+    Reference       as IRReference,
+    UnaryOperation  as IRUnaryOperation,
+)
+
+def value_key(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(map(value_key, value))
+    if isinstance(value, float):
+        # NOTE 0.0 == -0.0 but they are different constants, NaN is never equal to itself and simply not shared
+        return (float, value, math.copysign(1.0, value))
+    return (value.__class__, value)
+
+class Interner:
+    """Hash-consing factory for IR expressions
+
+    Factory methods return the node already built with the same class and fields, or build and register it. Subnodes
+    being interned before their parent, a node key is shallow : class, plain field values and subnodes identities, any
+    instance of an operator class standing for the same operator as they have no field. The structural hash of a subtree
+    is thus computed once, when it is interned, and structurally identical expressions are the same object, compared with
+    `is`.
+
+    Expressions are pure (no global state, no out parameters yet), so sharing them is safe. Interned nodes must not be
+    modified in place ; passes rewriting them share the rewritten node (see py2xyz.traversal.SharingNodeTransformer).
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _get(self, key, factory):
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = factory()
+        return node
+
+    def constant(self, value):
+        return self._get(
+            (IRConstant, value_key(value)),
+            lambda: IRConstant(value=value),
+        )
+
+    def reference(self, variable, version=None):
+        return self._get(
+            (IRReference, variable, version),
+            lambda: IRReference(variable=variable, version=version),
+        )
+
+    def attribute(self, variable, fields, version=None):
+        return self._get(
+            (IRAttribute, variable, fields, version),
+            lambda: IRAttribute(variable=variable, fields=fields, version=version),
+        )
+
+    def binary_operation(self, left, operator, right):
+        return self._get(
+            (IRBinaryOperation, id(left), operator.__class__, id(right)),
+            lambda: IRBinaryOperation(left=left, operator=operator, right=right),
+        )
+
+    def unary_operation(self, operator, operand):
+        return self._get(
+            (IRUnaryOperation, operator.__class__, id(operand)),
+            lambda: IRUnaryOperation(operator=operator, operand=operand),
+        )
+
+    def call(self, function, args, kwargs):
+        return self._get(
+            (IRCall, function, tuple(map(id, args)), tuple(map(id, kwargs))),
+            lambda: IRCall(function=function, args=args, kwargs=kwargs),
+        )
@@ -1,27 +1,52 @@
 
 import ast
+import math
 import logging
+import operator
+import functools
+import itertools
 import collections
 from pprint import pformat
 
 logger = logging.getLogger(__name__)
 
-from py2xyz import TranspilerError
+from py2xyz import dump, LazyFormat, TranspilerError
+
+from py2xyz.profiling import count_nodes
+from py2xyz.traversal import SharingNodeTransformer, trampoline
+
+from py2xyz.ir import swizzle
+from py2xyz.ir.analysis import DefUseAnalysis, is_straight_line, read_variables
+from py2xyz.ir.interning import Interner, value_key
+
+from py2xyz.sbs.analysis import constant_type, infer_argument_types
 
 from py2xyz.ir.ast import (
+    Expression                as IRExpression,
     Assign                    as IRAssign,
     Attribute                 as IRAttribute,
     BinaryOperation           as IRBinaryOperation,
     Call                      as IRCall,
     Constant                  as IRConstant,
+    For                       as IRFor,
     Function                  as IRFunction,
     Module                    as IRModule,
     Parameter                 as IRParameter,
     TypedParameter            as IRTypedParameter,
     Reference                 as IRReference,
     Return                    as IRReturn,
+    Statement                 as IRStatement,
     UnaryOperation            as IRUnaryOperation,
 
+    Addition                  as IRAddition,
+    Substraction              as IRSubstraction,
+    Modulo                    as IRModulo,
+    Multiplication            as IRMultiplication,
+    Division                  as IRDivision,
+    Power                     as IRPower,
+    Power2                    as IRPower2,
+    Negation                  as IRNegation,
+
     TextTypes                 as IRTextTypes,
     LogicalTypes              as IRLogicalTypes,
     NumericalTypes            as IRNumericalTypes,
@@ -40,9 +65,21 @@ from py2xyz.ir.ast import (
 class Variable(collections.namedtuple('Variable', ['name', 'type'])):
     pass
 
-class Pass(ast.NodeTransformer):
+class Pass(SharingNodeTransformer):
+    """See py2xyz.passmanager.PassManager for REQUIRES and PRESERVES"""
+
+    REQUIRES = ()
+    PRESERVES = ()
+
     def __init__(self):
         self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
+        self.manager = None
+
+    def get_analysis(self, AnalysisClazz, node):
+        """Analysis of `node`, cached by the manager if any, computed afresh when the pass runs on its own"""
+        if self.manager is None:
+            return AnalysisClazz().run(node)
+        return self.manager.get_analysis(AnalysisClazz, node)
 
 class ResolveIRParameterType(Pass):
 
@@ -106,15 +143,17 @@ class ShaderToyImageEntryPoint(ShaderToyPass):
                     expression=IRCall(
                         function=self.ARGUMENT_FRAG_COLOR.type,
                         args=[ IRConstant(value=0.0) ] * 4,
-                        keywords=[],
-                    )
+                        kwargs=[],
+                    ),
+                    version=None,
                 )
             ] + node.body + [
                 IRReturn(
-                    expression=IRReference(variable=self.ARGUMENT_FRAG_COLOR.name)
+                    expression=IRReference(variable=self.ARGUMENT_FRAG_COLOR.name, version=None)
                 )
             ],
             returns=self.ARGUMENT_FRAG_COLOR.type,
+            decorators=node.decorators,
         )
 
 class GLSLPass(Pass):
@@ -157,7 +196,7 @@ class ResolveGLSLTypeConstructor(GLSLPass):
         )
 
         if not is_args_constant_expression:
-            self.logger.debug(f'args are not constexpr: {pformat([dump(_) for _ in node.args])}')
+            self.logger.debug('args are not constexpr: %s', LazyFormat(lambda args: pformat([dump(_) for _ in args]), node.args))
             return node
 
         assert not node.kwargs
@@ -168,98 +207,1497 @@ class ResolveGLSLTypeConstructor(GLSLPass):
             kwargs=node.kwargs,
         )
 
-# class ResolveFunctionOverloadSetPass(Pass):
-#     def visit_FunctionGraph(self, node):
-#         if len(node.parameters) == 0:
-#             return node
-
-#         overloads=list(iterate_inferred_argument_types(node, node.parameters, node.nodes))
-#         # logger.debug(f'overloads : {pprint.pformat(overloads)}')
-#         if len(overloads) == 0:
-#             return node
-#         elif len(overloads) == 1:
-#             return FunctionGraph(
-#                 identifier=node.identifier,
-#                 attributes=node.attributes,
-#                 nodes=node.nodes,
-#                 parameters=[
-#                     Parameter(
-#                         identifier=parameter.identifier,
-#                         type=parametertype,
-#                         value=parameter.value,
-#                     )
-#                     for parameter, parametertype in zip(node.parameters, overloads[0])
-#                 ],
-#             )
-#         else:
-#             return OverloadedFunctionGraph(
-#                 identifier=node.identifier,
-#                 attributes=node.attributes,
-#                 parameters=node.parameters,
-#                 nodes=node.nodes,
-#                 overloads=overloads,
-#             )
-
-# class FlattenOverloadedFunctionsPass(Pass):
-#     # Inspired by struct module packing
-#     FORMAT_CHARACTERS_TABLE = {
-#         TextTypes.String       :  's',
-#         LogicalTypes.Boolean   :  'b',
-#         NumericalTypes.Integer1: 'i1',
-#         NumericalTypes.Integer2: 'i2',
-#         NumericalTypes.Integer3: 'i3',
-#         NumericalTypes.Integer4: 'i4',
-#         NumericalTypes.Float1  : 'f1',
-#         NumericalTypes.Float2  : 'f2',
-#         NumericalTypes.Float3  : 'f3',
-#         NumericalTypes.Float4  : 'f4',
-#     }
-
-#     @staticmethod
-#     def packargtypes(argtypes):
-#         return '-'.join(
-#             map(
-#                 FlattenOverloadedFunctionsPass.FORMAT_CHARACTERS_TABLE.get,
-#                 argtypes,
-#             )
-#         )
-
-#     def flatten_overloads(self, node):
-#         if not isinstance(node, OverloadedFunctionGraph):
-#             return ( node, )
-
-#         return (
-#             FunctionGraph(
-#                 identifier=f'{node.identifier}_{FlattenOverloadedFunctionsPass.packargtypes(argtypes)}',
-#                 attributes=node.attributes,
-#                 nodes=node.nodes,
-#                 parameters=[
-#                     Parameter(
-#                         identifier=parameter.identifier,
-#                         type=parametertype,
-#                         value=parameter.value,
-#                     )
-#                     for parameter, parametertype in zip(node.parameters, argtypes)
-#                 ],
-#             )
-#             for argtypes in node.overloads
-#         )
-
-#     def visit_Package(self, node):
-#         return Package(
-#             description=node.description,
-#             content=list(
-#                 # i.e. flatmap
-#                 itertools.chain.from_iterable(map(self.flatten_overloads, node.content))
-#             )
-#         )
+class ExpressionRewriter(SharingNodeTransformer):
+    """Rebuild an expression bottom-up through an interner, subclasses override the handlers of nodes they rewrite"""
+
+    def __init__(self, interner):
+        self.interner = interner
+
+    def visit_Constant(self, node):
+        return self.interner.constant(node.value)
+
+    def visit_Reference(self, node):
+        return self.interner.reference(node.variable, node.version)
+
+    def visit_Attribute(self, node):
+        return self.interner.attribute(node.variable, node.fields, node.version)
+
+    def visit_BinaryOperation(self, node):
+        left = yield node.left
+        right = yield node.right
+        return self.interner.binary_operation(left, node.operator, right)
+
+    def visit_UnaryOperation(self, node):
+        operand = yield node.operand
+        return self.interner.unary_operation(node.operator, operand)
+
+    def visit_Call(self, node):
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+        return self.interner.call(node.function, args, node.kwargs)
+
+class StaticSingleAssignmentRenamer(ExpressionRewriter):
+    """Rebuild an expression reading the current version of each variable, unknown variables (e.g. uniforms) have none"""
+
+    def __init__(self, interner, versions):
+        super().__init__(interner)
+        self.versions = versions
+
+    def visit_Reference(self, node):
+        return self.interner.reference(node.variable, self.versions.get(node.variable))
+
+    def visit_Attribute(self, node):
+        return self.interner.attribute(node.variable, node.fields, self.versions.get(node.variable))
+
+class StaticSingleAssignment(Pass):
+    """Number each definition of a variable and make every read refer to the definition it reaches
+
+    Function bodies are straight-line code, the definition reaching a read is the last one before it. Parameters are
+    version 0, assignments are numbered from 1 per variable. See py2xyz.ir.analysis.DefUseAnalysis for def-use chains.
+    """
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, SSA construction skipped')
+            return node
+
+        versions = {
+            argument.identifier: 0
+            for argument in node.arguments
+        }
+        renamer = StaticSingleAssignmentRenamer(Interner(), versions)
+
+        body = []
+        for statement in node.body:
+            if isinstance(statement, IRAssign):
+                expression = renamer.visit(statement.expression)
+                versions[statement.identifier] = versions.get(statement.identifier, 0) + 1
+                body.append(IRAssign(
+                    identifier=statement.identifier,
+                    expression=expression,
+                    version=versions[statement.identifier],
+                ))
+            elif isinstance(statement, IRReturn):
+                body.append(IRReturn(
+                    expression=renamer.visit(statement.expression),
+                ))
+            else:
+                raise TranspilerError(f'Statement unsupported in SSA construction', statement)
+
+        self.logger.debug(f'{node.identifier} : {len(body)} statements, {len(renamer.interner)} distinct expressions')
+        node.body = body
+        return node
+
+def _componentwise(function, left, right):
+    # NOTE GLSL vector operations apply per component, a scalar operand being broadcast to the vector size
+    left_is_vector = isinstance(left, list)
+    right_is_vector = isinstance(right, list)
+    if left_is_vector and right_is_vector:
+        if len(left) != len(right):
+            return None
+        return [ function(l, r) for l, r in zip(left, right) ]
+    elif left_is_vector:
+        return [ function(l, right) for l in left ]
+    elif right_is_vector:
+        return [ function(left, r) for r in right ]
+    return function(left, right)
+
+def _componentwise_unary(function, operand):
+    if isinstance(operand, list):
+        return [ function(_) for _ in operand ]
+    return function(operand)
+
+class ConstantFolder(ExpressionRewriter):
+    """Evaluate operations and GLSL constructors over constants, replace reads of constant variables by their value"""
+
+    BINARY_OPERATORS = {
+        IRAddition       : operator.add,
+        IRSubstraction   : operator.sub,
+        IRMultiplication : operator.mul,
+        # NOTE true division, as the source is python : 1/2 is 0.5 and not the truncated GLSL integer quotient
+        IRDivision       : operator.truediv,
+        # NOTE floored modulo, as GLSL mod(x, y) = x - y * floor(x / y)
+        IRModulo         : operator.mod,
+        IRPower          : math.pow,
+    }
+
+    UNARY_OPERATORS = {
+        IRNegation       : operator.neg,
+    }
+
+    # type -> (components, component type)
+    CONSTRUCTORS = {
+        IRNumericalTypes.Float1   : (1, float),
+        IRNumericalTypes.Float2   : (2, float),
+        IRNumericalTypes.Float3   : (3, float),
+        IRNumericalTypes.Float4   : (4, float),
+        IRNumericalTypes.Integer1 : (1, int),
+        IRNumericalTypes.Integer2 : (2, int),
+        IRNumericalTypes.Integer3 : (3, int),
+        IRNumericalTypes.Integer4 : (4, int),
+    }
+
+    SWIZZLE_FIELDS = swizzle.FIELDS
+
+    def __init__(self, interner):
+        super().__init__(interner)
+        # (variable, version) -> IRConstant
+        self.constants = {}
+        self.folded = 0
+
+    def fold(self, function, *values):
+        try:
+            value = function(*values)
+        except (ArithmeticError, ValueError):
+            # NOTE e.g. division by zero, left for the target to evaluate
+            return None
+        if value is None:
+            return None
+        self.folded += 1
+        return self.interner.constant(value)
+
+    def visit_Reference(self, node):
+        constant = self.constants.get((node.variable, node.version))
+        if constant is not None:
+            self.folded += 1
+            return constant
+        return super().visit_Reference(node)
+
+    def visit_Attribute(self, node):
+        constant = self.constants.get((node.variable, node.version))
+        if (constant is None) or not isinstance(constant.value, list):
+            return super().visit_Attribute(node)
+
+        indexer = next((
+            fields
+            for fields in self.SWIZZLE_FIELDS
+            if all(_ in fields[:len(constant.value)] for _ in node.fields)
+        ), None)
+        if indexer is None:
+            return super().visit_Attribute(node)
+
+        components = [ constant.value[indexer.index(_)] for _ in node.fields ]
+        self.folded += 1
+        return self.interner.constant(components[0] if len(components) == 1 else components)
+
+    def visit_BinaryOperation(self, node):
+        left = yield node.left
+        right = yield node.right
+
+        function = self.BINARY_OPERATORS.get(node.operator.__class__)
+        if (function is not None) and isinstance(left, IRConstant) and isinstance(right, IRConstant):
+            folded = self.fold(_componentwise, function, left.value, right.value)
+            if folded is not None:
+                return folded
+
+        return self.interner.binary_operation(left, node.operator, right)
+
+    def visit_UnaryOperation(self, node):
+        operand = yield node.operand
+
+        function = self.UNARY_OPERATORS.get(node.operator.__class__)
+        if (function is not None) and isinstance(operand, IRConstant):
+            folded = self.fold(_componentwise_unary, function, operand.value)
+            if folded is not None:
+                return folded
+
+        return self.interner.unary_operation(node.operator, operand)
+
+    def visit_Call(self, node):
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+
+        # NOTE constructors whose arguments only became constant here were left unresolved by ResolveGLSLTypeConstructor
+        function = GLSLPass.LOOKUP.get(node.function, node.function) if isinstance(node.function, str) else node.function
+        if (function in self.CONSTRUCTORS) and all(isinstance(_, IRConstant) for _ in args) and not node.kwargs:
+            folded = self.fold(self.construct, function, [ _.value for _ in args ])
+            if folded is not None:
+                return folded
+
+        return self.interner.call(node.function, args, node.kwargs)
+
+    def construct(self, function, values):
+        size, component_type = self.CONSTRUCTORS[function]
+
+        components = []
+        for value in values:
+            components.extend(value if isinstance(value, list) else [ value ])
+
+        if (len(values) == 1) and not isinstance(values[0], list):
+            components = components * size
+        if len(components) != size:
+            return None
+
+        components = [ component_type(_) for _ in components ]
+        return components[0] if size == 1 else components
+
+class ConstantFolding(Pass):
+    """Fold constant expressions and propagate constant assignments to the reads they reach
+
+    Runs on SSA form, where a (variable, version) pair has a single definition. Constant definitions are kept, reads no
+    longer refer to them once propagated.
+    """
+
+    REQUIRES = (
+        ResolveGLSLTypeConstructor,
+        StaticSingleAssignment,
+    )
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, constant folding skipped')
+            return node
+
+        folder = ConstantFolder(Interner())
+
+        body = []
+        for statement in node.body:
+            if isinstance(statement, IRAssign):
+                expression = folder.visit(statement.expression)
+                if isinstance(expression, IRConstant):
+                    folder.constants[(statement.identifier, statement.version)] = expression
+                else:
+                    folder.constants.pop((statement.identifier, statement.version), None)
+                body.append(IRAssign(
+                    identifier=statement.identifier,
+                    expression=expression,
+                    version=statement.version,
+                ))
+            elif isinstance(statement, IRReturn):
+                body.append(IRReturn(
+                    expression=folder.visit(statement.expression),
+                ))
+            else:
+                raise TranspilerError(f'Statement unsupported in constant folding', statement)
+
+        self.logger.debug(f'{node.identifier} : {folder.folded} expressions folded, {len(folder.constants)} constant variables')
+        node.body = body
+        return node
+
+def _is_scalar(node, value):
+    # NOTE bool is an int, but never an operand of arithmetic identities
+    return (
+        isinstance(node, IRConstant)
+        and isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+        and (node.value == value)
+    )
+
+def _is_negation(node):
+    return isinstance(node, IRUnaryOperation) and isinstance(node.operator, IRNegation)
+
+def _negate(interner, node):
+    return interner.unary_operation(IRNegation(), node)
+
+# NOTE rules take the interner and an operation whose operands are already simplified, they return the simplified
+# expression or None when they do not apply
+
+def _add_zero(interner, node):
+    if _is_scalar(node.right, 0):
+        return node.left
+    if _is_scalar(node.left, 0):
+        return node.right
+
+def _add_negation(interner, node):
+    # x + -y = x - y, -x + y = y - x
+    if _is_negation(node.right):
+        return interner.binary_operation(node.left, IRSubstraction(), node.right.operand)
+    if _is_negation(node.left):
+        return interner.binary_operation(node.right, IRSubstraction(), node.left.operand)
+
+def _substract_zero(interner, node):
+    if _is_scalar(node.right, 0):
+        return node.left
+    if _is_scalar(node.left, 0):
+        return _negate(interner, node.right)
+
+def _substract_negation(interner, node):
+    # x - -y = x + y
+    if _is_negation(node.right):
+        return interner.binary_operation(node.left, IRAddition(), node.right.operand)
+
+def _multiply_one(interner, node):
+    if _is_scalar(node.right, 1):
+        return node.left
+    if _is_scalar(node.left, 1):
+        return node.right
+
+def _multiply_minus_one(interner, node):
+    if _is_scalar(node.right, -1):
+        return _negate(interner, node.left)
+    if _is_scalar(node.left, -1):
+        return _negate(interner, node.right)
+
+def _multiply_negations(interner, node):
+    # -x * -y = x * y
+    if _is_negation(node.left) and _is_negation(node.right):
+        return interner.binary_operation(node.left.operand, IRMultiplication(), node.right.operand)
+
+def _divide_one(interner, node):
+    if _is_scalar(node.right, 1):
+        return node.left
+
+def _divide_negations(interner, node):
+    # -x / -y = x / y
+    if _is_negation(node.left) and _is_negation(node.right):
+        return interner.binary_operation(node.left.operand, IRDivision(), node.right.operand)
+
+def _divide_constant(interner, node):
+    # NOTE float division only, integer division truncates ; the reciprocal is rounded as GLSL compilers do
+    if not isinstance(node.right, IRConstant):
+        return None
+    components = node.right.value if isinstance(node.right.value, list) else [ node.right.value ]
+    if not all(isinstance(_, float) and _ != 0.0 and math.isfinite(_) for _ in components):
+        return None
+    reciprocal = _componentwise_unary(lambda _: 1.0 / _, node.right.value)
+    return interner.binary_operation(node.left, IRMultiplication(), interner.constant(reciprocal))
+
+def _power_one(interner, node):
+    if _is_scalar(node.right, 1):
+        return node.left
+
+def _power_square(interner, node):
+    if _is_scalar(node.right, 2):
+        return interner.binary_operation(node.left, IRMultiplication(), node.left)
+
+def _power_of_two(interner, node):
+    if _is_scalar(node.left, 2):
+        return interner.unary_operation(IRPower2(), node.right)
+
+def _negate_negation(interner, node):
+    # --x = x
+    if _is_negation(node.operand):
+        return node.operand.operand
+
+def _negate_substraction(interner, node):
+    # -(x - y) = y - x
+    operand = node.operand
+    if isinstance(operand, IRBinaryOperation) and isinstance(operand.operator, IRSubstraction):
+        return interner.binary_operation(operand.right, IRSubstraction(), operand.left)
+
+class AlgebraicSimplifier(ExpressionRewriter):
+    """Rewrite operations with the rules registered for their operator, until none applies
+
+    Rules map an operation to a cheaper equivalent one : fewer operations, or operations lowering to fewer or cheaper
+    sbs function nodes. Register new ones with `AlgebraicSimplifier.register(operator class, rule)`.
+    """
+
+    # operator class -> rules, tried in order
+    RULES = {
+        IRAddition       : [ _add_zero, _add_negation ],
+        IRSubstraction   : [ _substract_zero, _substract_negation ],
+        IRMultiplication : [ _multiply_one, _multiply_minus_one, _multiply_negations ],
+        IRDivision       : [ _divide_one, _divide_negations, _divide_constant ],
+        IRPower          : [ _power_one, _power_square, _power_of_two ],
+        IRNegation       : [ _negate_negation, _negate_substraction ],
+    }
+
+    def __init__(self, interner):
+        super().__init__(interner)
+        # rule name -> times applied
+        self.applied = collections.Counter()
+
+    @classmethod
+    def register(cls, operator_clazz, rule):
+        cls.RULES.setdefault(operator_clazz, []).append(rule)
+
+    def simplify(self, node):
+        # NOTE a rule may build an operation of another operator, or one further rules apply to
+        while isinstance(node, (IRBinaryOperation, IRUnaryOperation)):
+            for rule in self.RULES.get(node.operator.__class__, ()):
+                simplified = rule(self.interner, node)
+                if simplified is not None:
+                    self.applied[rule.__name__] += 1
+                    node = simplified
+                    break
+            else:
+                break
+        return node
+
+    def visit_BinaryOperation(self, node):
+        left = yield node.left
+        right = yield node.right
+        return self.simplify(self.interner.binary_operation(left, node.operator, right))
+
+    def visit_UnaryOperation(self, node):
+        operand = yield node.operand
+        return self.simplify(self.interner.unary_operation(node.operator, operand))
+
+class AlgebraicSimplification(Pass):
+    """Remove identities and reduce operations strength, see AlgebraicSimplifier for the rules"""
+
+    REQUIRES = (
+        ConstantFolding,
+    )
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, algebraic simplification skipped')
+            return node
+
+        simplifier = AlgebraicSimplifier(Interner())
+
+        body = []
+        for statement in node.body:
+            if isinstance(statement, IRAssign):
+                body.append(IRAssign(
+                    identifier=statement.identifier,
+                    expression=simplifier.visit(statement.expression),
+                    version=statement.version,
+                ))
+            else:
+                body.append(IRReturn(
+                    expression=simplifier.visit(statement.expression),
+                ))
+
+        self.logger.debug(f'{node.identifier} : {sum(simplifier.applied.values())} simplifications {dict(simplifier.applied)}')
+        node.body = body
+        return node
+
+class Vectorizer(ExpressionRewriter):
+    """Pack the scalar arguments of float vector constructors into a single vector expression
+
+    Arguments are lanes : when they are isomorphic, i.e. the same operations at the same positions, over components of
+    the same vectors or constants, `vec2(a.x * b.x + 1.0, a.y * b.y + 2.0)` is rewritten to `a.xy * b.xy + vec2(1.0, 2.0)`.
+    A lane reading a variable read by no other statement is looked through, to its definition, unless a variable the
+    definition reads was redefined since. Only components of float vectors are packed, the constructor result type.
+    """
+
+    CONSTRUCTORS = {
+        IRNumericalTypes.Float2 : 2,
+        IRNumericalTypes.Float3 : 3,
+        IRNumericalTypes.Float4 : 4,
+    }
+
+    SWIZZLE_FIELDS = ConstantFolder.SWIZZLE_FIELDS
+
+    def __init__(self, interner, chains, types):
+        super().__init__(interner)
+        self.chains = chains
+        self.types = types
+        # variable -> version of its live definition, parameters and uniforms are live until redefined
+        self.live = {}
+        self.vectorized = 0
+
+    def visit_Call(self, node):
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+
+        function = GLSLPass.LOOKUP.get(node.function, node.function) if isinstance(node.function, str) else node.function
+        if (self.CONSTRUCTORS.get(function) == len(args)) and not node.kwargs:
+            packed = trampoline(self.pack_steps(args), self.pack_steps)
+            if packed is not None:
+                self.vectorized += 1
+                return packed
+
+        return self.interner.call(node.function, args, node.kwargs)
+
+    def look_through(self, node):
+        if not isinstance(node, IRReference):
+            return node
+        definition = self.chains.definitions.get((node.variable, node.version))
+        if not isinstance(definition, IRAssign) or (len(self.chains.uses.get((node.variable, node.version), ())) != 1):
+            return node
+        is_live = all(
+            self.live.get(variable, version) == version
+            for variable, version in read_variables(definition.expression)
+        )
+        return definition.expression if is_live else node
+
+    def pack_steps(self, lanes):
+        """Vector expression computing `lanes`, None when they are not isomorphic"""
+        lanes = [ self.look_through(_) for _ in lanes ]
+        first = lanes[0]
+
+        if not all(_.__class__ is first.__class__ for _ in lanes):
+            return None
+
+        if isinstance(first, IRConstant):
+            if not all(isinstance(_.value, float) for _ in lanes):
+                return None
+            return self.interner.constant([ _.value for _ in lanes ])
+
+        if isinstance(first, IRAttribute):
+            if not all((_.variable, _.version) == (first.variable, first.version) and (len(_.fields) == 1) for _ in lanes):
+                return None
+            if self.types.get((first.variable, first.version)) not in IR_ANY_FLOAT_TYPES:
+                return None
+            fields = ''.join(_.fields for _ in lanes)
+            if not any(all(_ in family for _ in fields) for family in self.SWIZZLE_FIELDS):
+                return None
+            return self.interner.attribute(first.variable, fields, first.version)
+
+        if isinstance(first, IRBinaryOperation):
+            if not all(_.operator.__class__ is first.operator.__class__ for _ in lanes):
+                return None
+            left = yield [ _.left for _ in lanes ]
+            if left is None:
+                return None
+            right = yield [ _.right for _ in lanes ]
+            if right is None:
+                return None
+            return self.interner.binary_operation(left, first.operator, right)
+
+        if isinstance(first, IRUnaryOperation):
+            if not all(_.operator.__class__ is first.operator.__class__ for _ in lanes):
+                return None
+            operand = yield [ _.operand for _ in lanes ]
+            if operand is None:
+                return None
+            return self.interner.unary_operation(first.operator, operand)
+
+        # NOTE calls are not known to apply per component, e.g. dot
+        return None
+
+class Vectorization(Pass):
+    """Merge per-component scalar operations building a vector into vector operations, see Vectorizer
+
+    One vector operation and a swizzle per source vector replace an operation and a swizzle per component. Scalar
+    definitions only read by the vectorized constructor are left dead for DeadCodeElimination.
+    """
+
+    REQUIRES = (
+        StaticSingleAssignment,
+    )
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, vectorization skipped')
+            return node
+
+        # (variable, version) -> type
+        types = {
+            (argument.identifier, 0): argument.type
+            for argument in node.arguments
+            if isinstance(argument, IRTypedParameter)
+        }
+        vectorizer = Vectorizer(Interner(), self.get_analysis(DefUseAnalysis, node), types)
+
+        body = []
+        for statement in node.body:
+            if isinstance(statement, IRAssign):
+                expression = vectorizer.visit(statement.expression)
+                value = value_type(expression, types)
+                if value is not None:
+                    types[(statement.identifier, statement.version)] = value
+                vectorizer.live[statement.identifier] = statement.version
+                body.append(IRAssign(
+                    identifier=statement.identifier,
+                    expression=expression,
+                    version=statement.version,
+                ))
+            else:
+                body.append(IRReturn(
+                    expression=vectorizer.visit(statement.expression),
+                ))
+
+        self.logger.debug(f'{node.identifier} : {vectorizer.vectorized} vector constructors vectorized')
+        node.body = body
+        return node
+
+# type -> components
+VECTOR_SIZES = {
+    IRNumericalTypes.Float1   : 1,
+    IRNumericalTypes.Float2   : 2,
+    IRNumericalTypes.Float3   : 3,
+    IRNumericalTypes.Float4   : 4,
+    IRNumericalTypes.Integer1 : 1,
+    IRNumericalTypes.Integer2 : 2,
+    IRNumericalTypes.Integer3 : 3,
+    IRNumericalTypes.Integer4 : 4,
+}
+
+def vector_size(expression, sizes):
+    """Components of an expression value given the components of the variables it reads, None when unknown"""
+    known = {}
+    stack = [ expression ]
+    while stack:
+        node = stack[-1]
+        if id(node) in known:
+            stack.pop()
+            continue
+
+        if isinstance(node, IRBinaryOperation):
+            pending = [ _ for _ in (node.left, node.right) if id(_) not in known ]
+            if pending:
+                stack.extend(pending)
+                continue
+            left, right = known[id(node.left)], known[id(node.right)]
+            # NOTE a scalar operand is broadcast to the vector size
+            size = None if (left is None) or (right is None) else max(left, right)
+        elif isinstance(node, IRUnaryOperation):
+            if id(node.operand) not in known:
+                stack.append(node.operand)
+                continue
+            size = known[id(node.operand)]
+        elif isinstance(node, IRConstant):
+            size = len(node.value) if isinstance(node.value, list) else 1
+        elif isinstance(node, IRReference):
+            size = sizes.get((node.variable, node.version))
+        elif isinstance(node, IRAttribute):
+            size = len(node.fields)
+        elif isinstance(node, IRCall):
+            function = GLSLPass.LOOKUP.get(node.function, node.function) if isinstance(node.function, str) else node.function
+            size = VECTOR_SIZES.get(function)
+        else:
+            size = None
+
+        known[id(node)] = size
+        stack.pop()
+    return known[id(expression)]
+
+# (is integral, components) -> type
+_NUMERICAL_TYPES = {
+    (_ in IR_ANY_INTEGRAL_TYPES, size): _
+    for _, size in VECTOR_SIZES.items()
+}
+
+def value_type(expression, types, returns=None):
+    """Type of an expression value given the types of the variables it reads and of the functions it calls, None when unknown"""
+    known = {}
+    stack = [ expression ]
+    while stack:
+        node = stack[-1]
+        if id(node) in known:
+            stack.pop()
+            continue
+
+        if isinstance(node, (IRBinaryOperation, IRUnaryOperation)):
+            operands = [ node.left, node.right ] if isinstance(node, IRBinaryOperation) else [ node.operand ]
+            pending = [ _ for _ in operands if id(_) not in known ]
+            if pending:
+                stack.extend(pending)
+                continue
+            operand_types = [ known[id(_)] for _ in operands ]
+            if None in operand_types:
+                value = None
+            else:
+                # NOTE a scalar operand is broadcast to the vector size, integers are promoted to floats as in python
+                is_integral = all(_ in IR_ANY_INTEGRAL_TYPES for _ in operand_types) and not isinstance(node.operator, IRDivision)
+                value = _NUMERICAL_TYPES[(is_integral, max(map(VECTOR_SIZES.get, operand_types)))]
+        elif isinstance(node, IRConstant):
+            value = constant_type(node.value)
+        elif isinstance(node, IRReference):
+            value = types.get((node.variable, node.version))
+        elif isinstance(node, IRAttribute):
+            source = types.get((node.variable, node.version))
+            value = None if source is None else _NUMERICAL_TYPES.get((source in IR_ANY_INTEGRAL_TYPES, len(node.fields)))
+        elif isinstance(node, IRCall):
+            function = GLSLPass.LOOKUP.get(node.function, node.function) if isinstance(node.function, str) else node.function
+            value = function if function in VECTOR_SIZES else (returns or {}).get(node.function)
+        else:
+            value = None
+
+        known[id(node)] = value
+        stack.pop()
+    return known[id(expression)]
+
+class SwizzleCanonicalizer(ExpressionRewriter):
+    """Spell swizzles with xyzw, compose swizzles of variables defined as swizzles and drop identity swizzles
+
+    Runs on SSA form : a variable version is never redefined, so the operand of its definition can be read instead, as
+    long as the variable it swizzles is not redefined since.
+    """
+
+    def __init__(self, interner, chains, sizes):
+        super().__init__(interner)
+        self.chains = chains
+        self.sizes = sizes
+        # variable -> version of its live definition, parameters and uniforms are live until redefined
+        self.live = {}
+        self.rewritten = 0
+
+    def visit_Attribute(self, node):
+        fields = swizzle.canonical(node.fields)
+        if fields is None:
+            # NOTE not a swizzle, left for the target to report
+            return super().visit_Attribute(node)
+
+        variable, version = node.variable, node.version
+        definition = self.chains.definitions.get((variable, version))
+        while isinstance(definition, IRAssign) and isinstance(definition.expression, IRAttribute):
+            source = definition.expression
+            composed = swizzle.compose(fields, source.fields)
+            if (composed is None) or (self.live.get(source.variable, source.version) != source.version):
+                break
+            variable, version, fields = definition.expression.variable, definition.expression.version, composed
+            definition = self.chains.definitions.get((variable, version))
+
+        size = self.sizes.get((variable, version))
+        if (size is not None) and swizzle.is_identity(fields, size):
+            result = self.interner.reference(variable, version)
+        else:
+            result = self.interner.attribute(variable, fields, version)
+
+        if not (isinstance(result, IRAttribute) and (result.fields, result.variable) == (node.fields, node.variable)):
+            self.rewritten += 1
+        return result
+
+class CanonicalizeSwizzles(Pass):
+    """Canonicalize swizzles, see SwizzleCanonicalizer
+
+    Swizzles of the same vector selecting the same components are then the same interned expression, lowered to a
+    single sbs node, and identity swizzles (e.g. `fragCoord.xy` on a vec2) are no node at all.
+    """
+
+    REQUIRES = (
+        StaticSingleAssignment,
+    )
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, swizzle canonicalization skipped')
+            return node
+
+        # (variable, version) -> components
+        sizes = {
+            (argument.identifier, 0): VECTOR_SIZES[argument.type]
+            for argument in node.arguments
+            if isinstance(argument, IRTypedParameter) and (argument.type in VECTOR_SIZES)
+        }
+        canonicalizer = SwizzleCanonicalizer(Interner(), self.get_analysis(DefUseAnalysis, node), sizes)
+
+        body = []
+        for statement in node.body:
+            expression = canonicalizer.visit(statement.expression)
+            if isinstance(statement, IRAssign):
+                size = vector_size(expression, sizes)
+                if size is not None:
+                    sizes[(statement.identifier, statement.version)] = size
+                canonicalizer.live[statement.identifier] = statement.version
+                body.append(IRAssign(
+                    identifier=statement.identifier,
+                    expression=expression,
+                    version=statement.version,
+                ))
+            else:
+                body.append(IRReturn(
+                    expression=expression,
+                ))
+
+        self.logger.debug(f'{node.identifier} : {canonicalizer.rewritten} swizzles rewritten')
+        node.body = body
+        return node
+
+class ValueNumbering(ExpressionRewriter):
+    """Number expression values, an expression whose value was already computed is replaced by its first occurrence
+
+    Values are numbered from their operation and operands numbers, commutative operations sorting them. Reading a
+    variable has the number of its definition, so copies are looked through, and an operation whose value is held by a
+    variable is replaced by reading that variable.
+
+    A value is only reused while the variables it reads are not redefined, so rewritten expressions never read a version
+    other than the live one.
+    """
+
+    COMMUTATIVE_OPERATORS = (
+        IRAddition,
+        IRMultiplication,
+    )
+
+    def __init__(self, interner):
+        super().__init__(interner)
+        # value key -> value number
+        self.keys = {}
+        # id(node) -> value number, emitted nodes are all kept alive by the interner
+        self.numbers = {}
+        # value number -> first emitted node
+        self.emitted = {}
+        # value number -> reference to the variable holding it
+        self.holders = {}
+        # (variable, version) -> value number
+        self.variables = {}
+        # variable -> version of its live definition, parameters and uniforms are live until redefined
+        self.live = {}
+        # id(node) -> (variable, version) read by an emitted node
+        self.reads = {}
+
+    def number(self, key):
+        return self.keys.setdefault(key, len(self.keys))
+
+    def variable_number(self, variable, version):
+        number = self.variables.get((variable, version))
+        if number is None:
+            # NOTE parameters and uniforms, their value is unknown but the same for every read
+            number = self.variables[(variable, version)] = self.number((IRReference, variable, version))
+        return number
+
+    def is_live(self, node):
+        return all(
+            self.live.get(variable, version) == version
+            for variable, version in self.reads[id(node)]
+        )
+
+    def value(self, node, number, reads):
+        self.reads.setdefault(id(node), reads)
+
+        holder = self.holders.get(number)
+        if (holder is not None) and self.is_live(holder):
+            node = holder
+        else:
+            emitted = self.emitted.get(number)
+            if (emitted is not None) and self.is_live(emitted):
+                node = emitted
+            else:
+                self.emitted[number] = node
+        self.numbers[id(node)] = number
+        return node
+
+    def define(self, variable, version, node):
+        number = self.numbers[id(node)]
+        self.variables[(variable, version)] = number
+        self.live[variable] = version
+        if isinstance(node, (IRBinaryOperation, IRUnaryOperation, IRCall, IRAttribute)):
+            holder = self.holders.get(number)
+            if (holder is None) or not self.is_live(holder):
+                holder = self.holders[number] = self.interner.reference(variable, version)
+                self.reads[id(holder)] = frozenset({ (variable, version) })
+
+    def operands_reads(self, operands):
+        return frozenset().union(*( self.reads[id(_)] for _ in operands ))
+
+    def visit_Constant(self, node):
+        node = self.interner.constant(node.value)
+        return self.value(node, self.number((IRConstant, value_key(node.value))), frozenset())
+
+    def visit_Reference(self, node):
+        number = self.variable_number(node.variable, node.version)
+        return self.value(self.interner.reference(node.variable, node.version), number, frozenset({ (node.variable, node.version) }))
+
+    def visit_Attribute(self, node):
+        number = self.number((IRAttribute, self.variable_number(node.variable, node.version), node.fields))
+        return self.value(self.interner.attribute(node.variable, node.fields, node.version), number, frozenset({ (node.variable, node.version) }))
+
+    def visit_BinaryOperation(self, node):
+        left = yield node.left
+        right = yield node.right
+
+        operands = (self.numbers[id(left)], self.numbers[id(right)])
+        if isinstance(node.operator, self.COMMUTATIVE_OPERATORS):
+            operands = tuple(sorted(operands))
+
+        number = self.number((IRBinaryOperation, node.operator.__class__) + operands)
+        return self.value(self.interner.binary_operation(left, node.operator, right), number, self.operands_reads((left, right)))
+
+    def visit_UnaryOperation(self, node):
+        operand = yield node.operand
+        number = self.number((IRUnaryOperation, node.operator.__class__, self.numbers[id(operand)]))
+        return self.value(self.interner.unary_operation(node.operator, operand), number, self.reads[id(operand)])
+
+    def visit_Call(self, node):
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+        # NOTE calls are pure, GLSL builtins have no side effect and out parameters are not supported
+        number = self.number((IRCall, node.function, tuple(self.numbers[id(_)] for _ in args)))
+        return self.value(self.interner.call(node.function, args, node.kwargs), number, self.operands_reads(args))
+
+class CommonSubexpressionElimination(Pass):
+    """Compute each value once per function, with value numbering across statements
+
+    An operation already computed is shared with its first occurrence, or read from the variable it was assigned to so
+    sbs reuses its Set node. Reads of copies are redirected to the copied variable.
+    """
+
+    REQUIRES = (
+        StaticSingleAssignment,
+    )
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, common subexpression elimination skipped')
+            return node
+
+        numbering = ValueNumbering(Interner())
+        nodes_before = count_nodes(node.body)
+
+        body = []
+        for statement in node.body:
+            if isinstance(statement, IRAssign):
+                expression = numbering.visit(statement.expression)
+                numbering.define(statement.identifier, statement.version, expression)
+                body.append(IRAssign(
+                    identifier=statement.identifier,
+                    expression=expression,
+                    version=statement.version,
+                ))
+            elif isinstance(statement, IRReturn):
+                body.append(IRReturn(
+                    expression=numbering.visit(statement.expression),
+                ))
+            else:
+                raise TranspilerError(f'Statement unsupported in common subexpression elimination', statement)
+
+        node.body = body
+        self.logger.debug(f'{node.identifier} : {nodes_before - count_nodes(node.body)} nodes removed')
+        return node
+
+class DeadCodeElimination(Pass):
+    """Remove assignments whose value never reaches a Return
+
+    Liveness is propagated from the variables read by Return statements to the definitions they read, through the
+    def-use chains. A function without Return is left untouched.
+    """
+
+    REQUIRES = (
+        StaticSingleAssignment,
+    )
+
+    def visit_Function(self, node):
+        if not is_straight_line(node):
+            self.logger.debug(f'{node.identifier} : loops left, dead code elimination skipped')
+            return node
+
+        returns = [ _ for _ in node.body if isinstance(_, IRReturn) ]
+        if not returns:
+            self.logger.debug(f'{node.identifier} : no return, nothing to eliminate')
+            return node
+
+        chains = self.get_analysis(DefUseAnalysis, node)
+
+        pending = [
+            variable
+            for statement in returns
+            for variable in read_variables(statement.expression)
+        ]
+        live = set()
+        while pending:
+            variable = pending.pop()
+            if variable in live:
+                continue
+            live.add(variable)
+
+            definition = chains.definitions.get(variable)
+            if isinstance(definition, IRAssign):
+                pending.extend(read_variables(definition.expression))
+
+        body = [
+            statement
+            for statement in node.body
+            if not isinstance(statement, IRAssign) or ((statement.identifier, statement.version) in live)
+        ]
+        self.logger.debug(f'{node.identifier} : {len(node.body) - len(body)} dead assignments removed')
+        node.body = body
+        return node
+
+class UnrollLoops(Pass):
+    """Unroll loops over constant ranges, within a node budget
+
+    Each iteration assigns the loop variable its constant value then repeats the loop body, the SSA passes then fold it.
+    Inner loops are unrolled first. Function graphs have no loop construct, so a function whose loops would unroll to
+    more than NODE_BUDGET IR nodes is an error rather than left with a loop sbs cannot lower. The budget is the
+    `unroll_budget` pass option, see py2xyz.passmanager.PassManager.
+    """
+
+    OPTIONS = {
+        'unroll_budget': 'NODE_BUDGET',
+    }
+
+    # IR nodes the loops of a function may be unrolled to
+    NODE_BUDGET = 4096
+
+    @staticmethod
+    def copy(statements):
+        # NOTE expressions are immutable and shared, only statements are copied, inner loops are already unrolled
+        return [
+            IRAssign(
+                identifier=statement.identifier,
+                expression=statement.expression,
+                version=statement.version,
+            )
+            for statement in statements
+        ]
+
+    @staticmethod
+    def size(statements):
+        # NOTE SSA renames each copy, shared expressions are not shared across iterations anymore
+        return sum(count_nodes(_.expression) + 1 for _ in statements)
+
+    @staticmethod
+    def iteration(identifier, value):
+        # NOTE function graphs only have float values, integer literals stand for floats as in Python
+        return IRAssign(identifier=identifier, expression=IRConstant(value=float(value)), version=None)
+
+    def unroll(self, function, statements, is_outermost=True):
+        body = []
+        for statement in statements:
+            if not isinstance(statement, IRFor):
+                body.append(statement)
+                continue
+
+            loop_body = self.unroll(function, statement.body, is_outermost=False)
+            iterations = range(statement.start, statement.stop, statement.step)
+
+            size = len(iterations) * (self.size(loop_body) + 1)
+            if size > self.budget:
+                unrolled = f', {self.NODE_BUDGET - self.budget} used by previous loops' if self.budget < self.NODE_BUDGET else ''
+                raise TranspilerError(
+                    f'{function.identifier} : loop over {statement.identifier} unrolls to {size} IR nodes, above the '
+                    f'{self.NODE_BUDGET} nodes budget{unrolled}, see the unroll_budget pass option (--unroll-budget)',
+                    statement,
+                )
+            if is_outermost:
+                # NOTE inner loops are accounted for by their outermost loop
+                self.budget -= size
+            self.logger.debug(f'{function.identifier} : loop over {statement.identifier} unrolled {len(iterations)} times, {size} IR nodes')
+
+            for value in iterations:
+                body.append(self.iteration(statement.identifier, value))
+                body.extend(self.copy(loop_body))
+        return body
+
+    def visit_Function(self, node):
+        self.budget = self.NODE_BUDGET
+        node.body = self.unroll(node, node.body)
+        return node
+
+class VariableRenamer(ExpressionRewriter):
+    """Rebuild an expression with its variables renamed, variables without a new name (e.g. uniforms) are kept"""
+
+    def __init__(self, interner, names):
+        super().__init__(interner)
+        self.names = names
+
+    def visit_Reference(self, node):
+        return self.interner.reference(self.names.get(node.variable, node.variable), node.version)
+
+    def visit_Attribute(self, node):
+        return self.interner.attribute(self.names.get(node.variable, node.variable), node.fields, node.version)
+
+class CallInliner(ExpressionRewriter):
+    """Replace calls to `functions` by their return expression, the statements computing it are added to `prelude`"""
+
+    def __init__(self, interner, functions, sites):
+        super().__init__(interner)
+        self.functions = functions
+        self.sites = sites
+        self.prelude = []
+
+    def visit_Call(self, node):
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+
+        function = self.functions.get(node.function) if isinstance(node.function, str) else None
+        if function is None:
+            return self.interner.call(node.function, args, node.kwargs)
+        return self.inline(function, args, node)
+
+    def inline(self, function, args, node):
+        if len(args) > len(function.arguments):
+            raise TranspilerError(f'{function.identifier} takes {len(function.arguments)} arguments, {len(args)} given', node)
+
+        site = next(self.sites)
+        names = {}
+        renamer = VariableRenamer(self.interner, names)
+
+        def bind(identifier, expression):
+            names[identifier] = f'__{function.identifier}_{site}_{identifier}'
+            self.prelude.append(IRAssign(identifier=names[identifier], expression=expression, version=None))
+
+        # NOTE parameters are bound to variables rather than substituted, swizzles read them by name
+        for idx, parameter in enumerate(function.arguments):
+            expression = args[idx] if idx < len(args) else parameter.expression
+            if expression is None:
+                raise TranspilerError(f'{function.identifier} argument {parameter.identifier} missing', node)
+            bind(parameter.identifier, renamer.visit(expression) if idx >= len(args) else expression)
+
+        for statement in function.body:
+            expression = renamer.visit(statement.expression)
+            if isinstance(statement, IRReturn):
+                return expression
+            bind(statement.identifier, expression)
+
+class InlineFunctions(Pass):
+    """Inline calls to module functions chosen by a size and call count cost model
+
+    Function graph instances are expensive to evaluate, small or rarely called functions are inlined at every call site
+    and dropped from the module once they are no longer called. Decorating a function with `@inline` or `@noinline`
+    overrides the cost model. Recursive functions are never inlined.
+    """
+
+    # IR nodes of a function body, at most, to always be inlined
+    SIZE_THRESHOLD = 32
+    # IR nodes a function may add to the module once inlined at all of its call sites
+    GROWTH_BUDGET = 256
+
+    def should_inline(self, function, calls):
+        if 'noinline' in function.decorators:
+            return False
+        if 'inline' in function.decorators:
+            return True
+
+        size = count_nodes(function.body)
+        return (size <= self.SIZE_THRESHOLD) or (size * (calls - 1) <= self.GROWTH_BUDGET)
+
+    @staticmethod
+    def is_inlinable(function):
+        # NOTE straight-line body whose single Return ends it
+        return (
+            bool(function.body)
+            and isinstance(function.body[-1], IRReturn)
+            and all(isinstance(_, IRAssign) for _ in function.body[:-1])
+        )
+
+    @staticmethod
+    def calls(function):
+        """Call nodes of a function body, each shared call once"""
+        calls = []
+        seen = set()
+        stack = list(function.body)
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, (IRStatement, IRExpression)) or id(node) in seen:
+                continue
+            seen.add(id(node))
+            if isinstance(node, IRCall):
+                calls.append(node)
+            stack.extend(getattr(node, field, None) for field in node._fields)
+        return calls
+
+    @staticmethod
+    def order(callees):
+        """Functions with their callees first, and the functions on a call cycle"""
+        order, recursive = [], set()
+        visiting, visited = [], set()
+
+        def visit(identifier):
+            # NOTE call graphs are shallow, unlike expressions
+            if identifier in visiting:
+                recursive.update(visiting[visiting.index(identifier):])
+                return
+            if identifier in visited:
+                return
+            visiting.append(identifier)
+            for callee in callees[identifier]:
+                visit(callee)
+            visiting.pop()
+            visited.add(identifier)
+            order.append(identifier)
+
+        for identifier in callees:
+            visit(identifier)
+        return order, recursive
+
+    def inline_statements(self, statements, inlined, interner, sites):
+        body = []
+        for statement in statements:
+            if isinstance(statement, IRFor):
+                body.append(IRFor(
+                    identifier=statement.identifier,
+                    start=statement.start,
+                    stop=statement.stop,
+                    step=statement.step,
+                    body=self.inline_statements(statement.body, inlined, interner, sites),
+                ))
+                continue
+
+            inliner = CallInliner(interner, inlined, sites)
+            expression = inliner.visit(statement.expression)
+            body.extend(inliner.prelude)
+            if isinstance(statement, IRAssign):
+                body.append(IRAssign(identifier=statement.identifier, expression=expression, version=statement.version))
+            else:
+                body.append(IRReturn(expression=expression))
+        return body
+
+    def inline_calls(self, function, inlined):
+        return IRFunction(
+            identifier=function.identifier,
+            arguments=function.arguments,
+            body=self.inline_statements(function.body, inlined, Interner(), itertools.count()),
+            returns=function.returns,
+            decorators=function.decorators,
+        )
+
+    def visit_Module(self, node):
+        functions = {
+            subnode.identifier: subnode
+            for subnode in node.content
+            if isinstance(subnode, IRFunction)
+        }
+        callees = {
+            identifier: [ call.function for call in self.calls(function) if call.function in functions ]
+            for identifier, function in functions.items()
+        }
+        calls = collections.Counter(itertools.chain.from_iterable(callees.values()))
+
+        order, recursive = self.order(callees)
+        for identifier in sorted(recursive):
+            self.logger.warning(f'{identifier} is recursive, it is not inlined')
+
+        # NOTE callees are inlined into a function before its own size is weighted
+        inlined = {}
+        for identifier in order:
+            function = functions[identifier]
+            if any(callee in inlined for callee in callees[identifier]):
+                function = functions[identifier] = self.inline_calls(function, inlined)
+
+            if (identifier in recursive) or not calls[identifier] or not self.is_inlinable(function):
+                continue
+            if self.should_inline(function, calls[identifier]):
+                self.logger.info(f'{identifier} inlined at {calls[identifier]} call sites')
+                inlined[identifier] = function
+
+        return IRModule(
+            description=node.description,
+            content=[
+                functions[subnode.identifier] if isinstance(subnode, IRFunction) else subnode
+                for subnode in node.content
+                if not (isinstance(subnode, IRFunction) and (subnode.identifier in inlined))
+            ],
+        )
+
+class OverloadCallResolver(ExpressionRewriter):
+    """Rebuild an expression calling the overloads of module functions selected by the types of their arguments"""
+
+    def __init__(self, interner, resolve, types):
+        """`resolve(call, argument types)` is the identifier and return type of the overload called, None for other calls"""
+        super().__init__(interner)
+        self.resolve = resolve
+        # (variable, version) -> type, None when unknown
+        self.types = types
+        # overload identifier -> return type
+        self.returns = {}
+
+    def visit_Call(self, node):
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+
+        resolved = self.resolve(node, [ value_type(_, self.types, self.returns) for _ in args ])
+        if resolved is None:
+            return self.interner.call(node.function, args, node.kwargs)
+
+        identifier, return_type = resolved
+        self.returns[identifier] = return_type
+        return self.interner.call(identifier, args, node.kwargs)
+
+class ResolveFunctionOverloads(Pass):
+    """Type the parameters of functions declared without annotations, with an overload per feasible parameter types
+
+    Feasible types are inferred from the operators the function applies (see py2xyz.sbs.analysis.ArgumentTypeInference),
+    each overload is a copy of the function named after its parameter types, e.g. `add_f1_f1`. Calls are rewritten to
+    the overload matching the types of their arguments, functions without feasible types are skipped with a warning.
+    """
+
+    # NOTE types untyped parameters may take, function graphs only get float parameters for now
+    PARAMETER_TYPES = IR_ANY_FLOAT_TYPES
+
+    def parameter_type(self, parameter):
+        if parameter.annotation is None:
+            return None
+        known_type = GLSLPass.LOOKUP.get(parameter.annotation) or next((
+            type_symbol
+            for type_symbol in IR_ANY_TYPES
+            if type_symbol.value == parameter.annotation
+        ), None)
+        if known_type is None:
+            raise TranspilerError(f'Unknown parameter type: {parameter.annotation}', parameter)
+        return known_type
+
+    @staticmethod
+    def typed_parameter(parameter, parameter_type):
+        expression = parameter.expression
+        # NOTE integer default values of float parameters, see py2xyz.sbs.analysis.constant_types
+        if isinstance(expression, IRConstant) and (parameter_type in IR_ANY_FLOAT_TYPES):
+            value = expression.value
+            expression = IRConstant(value=list(map(float, value)) if isinstance(value, list) else float(value))
+        return IRTypedParameter(
+            identifier=parameter.identifier,
+            type=parameter_type,
+            annotation=parameter.annotation,
+            expression=expression,
+        )
+
+    def overloads(self, function):
+        is_untyped = any(
+            isinstance(_, IRParameter) and (_.annotation is None)
+            for _ in function.arguments
+        )
+        if not is_untyped:
+            return [ function ]
+
+        overloads = infer_argument_types(
+            function,
+            [ self.parameter_type(_) if isinstance(_, IRParameter) else _.type for _ in function.arguments ],
+            GLSLPass.LOOKUP,
+            self.PARAMETER_TYPES,
+        )
+        if not overloads:
+            self.logger.warning(f'{function.identifier} skipped, it has no parameter types among {", ".join(sorted(_.value for _ in self.PARAMETER_TYPES))} satisfying its operations')
+            return []
+        self.logger.debug(f'{function.identifier} : {len(overloads)} overloads')
+
+        return [
+            IRFunction(
+                identifier=function.identifier if len(overloads) == 1 else '_'.join([ function.identifier, *( _.value for _ in parameter_types ) ]),
+                arguments=[
+                    self.typed_parameter(parameter, parameter_type)
+                    for parameter, parameter_type in zip(function.arguments, parameter_types)
+                ],
+                body=list(function.body),
+                returns=function.returns,
+                decorators=function.decorators,
+            )
+            for parameter_types in overloads
+        ]
+
+    def argument_type(self, argument):
+        if isinstance(argument, IRTypedParameter):
+            return argument.type
+        try:
+            return self.parameter_type(argument)
+        except TranspilerError:
+            # NOTE reported by the passes typing parameters
+            return None
+
+    @staticmethod
+    def promotions(argument_types, function):
+        """Integer arguments promoted to float parameters of `function`, None when the argument types do not match"""
+        if len(argument_types) > len(function.arguments):
+            return None
+        promotions = 0
+        for argument_type, parameter in zip(argument_types, function.arguments):
+            if (argument_type is None) or (argument_type == parameter.type):
+                continue
+            if (argument_type in IR_ANY_INTEGRAL_TYPES) and (parameter.type == _NUMERICAL_TYPES[(False, VECTOR_SIZES[argument_type])]):
+                promotions += 1
+                continue
+            return None
+        return promotions
+
+    def select(self, caller, call, argument_types):
+        overloads = self.resolved[call.function]
+        if not overloads:
+            raise TranspilerError(f'{caller.identifier} calls {call.function}, which has no parameter types satisfying its operations', call)
+        if len(overloads) == 1:
+            return overloads[0]
+
+        candidates = collections.defaultdict(list)
+        for overload in overloads:
+            promotions = self.promotions(argument_types, overload)
+            if promotions is not None:
+                candidates[promotions].append(overload)
+
+        if not candidates:
+            names = ', '.join('?' if _ is None else _.value for _ in argument_types)
+            raise TranspilerError(f'{caller.identifier} calls {call.function} with arguments of types ({names}), no overload matches', call)
+        selected = candidates[min(candidates)]
+        if len(selected) > 1:
+            raise TranspilerError(f'{caller.identifier} call to {call.function} is ambiguous between {", ".join(_.identifier for _ in selected)}, annotate the types of its arguments', call)
+        return selected[0]
+
+    def resolve_call(self, caller, call, argument_types):
+        if not (isinstance(call.function, str) and (call.function in self.resolved)):
+            return None
+        overload = self.select(caller, call, argument_types)
+        _, return_type = self.resolve_calls(overload)
+        return overload.identifier, return_type
+
+    def resolve_statements(self, statements, resolver, return_types):
+        body = []
+        for statement in statements:
+            if isinstance(statement, IRFor):
+                resolver.types[(statement.identifier, None)] = None
+                body.append(IRFor(
+                    identifier=statement.identifier,
+                    start=statement.start,
+                    stop=statement.stop,
+                    step=statement.step,
+                    body=self.resolve_statements(statement.body, resolver, return_types),
+                ))
+                continue
+
+            expression = resolver.visit(statement.expression)
+            expression_type = value_type(expression, resolver.types, resolver.returns)
+            if isinstance(statement, IRAssign):
+                resolver.types[(statement.identifier, None)] = expression_type
+                body.append(IRAssign(identifier=statement.identifier, expression=expression, version=statement.version))
+            else:
+                return_types.add(expression_type)
+                body.append(IRReturn(expression=expression))
+        return body
+
+    def resolve_calls(self, function):
+        """`function` calling the overloads selected by the types of their arguments, and its return type"""
+        if function.identifier in self.rewritten:
+            return self.rewritten[function.identifier]
+        # NOTE the return type of recursive calls is unknown
+        self.rewritten[function.identifier] = ( function, None )
+
+        types = {
+            (_.identifier, None): self.argument_type(_)
+            for _ in function.arguments
+        }
+        resolver = OverloadCallResolver(Interner(), functools.partial(self.resolve_call, function), types)
+        return_types = set()
+        body = self.resolve_statements(function.body, resolver, return_types)
+
+        self.rewritten[function.identifier] = (
+            IRFunction(
+                identifier=function.identifier,
+                arguments=function.arguments,
+                body=body,
+                returns=function.returns,
+                decorators=function.decorators,
+            ),
+            next(iter(return_types)) if len(return_types) == 1 else None,
+        )
+        return self.rewritten[function.identifier]
+
+    def visit_Module(self, node):
+        # function identifier -> overloads, none when the function is skipped
+        self.resolved = {
+            subnode.identifier: self.overloads(subnode)
+            for subnode in node.content
+            if isinstance(subnode, IRFunction)
+        }
+        # overload identifier -> (overload calling overloads, return type)
+        self.rewritten = {}
+
+        return IRModule(
+            description=node.description,
+            content=list(itertools.chain.from_iterable(
+                [ self.resolve_calls(_)[0] for _ in self.resolved[subnode.identifier] ] if isinstance(subnode, IRFunction) else ( subnode, )
+                for subnode in node.content
+            )),
+        )
+
+# NOTE declared once GLSL passes exist, the image entry point matches on typed parameters
+ShaderToyImageEntryPoint.REQUIRES = (
+    ResolveIRParameterType,
+    ResolveGLSLParameterType,
+)
 
 DEFAULT_PRE_PASSES = [
 ]
 
+# NOTE run over the whole module, before post-passes lower each function on its own
+DEFAULT_MODULE_PASSES = [
+    # NOTE helpers are inlinable once their loops are unrolled
+    UnrollLoops,
+    InlineFunctions,
+    # NOTE after inlining, helpers only called with known types need no overload
+    ResolveFunctionOverloads,
+]
+
 DEFAULT_POST_PASSES = [
     ResolveIRParameterType,
     ResolveGLSLParameterType,
     ResolveGLSLTypeConstructor,
     ShaderToyImageEntryPoint,
+    # NOTE passes adding definitions must run before
+    StaticSingleAssignment,
+    ConstantFolding,
+    AlgebraicSimplification,
+    Vectorization,
+    CanonicalizeSwizzles,
+    CommonSubexpressionElimination,
+    DeadCodeElimination,
 ]
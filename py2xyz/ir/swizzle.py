@@ -0,0 +1,38 @@
+# NOTE the three spellings of the components, a swizzle uses a single one ; xyzw is the canonical spelling
+FIELDS = (
+    'xyzw',
+    'rgba',
+    'stpq',
+)
+
+CANONICAL_FIELDS = FIELDS[0]
+
+def indices(fields):
+    """Component indices selected by `fields`, None when they mix spellings or are not components"""
+    family = next((
+        family
+        for family in FIELDS
+        if all(_ in family for _ in fields)
+    ), None)
+    if (family is None) or not (1 <= len(fields) <= 4):
+        return None
+    return tuple(map(family.index, fields))
+
+def canonical(fields):
+    """`fields` in the canonical spelling, None when they are not a swizzle"""
+    selected = indices(fields)
+    if selected is None:
+        return None
+    return ''.join(CANONICAL_FIELDS[_] for _ in selected)
+
+def compose(outer, inner):
+    """Fields of `v.<inner>.<outer>` as a single swizzle of `v`, None when `outer` selects past `inner` components"""
+    outer_indices = indices(outer)
+    inner_indices = indices(inner)
+    if (outer_indices is None) or (inner_indices is None) or (max(outer_indices) >= len(inner_indices)):
+        return None
+    return ''.join(CANONICAL_FIELDS[inner_indices[_]] for _ in outer_indices)
+
+def is_identity(fields, size):
+    """Whether `fields` select every component of a `size` components vector, in order"""
+    return indices(fields) == tuple(range(size))
@@ -0,0 +1,181 @@
+import re
+import abc
+import pickle
+import hashlib
+import logging
+import collections
+
+logger = logging.getLogger(__name__)
+
+from py2xyz import LazyDump, dump_logger, TranspilerError
+
+from py2xyz.profiling import profiled
+
+DEFAULT_MEMO_SIZE = 128
+
+class Analysis(abc.ABC):
+    """Read-only computation over a node, cached by the PassManager and shared between passes
+
+    A cached result lives until a pass which does not list the analysis in its `PRESERVES` runs.
+    """
+
+    def __init__(self, manager=None):
+        self.manager = manager
+
+    @abc.abstractmethod
+    def run(self, node):
+        pass
+
+def make_pass_filter(patterns):
+    if not patterns:
+        return None
+
+    def __filter_pass(pass_clazz):
+        return any(
+            re.search(_, f'{pass_clazz.__module__}.{pass_clazz.__name__}')
+            for _ in patterns
+        )
+    return __filter_pass
+
+def fingerprint(node):
+    """Structural digest of `node`, identical trees share the same fingerprint"""
+    try:
+        return hashlib.blake2b(pickle.dumps(node, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).digest()
+    except (pickle.PicklingError, RecursionError, TypeError):
+        return None
+
+class PassManager:
+    """Order, run and memoize a set of passes over a node
+
+    Passes declare as class attributes :
+        REQUIRES  : passes that must run before them, pulled in when filtered out, and analyses they consume
+        PRESERVES : analyses whose cached results stay valid once they ran
+        OPTIONS   : option name -> attribute of the pass it overrides, e.g. { 'unroll_budget': 'NODE_BUDGET' }
+
+    Passes are instantiated once per manager and receive it as their `manager` attribute, so they can query
+    `manager.get_analysis(AnalysisClazz, node)`. `options` are set on the passes declaring them.
+
+    When `memoize` is enabled, a pass whose input is structurally identical to one it already processed is skipped and
+    its previous output is restored instead. Fingerprinting pickles the input and output of every pass, which costs about
+    as much as the passes themselves : only long-lived processes recompiling similar sources (server, watch, API) opt in.
+    """
+
+    def __init__(self, passes, pass_filter=None, stage='post-pass', language='ir', memoize=False, memo_size=DEFAULT_MEMO_SIZE, options=None):
+        self.stage = stage
+        self.language = language
+        self.memoize = memoize
+        self.memo_size = memo_size
+
+        self.schedule = self.order(passes, pass_filter)
+        self.passes = [ CompilationPassClazz() for CompilationPassClazz in self.schedule ]
+        for compilation_pass in self.passes:
+            compilation_pass.manager = self
+            for name, attribute in getattr(compilation_pass, 'OPTIONS', {}).items():
+                if name in (options or {}):
+                    setattr(compilation_pass, attribute, options[name])
+
+        # (pass class, pass configuration, input fingerprint) -> pickled output, None when the pass left its input unchanged
+        self.memo = collections.OrderedDict()
+
+        # (analysis class, id(node)) -> (node, result)
+        self.analyses = { }
+
+    @staticmethod
+    def order(passes, pass_filter=None):
+        """Topological order of the selected passes and their requirements, declaration order breaks ties"""
+        available = list(passes)
+        rank = { clazz: idx for idx, clazz in enumerate(available) }
+
+        selected = [ _ for _ in available if (pass_filter is None) or pass_filter(_) ]
+        pending = list(selected)
+        while pending:
+            clazz = pending.pop()
+            for requirement in getattr(clazz, 'REQUIRES', ()):
+                # NOTE requirements outside of this stage (e.g. analyses, passes of an earlier stage) only matter for ordering elsewhere
+                if (requirement in rank) and (requirement not in selected):
+                    logger.debug(f'{requirement.__name__} scheduled, required by {clazz.__name__}')
+                    selected.append(requirement)
+                    pending.append(requirement)
+
+        predecessors = {
+            clazz: {
+                requirement
+                for requirement in getattr(clazz, 'REQUIRES', ())
+                if requirement in selected
+            }
+            for clazz in selected
+        }
+
+        ordered = []
+        while predecessors:
+            ready = sorted(
+                (clazz for clazz, requirements in predecessors.items() if not requirements),
+                key=rank.get,
+            )
+            if not ready:
+                raise TranspilerError(f'Cyclic pass requirements between {", ".join(sorted(_.__name__ for _ in predecessors))}')
+
+            clazz = ready[0]
+            ordered.append(clazz)
+            del predecessors[clazz]
+            for requirements in predecessors.values():
+                requirements.discard(clazz)
+        return ordered
+
+    def get_analysis(self, AnalysisClazz, node):
+        key = (AnalysisClazz, id(node))
+        cached = self.analyses.get(key)
+        if (cached is not None) and (cached[0] is node):
+            return cached[1]
+
+        result = AnalysisClazz(self).run(node)
+        self.analyses[key] = (node, result)
+        return result
+
+    def invalidate(self, preserved=()):
+        self.analyses = {
+            key: value
+            for key, value in self.analyses.items()
+            if key[0] in preserved
+        }
+
+    @staticmethod
+    def configuration(compilation_pass):
+        """Values of the options of a pass, its output depends on them as much as on its input"""
+        return tuple(
+            (attribute, getattr(compilation_pass, attribute))
+            for attribute in getattr(compilation_pass, 'OPTIONS', {}).values()
+        )
+
+    def _memoized(self, compilation_pass, node, profiler):
+        clazz = compilation_pass.__class__
+        key = (clazz, self.configuration(compilation_pass), fingerprint(node)) if self.memoize else None
+
+        if (key is not None) and (key[-1] is not None) and (key in self.memo):
+            self.memo.move_to_end(key)
+            logger.info(f'{self.stage} {clazz.__name__} skipped, input unchanged')
+            output = self.memo[key]
+            return node if output is None else pickle.loads(output)
+
+        result = profiled(profiler, self.language, clazz.__name__, compilation_pass.visit, node)
+
+        if (key is not None) and (key[-1] is not None):
+            output_fingerprint = fingerprint(result)
+            if output_fingerprint == key[-1]:
+                self.memo[key] = None
+            elif output_fingerprint is not None:
+                self.memo[key] = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            while len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+
+        return result
+
+    def run(self, node, profiler=None):
+        dumper = dump_logger(self.language)
+        for idx, compilation_pass in enumerate(self.passes, 1):
+            clazz = compilation_pass.__class__
+            logger.info(f'{self.stage} {idx} - {clazz.__name__}')
+            node = self._memoized(compilation_pass, node, profiler)
+            self.invalidate(getattr(clazz, 'PRESERVES', ()))
+            dumper.debug('%s %s\n%s', self.stage, clazz.__name__, LazyDump(node))
+        return node
@@ -0,0 +1,267 @@
+import ast
+import sys
+import logging
+import tempfile
+import functools
+import importlib
+import collections
+import concurrent.futures
+
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+from py2xyz import LazyDump, dump_logger
+
+from py2xyz.ir.compiler import ModuleTranspiler as IRModuleTranspiler
+
+from py2xyz.ir.passes import (
+    DEFAULT_PRE_PASSES as DEFAULT_IR_PRE_PASSES,
+    DEFAULT_MODULE_PASSES as DEFAULT_IR_MODULE_PASSES,
+    DEFAULT_POST_PASSES as DEFAULT_IR_POST_PASSES,
+)
+
+from py2xyz.py.passes import (
+    DEFAULT_PRE_PASSES as DEFAULT_PY_PRE_PASSES,
+    DEFAULT_POST_PASSES as DEFAULT_PY_POST_PASSES,
+)
+
+from py2xyz.sbs.passes import (
+    DEFAULT_PRE_PASSES as DEFAULT_SBS_PRE_PASSES,
+    DEFAULT_POST_PASSES as DEFAULT_SBS_POST_PASSES,
+)
+
+from py2xyz.ir.ast import (
+    Module as IRModule,
+)
+
+from py2xyz.sbs.ast import (
+    Package as SBSPackage,
+)
+
+from py2xyz.sbs.compiler import (
+    PackageTranspiler       as SubstancePackageTranspiler,
+    FunctionGraphTranspiler as SubstanceFunctionGraphTranspiler,
+)
+
+from py2xyz.passmanager import (
+    PassManager,
+    make_pass_filter,
+)
+
+from py2xyz.profiling import (
+    Profiler,
+    profiled,
+)
+
+# target -> module of its code generator, imported once the target is selected as it pulls heavy dependencies (e.g. pysbs)
+BACKENDS = {
+    'sbs': 'py2xyz.sbs.codegen',
+}
+
+@functools.lru_cache(maxsize=None)
+def load_backend(target):
+    """Code generator module of `target`, raise ImportError when its dependencies are missing"""
+    logger.debug(f'loading {target} backend {BACKENDS[target]}')
+    return importlib.import_module(BACKENDS[target])
+
+# NOTE CPython builds the AST recursively : deep expressions need a higher limit, kept low enough for an 8MiB C stack
+PARSE_RECURSION_LIMIT = 25000
+
+def parse(source, filename='<string>'):
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, PARSE_RECURSION_LIMIT))
+    try:
+        return ast.parse(source, filename=filename)
+    finally:
+        sys.setrecursionlimit(limit)
+
+class PassManagers(collections.namedtuple('PassManagers', ['py_post', 'ir_pre', 'ir_module', 'ir_post', 'sbs_pre', 'sbs_post'])):
+    pass
+
+def make_pass_managers(passes=None, memoize=False, options=None):
+    """Pass managers of every pipeline stage, `passes` being regex patterns selecting passes by qualified name
+
+    `memoize` skips passes over inputs they already processed, see py2xyz.passmanager.PassManager
+    `options` are pass options by name, e.g. { 'unroll_budget': 8192 }, see py2xyz.passmanager.PassManager
+    """
+    pass_filter = make_pass_filter(passes)
+    return PassManagers(
+        py_post=PassManager(DEFAULT_PY_POST_PASSES, pass_filter, language='py', memoize=memoize, options=options),
+        ir_pre=PassManager(DEFAULT_IR_PRE_PASSES, pass_filter, stage='pre-pass', language='py', memoize=memoize, options=options),
+        ir_module=PassManager(DEFAULT_IR_MODULE_PASSES, pass_filter, stage='module-pass', memoize=memoize, options=options),
+        ir_post=PassManager(DEFAULT_IR_POST_PASSES, pass_filter, memoize=memoize, options=options),
+        sbs_pre=PassManager(DEFAULT_SBS_PRE_PASSES, pass_filter, stage='pre-pass', memoize=memoize, options=options),
+        sbs_post=PassManager(DEFAULT_SBS_POST_PASSES, pass_filter, language='sbs', memoize=memoize, options=options),
+    )
+
+@functools.lru_cache(maxsize=8)
+def _default_pass_managers(passes, options, memoize):
+    return make_pass_managers(passes, memoize=memoize, options=dict(options))
+
+def default_pass_managers(passes=None, options=None, memoize=False):
+    """Pass managers shared by every compilation of this process with the same `passes` and `options`
+
+    Long-lived processes `memoize` so that recompiling a source only runs the passes whose input changed.
+    """
+    return _default_pass_managers(tuple(sorted(passes or ())), tuple(sorted((options or {}).items())), memoize)
+
+def output_path(output):
+    return Path(output if isinstance(output, (str, Path)) else output.name)
+
+def generate_package(ast_sbs, output):
+    """Write `ast_sbs` Substance package to `output`, return the written filepath"""
+    logger.info(f'codegen -> {output}')
+    filepath = output_path(output)
+    if isinstance(output, (str, Path)):
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        output = open(filepath, 'wt', encoding='utf-8')
+    PackageGenerator = load_backend('sbs').PackageGenerator
+    with PackageGenerator(output) as codegen:
+        codegen.visit(ast_sbs)
+    return filepath
+
+def generate_package_bytes(ast_sbs):
+    """Serialized `ast_sbs` Substance package
+
+    pysbs only writes documents to a filepath : the package is written to a file in a temporary folder, read back then
+    deleted, so this needs a writable temporary directory (see tempfile.gettempdir).
+    """
+    with tempfile.TemporaryDirectory(prefix='py2sbs-') as folder:
+        filepath = generate_package(ast_sbs, Path(folder) / 'package.sbs')
+        return filepath.read_bytes() if filepath.is_file() else None
+
+def lower_module(ast_ir, target=None, pass_managers=None, profiler=None):
+    """Run IR post-passes over `ast_ir` then, for the sbs target, lower it to a Substance package"""
+    ast_ir = pass_managers.ir_post.run(ast_ir, profiler=profiler)
+
+    # Target Language
+    if target != 'sbs':
+        return ast_ir
+
+    logger.info(f'py -> sbs')
+
+    ast_ir = pass_managers.sbs_pre.run(ast_ir, profiler=profiler)
+
+    transformer = SubstancePackageTranspiler()
+    ast_sbs = profiled(profiler, 'sbs', SubstancePackageTranspiler.__name__, transformer.visit, ast_ir)
+
+    dump_logger('sbs').debug('SBS IR\n%s', LazyDump(ast_sbs))
+
+    ast_sbs = pass_managers.sbs_post.run(ast_sbs, profiler=profiler)
+    return ast_sbs
+
+def lower_function(ir_node, target=None, passes=None, pass_managers=None, profile=False, source='<string>', options=None, trace_memory=False):
+    """Run IR post-passes over a top-level IR node then, for the sbs target, lower it to a function graph
+
+    Unit of work of per-function compilation, return the lowered node and the profile records
+    """
+    pass_managers = pass_managers or default_pass_managers(passes, options)
+    profiler = Profiler(source=source, trace_memory=trace_memory) if profile else None
+
+    node = pass_managers.ir_post.run(ir_node, profiler=profiler)
+    if target == 'sbs':
+        node = pass_managers.sbs_pre.run(node, profiler=profiler)
+
+        transformer = SubstanceFunctionGraphTranspiler()
+        node = profiled(profiler, 'sbs', SubstanceFunctionGraphTranspiler.__name__, transformer.visit, node)
+
+        node = pass_managers.sbs_post.run(node, profiler=profiler)
+    return node, (profiler.records if profiler else [])
+
+def lower_functions(ast_ir, target=None, passes=None, pass_managers=None, jobs=None, profiler=None, options=None):
+    """Lower every top-level node of `ast_ir` in a pool of `jobs` processes, merged back in module order"""
+    worker = functools.partial(
+        lower_function,
+        target=target,
+        passes=passes,
+        pass_managers=pass_managers,
+        profile=profiler is not None,
+        source=profiler.source if profiler else '<string>',
+        options=options,
+        trace_memory=profiler.trace_memory if profiler else False,
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        lowered = list(executor.map(worker, ast_ir.content))
+
+    if profiler is not None:
+        profiler.records.extend(record for _, records in lowered for record in records)
+
+    ModuleClazz = SBSPackage if target == 'sbs' else IRModule
+    return ModuleClazz(
+        description=ast_ir.description,
+        content=[ node for node, _ in lowered if node is not None ],
+    )
+
+def compile_source(source, filename='<string>', target=None, output=None, passes=None, cache=None, profiler=None, pass_managers=None, function_jobs=None, options=None):
+    """Run the whole pipeline over `source`, raise on invalid DSL or transpilation failure
+
+    `output` is either a writable stream or a filepath, opened only once codegen is reached
+    `profiler` (see py2xyz.profiling.Profiler) records the cost of each stage
+    `pass_managers` (see make_pass_managers) overrides the ones built from `passes`
+    `function_jobs` above 1 lowers top-level functions in that many worker processes, see lower_functions
+    `options` are pass options by name, see make_pass_managers
+    """
+    if cache is not None:
+        cache_key = cache.make_key(source, passes=passes, target=target, options=options)
+        cache_stage = 'sbs' if target == 'sbs' else 'ir'
+
+        cached_node = cache.get(cache_key, cache_stage)
+        if cached_node is not None:
+            if not (output and target):
+                logger.info(f'{filename} : {cache_stage} stage up-to-date')
+                return cached_node
+
+            cached_package = cache.get_bytes(cache_key, 'package')
+            if cached_package is not None:
+                logger.info(f'{filename} : package up-to-date')
+                filepath = output_path(output)
+                if not isinstance(output, (str, Path)):
+                    output.close()
+                filepath.parent.mkdir(parents=True, exist_ok=True)
+                filepath.write_bytes(cached_package)
+                return cached_node
+
+    custom_pass_managers = pass_managers
+    pass_managers = pass_managers or default_pass_managers(passes, options)
+
+    # Source Language
+    ast_source = profiled(profiler, 'py', 'parse', parse, source, filename=filename)
+    dump_logger('py').debug('source\n%s', LazyDump(ast_source))
+
+    ast_source = pass_managers.py_post.run(ast_source, profiler=profiler)
+
+    # IR Language
+    ast_source = pass_managers.ir_pre.run(ast_source, profiler=profiler)
+
+    transformer = IRModuleTranspiler()
+    ast_ir = profiled(profiler, 'ir', IRModuleTranspiler.__name__, transformer.visit, ast_source)
+
+    dump_logger('ir').debug('IR\n%s', LazyDump(ast_ir))
+
+    ast_ir = pass_managers.ir_module.run(ast_ir, profiler=profiler)
+
+    if (function_jobs or 1) > 1:
+        logger.info(f'lowering {len(ast_ir.content)} functions with {function_jobs} workers')
+        ast_lowered = lower_functions(ast_ir, target=target, passes=passes, pass_managers=custom_pass_managers, jobs=function_jobs, profiler=profiler, options=options)
+    else:
+        ast_lowered = lower_module(ast_ir, target=target, pass_managers=pass_managers, profiler=profiler)
+
+    if target != 'sbs':
+        if cache is not None:
+            cache.put(cache_key, cache_stage, ast_lowered)
+        return ast_lowered
+
+    ast_sbs = ast_lowered
+
+    if cache is not None:
+        cache.put(cache_key, cache_stage, ast_sbs)
+
+    # Codegen Language
+    if output:
+        filepath = profiled(profiler, 'codegen', 'PackageGenerator', generate_package, ast_sbs, output)
+
+        if cache is not None and filepath.is_file():
+            cache.put_bytes(cache_key, 'package', filepath.read_bytes())
+
+    return ast_sbs
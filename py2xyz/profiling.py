@@ -0,0 +1,153 @@
+import ast
+import sys
+import json
+import time
+import logging
+import tracemalloc
+import collections
+
+from py2xyz.slotted import NODE_TYPES
+
+logger = logging.getLogger(__name__)
+
+class StageRecord(collections.namedtuple('StageRecord', ['source', 'stage', 'name', 'wall', 'cpu', 'nodes_before', 'nodes_after', 'peak_memory'])):
+    pass
+
+def count_nodes(node):
+    """Count distinct AST nodes reachable from `node`, SBS graphs share nodes so each one is counted once"""
+    if node is None:
+        return 0
+
+    seen = set()
+    stack = [ node ]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (list, tuple)):
+            stack.extend(current)
+            continue
+        if not isinstance(current, NODE_TYPES) or id(current) in seen:
+            continue
+        seen.add(id(current))
+        stack.extend(value for _, value in ast.iter_fields(current))
+    return len(seen)
+
+def profiled(profiler, stage, name, function, node, *args, **kwargs):
+    """Call `function(node, *args, **kwargs)`, through `profiler` if any"""
+    if profiler is None:
+        return function(node, *args, **kwargs)
+    return profiler.run(stage, name, function, node, *args, **kwargs)
+
+def traced(function, node, *args, **kwargs):
+    """Call `function(node, *args, **kwargs)` tracing its allocations, return its result and its peak memory"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        try:
+            result = function(node, *args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, peak
+
+    # NOTE traced by someone else, left running : only its peak since the call is measured, which needs python 3.9+
+    if sys.version_info < (3, 9):
+        logger.debug('tracemalloc is already tracing, peak memory is not measured before python 3.9')
+        return function(node, *args, **kwargs), None
+
+    tracemalloc.reset_peak()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    result = function(node, *args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    return result, max(0, peak - memory_before)
+
+class Profiler:
+    """Record wall time, CPU time and node counts of every pipeline stage, or their tracemalloc peak
+
+    Tracing allocations slows every stage down by an uneven factor, so a profiler records either times or, with
+    `trace_memory`, peak memory. Tracing is started and stopped around each stage.
+    """
+
+    def __init__(self, source='<string>', trace_memory=False):
+        self.source = source
+        self.trace_memory = trace_memory
+        self.records = []
+
+    def run(self, stage, name, function, node, *args, **kwargs):
+        """Call `function(node, *args, **kwargs)` and record its cost, return its result"""
+        nodes_before = count_nodes(node)
+
+        wall = cpu = peak_memory = None
+        if self.trace_memory:
+            result, peak_memory = traced(function, node, *args, **kwargs)
+        else:
+            started_wall = time.perf_counter()
+            started_cpu = time.process_time()
+
+            result = function(node, *args, **kwargs)
+
+            wall = time.perf_counter() - started_wall
+            cpu = time.process_time() - started_cpu
+
+        self.records.append(StageRecord(
+            source=self.source,
+            stage=stage,
+            name=name,
+            wall=wall,
+            cpu=cpu,
+            nodes_before=nodes_before,
+            nodes_after=count_nodes(result),
+            peak_memory=peak_memory,
+        ))
+        return result
+
+def aggregate(records):
+    """Merge records of the same stage across files, preserving pipeline order"""
+    aggregated = collections.OrderedDict()
+    for record in records:
+        key = (record.stage, record.name)
+        entry = aggregated.setdefault(key, {
+            'stage'       : record.stage,
+            'name'        : record.name,
+            'calls'       : 0,
+            'wall'        : None,
+            'cpu'         : None,
+            'nodes_before': 0,
+            'nodes_after' : 0,
+            'peak_memory' : None,
+        })
+        entry['calls'] += 1
+        if record.wall is not None:
+            entry['wall'] = (entry['wall'] or 0.0) + record.wall
+            entry['cpu'] = (entry['cpu'] or 0.0) + record.cpu
+        entry['nodes_before'] += record.nodes_before
+        entry['nodes_after'] += record.nodes_after
+        if record.peak_memory is not None:
+            entry['peak_memory'] = max(entry['peak_memory'] or 0, record.peak_memory)
+    return list(aggregated.values())
+
+def to_json(records):
+    return json.dumps({
+        'records'  : [ dict(_._asdict(), source=str(_.source)) for _ in records ],
+        'aggregate': aggregate(records),
+    }, indent=2)
+
+def format_table(records):
+    entries = aggregate(records)
+    total_wall = sum(_['wall'] or 0.0 for _ in entries)
+
+    header = f'{"stage": <8} {"name": <40} {"calls": >5} {"wall (ms)": >10} {"%": >6} {"cpu (ms)": >10} {"nodes in": >9} {"nodes out": >9} {"peak (KiB)": >10}'
+    lines = [ header, '-' * len(header) ]
+    for entry in entries:
+        peak_memory = '-' if entry['peak_memory'] is None else f'{entry["peak_memory"] / 1024:.1f}'
+        if entry['wall'] is None:
+            wall, share, cpu = '-', '-', '-'
+        else:
+            wall, share, cpu = f'{entry["wall"] * 1000:.3f}', f'{100 * entry["wall"] / (total_wall or 1.0):.1f}', f'{entry["cpu"] * 1000:.3f}'
+        lines.append(
+            f'{entry["stage"]: <8} {entry["name"]: <40} {entry["calls"]: >5} '
+            f'{wall: >10} {share: >6} {cpu: >10} '
+            f'{entry["nodes_before"]: >9} {entry["nodes_after"]: >9} {peak_memory: >10}'
+        )
+    lines.append('-' * len(header))
+    total = '-' if all(_['wall'] is None for _ in entries) else f'{total_wall * 1000:.3f}'
+    lines.append(f'{"total": <8} {"": <40} {"": >5} {total: >10}')
+    return '\n'.join(lines)
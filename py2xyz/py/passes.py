@@ -6,8 +6,16 @@ logger = logging.getLogger(__name__)
 
 from py2xyz import TranspilerError
 
-class Pass(ast.NodeTransformer):
-    pass
+from py2xyz.traversal import NodeTransformer
+
+class Pass(NodeTransformer):
+    """See py2xyz.passmanager.PassManager for REQUIRES and PRESERVES"""
+
+    REQUIRES = ()
+    PRESERVES = ()
+
+    def __init__(self):
+        self.manager = None
 
 DEFAULT_PRE_PASSES = [
 ]
@@ -1,114 +1,353 @@
-
-import pprint
+import abc
 import logging
 import functools
-import itertools
+import collections
 
 logger = logging.getLogger(__name__)
 
-from py2xyz import dump
+from py2xyz import TranspilerError
+
+from py2xyz.ir import swizzle
+
+from py2xyz.ir.ast import (
+    Assign                    as IRAssign,
+    Attribute                 as IRAttribute,
+    BinaryOperation           as IRBinaryOperation,
+    Call                      as IRCall,
+    Constant                  as IRConstant,
+    Reference                 as IRReference,
+    Return                    as IRReturn,
+    TypedParameter            as IRTypedParameter,
+    UnaryOperation            as IRUnaryOperation,
+
+    NumericalTypes            as IRNumericalTypes,
+
+    ANY_NUMERICAL_TYPES       as IR_ANY_NUMERICAL_TYPES,
+)
+
+# (is integral, components) -> type
+_NUMERICAL_TYPES = {
+    (False, 1): IRNumericalTypes.Float1,
+    (False, 2): IRNumericalTypes.Float2,
+    (False, 3): IRNumericalTypes.Float3,
+    (False, 4): IRNumericalTypes.Float4,
+    (True,  1): IRNumericalTypes.Integer1,
+    (True,  2): IRNumericalTypes.Integer2,
+    (True,  3): IRNumericalTypes.Integer3,
+    (True,  4): IRNumericalTypes.Integer4,
+}
+
+# type -> (is integral, components)
+_NUMERICAL_SHAPES = { value: key for key, value in _NUMERICAL_TYPES.items() }
+
+def constant_type(value):
+    """Type of a constant value, None when it is not numerical"""
+    components = value if isinstance(value, list) else [ value ]
+    if not all(isinstance(_, (int, float)) and not isinstance(_, bool) for _ in components):
+        return None
+    return _NUMERICAL_TYPES.get((all(isinstance(_, int) for _ in components), len(components)))
+
+def constant_types(value):
+    """Types a constant value may take, integers standing for floats as in Python"""
+    value_type = constant_type(value)
+    if value_type is None:
+        return set()
+    integral, size = _NUMERICAL_SHAPES[value_type]
+    return { value_type, _NUMERICAL_TYPES[(False, size)] } if integral else { value_type }
+
+class Relation(abc.ABC):
+    """Tuples of types a constraint accepts"""
+
+    @abc.abstractmethod
+    def candidates(self, types):
+        """Accepted tuples matching `types`, None matching any type"""
+        pass
 
-from py2xyz.sbs.ast import *
+class OperatorRelation(Relation):
+    """(argument types..., result type) of the overloads of an IR operator, see py2xyz.ir.ast.OverloadIndex"""
 
-class Analyzer(ast.NodeVisitor):
+    def __init__(self, operator_clazz):
+        self.overloads = operator_clazz.OVERLOADS
+
+    def candidates(self, types):
+        *arguments, result = types
+        return [
+            signature.arguments + (signature.result, )
+            for signature in self.overloads.match(*arguments)
+            if (result is None) or (result == signature.result)
+        ]
+
+@functools.lru_cache(maxsize=None)
+def operator_relation(operator_clazz):
+    return OperatorRelation(operator_clazz)
+
+class TableRelation(Relation):
+    """Tuples listed explicitly"""
+
+    def __init__(self, rows):
+        self.rows = tuple(rows)
+
+    def candidates(self, types):
+        return [
+            row
+            for row in self.rows
+            if all((expected is None) or (expected == _) for expected, _ in zip(types, row))
+        ]
+
+@functools.lru_cache(maxsize=None)
+def swizzle_relation(fields):
+    """(source type, result type) of the `fields` swizzle"""
+    components = swizzle.indices(fields)
+    if components is None:
+        return TableRelation(())
+    return TableRelation(
+        (source, _NUMERICAL_TYPES[(integral, len(components))])
+        for source, (integral, size) in _NUMERICAL_SHAPES.items()
+        if max(components) < size
+    )
+
+class TypeConstraint(collections.namedtuple('TypeConstraint', ['relation', 'variables'])):
     pass
 
-class ArgumentTypeInference(Analyzer):
+class TypeConstraintSolver:
+    """Finite domain constraint solver over types
+
+    Each variable has a domain, the set of types it may still take, and constraints restrict tuples of variables to the
+    tuples of types their relation accepts. Propagation keeps every domain arc consistent : a type stays in a domain only
+    while each constraint on the variable accepts a tuple using it and types of the other domains. Solutions are then
+    searched one variable at a time, propagating each choice, instead of enumerating the cartesian product of domains.
+    """
+
+    def __init__(self):
+        self.domains = []
+        self.constraints = []
+        # variable -> indices of the constraints over it
+        self.watchers = collections.defaultdict(list)
+        self.revisions = 0
+
+    def variable(self, domain):
+        self.domains.append(frozenset(domain))
+        return len(self.domains) - 1
 
-    def __init__(self, initial_argument_types):
-        self.initial_argument_types = initial_argument_types
+    def constrain(self, relation, variables):
+        self.constraints.append(TypeConstraint(relation, tuple(variables)))
+        for variable in set(variables):
+            self.watchers[variable].append(len(self.constraints) - 1)
 
-    def analyze(self, content):
-        if isinstance(content, (list, tuple)):
-            return itertools.chain(*list(
-                self.analyze(subnode)
-                for subnode in content
-            ))
-        else:
-            node = content
-            analyzer = getattr(self, f'analyze_{node.__class__.__name__}', None)
-            if analyzer is None:
-                raise RuntimeError(f'No analyzer for {node}')
+    def revise(self, domains, constraint):
+        """Narrow `domains` of the constraint variables to supported types, the changed variables or None on a wipe out"""
+        self.revisions += 1
+        types = [
+            next(iter(domains[_])) if len(domains[_]) == 1 else None
+            for _ in constraint.variables
+        ]
+        supported = [
+            row
+            for row in constraint.relation.candidates(types)
+            if all(row[idx] in domains[variable] for idx, variable in enumerate(constraint.variables))
+        ]
 
-            return analyzer(node)
+        changed = []
+        for idx, variable in enumerate(constraint.variables):
+            domain = frozenset(row[idx] for row in supported)
+            if domain != domains[variable]:
+                if not domain:
+                    return None
+                domains[variable] = domain
+                changed.append(variable)
+        return changed
 
-    def analyze_Output(self, node):
-        yield from self.analyze(node.expression)
+    def propagate(self, domains, constraints):
+        """Revise `constraints` and the ones over variables they narrow until none changes, False when unsatisfiable"""
+        queue = collections.deque(constraints)
+        queued = set(queue)
+        while queue:
+            index = queue.popleft()
+            queued.discard(index)
 
-    def analyze_BinaryOperation(self, node):
-        for left, right in node.operator.opcode.overloads():
-            left_argument_types = self.validate(node.left, left)
-            right_argument_types = self.validate(node.right, right)
+            changed = self.revise(domains, self.constraints[index])
+            if changed is None:
+                return False
 
-            if (len(left_argument_types) == 0) or (len(right_argument_types) == 0):
-                logger.debug(f'invalid program with operator {node.operator.opcode}({left}, {right}) for ({dump(node.left)}, {dump(node.right)})')
+            for variable in changed:
+                for watcher in self.watchers[variable]:
+                    if (watcher != index) and (watcher not in queued):
+                        queue.append(watcher)
+                        queued.add(watcher)
+        return True
+
+    def assign(self, domains, variable, value):
+        branch = list(domains)
+        branch[variable] = frozenset((value, ))
+        if not self.propagate(branch, self.watchers[variable]):
+            return None
+        return branch
+
+    def is_satisfiable(self, domains):
+        """Whether the other variables can take a type each, satisfying every constraint"""
+        stack = [ domains ]
+        while stack:
+            current = stack.pop()
+            unresolved = [ _ for _, domain in enumerate(current) if len(domain) > 1 ]
+            if not unresolved:
+                return True
+
+            variable = min(unresolved, key=lambda _: len(current[_]))
+            for value in current[variable]:
+                branch = self.assign(current, variable, value)
+                if branch is not None:
+                    stack.append(branch)
+        return False
+
+    def solutions(self, variables):
+        """Distinct types of `variables` in the solutions, as tuples in a deterministic order"""
+        domains = list(self.domains)
+        if not self.propagate(domains, range(len(self.constraints))):
+            return
+
+        # NOTE depth is bound by the number of `variables`, e.g. function parameters
+        def search(domains):
+            unresolved = [ _ for _ in variables if len(domains[_]) > 1 ]
+            if not unresolved:
+                if self.is_satisfiable(domains):
+                    yield tuple(next(iter(domains[_])) for _ in variables)
+                return
+
+            variable = min(unresolved, key=lambda _: len(domains[_]))
+            for value in sorted(domains[variable], key=lambda _: _.value):
+                branch = self.assign(domains, variable, value)
+                if branch is not None:
+                    yield from search(branch)
+
+        yield from search(domains)
+
+class ArgumentTypeInference:
+    """Feasible parameter types of an IR function, from the overloads of the operators its body applies
+
+    Every expression gets a type variable, constrained by the operator, swizzle or constructor computing it. Variables
+    read refer to the type variable of the expression they were last assigned, parameters to their own one, whose domain
+    is their type, else the types of their default value or `domain`, the types untyped parameters may take.
+    """
+
+    def __init__(self, function, parameter_types=None, constructors=None, domain=IR_ANY_NUMERICAL_TYPES):
+        """`parameter_types` are the known parameter types, None when unknown ; `constructors` maps callee names to types"""
+        self.function = function
+        self.constructors = constructors or {}
+        self.domain = frozenset(domain)
+        self.solver = TypeConstraintSolver()
+
+        # variable name -> type variable of its current definition
+        self.bindings = {}
+        # id(expression) -> type variable
+        self.variables = {}
+        self.read = set()
+
+        parameter_types = parameter_types or [ None ] * len(function.arguments)
+        self.parameters = []
+        for argument, parameter_type in zip(function.arguments, parameter_types):
+            variable = self.solver.variable(self.parameter_domain(argument, parameter_type))
+            self.parameters.append(variable)
+            self.bindings[argument.identifier] = variable
+
+        self.returns = []
+        for statement in function.body:
+            if isinstance(statement, IRAssign):
+                self.bindings[statement.identifier] = self.expression(statement.expression)
+            elif isinstance(statement, IRReturn):
+                self.returns.append(self.expression(statement.expression))
+            else:
+                raise TranspilerError(f'Statement unsupported in type inference', statement)
+
+    def parameter_domain(self, argument, parameter_type):
+        if isinstance(argument, IRTypedParameter):
+            return { argument.type }
+        if parameter_type is not None:
+            return { parameter_type }
+        if isinstance(argument.expression, IRConstant):
+            return constant_types(argument.expression.value) & self.domain
+        return self.domain
+
+    def lookup(self, node):
+        variable = self.bindings.get(node.variable)
+        if variable is None:
+            # NOTE e.g. uniforms, any type
+            variable = self.bindings[node.variable] = self.solver.variable(IR_ANY_NUMERICAL_TYPES)
+        self.read.add(variable)
+        return variable
+
+    def expression(self, expression):
+        # NOTE post-order on an explicit stack, expressions may be deeper than the recursion limit
+        stack = [ expression ]
+        while stack:
+            node = stack[-1]
+            if id(node) in self.variables:
+                stack.pop()
                 continue
 
-            # aggregate result
+            operands = self.operands(node)
+            pending = [ _ for _ in operands if id(_) not in self.variables ]
+            if pending:
+                stack.extend(pending)
+                continue
+
+            stack.pop()
+            self.variables[id(node)] = self.constrain(node, [ self.variables[id(_)] for _ in operands ])
+        return self.variables[id(expression)]
+
+    @staticmethod
+    def operands(node):
+        if isinstance(node, IRBinaryOperation):
+            return [ node.left, node.right ]
+        if isinstance(node, IRUnaryOperation):
+            return [ node.operand ]
+        if isinstance(node, IRCall):
+            return list(node.args)
+        return []
 
-            result = dict(left_argument_types)
-            for key, value in right_argument_types.items():
-                if key in result:
-                    result[key].intersect(right_argument_types[key])
-                else:
-                    result[key] = right_argument_types[key]
+    def constrain(self, node, operands):
+        if isinstance(node, IRConstant):
+            node_types = constant_types(node.value)
+            if not node_types:
+                raise TranspilerError(f'Constant type unsupported in type inference', node)
+            return self.solver.variable(node_types)
 
-            # fill unresolved/missing parameter entries
+        if isinstance(node, IRReference):
+            return self.lookup(node)
 
-            for key, value in self.initial_argument_types.items():
-                if key not in result:
-                    result[key] = value
+        if isinstance(node, IRAttribute):
+            source = self.lookup(node)
+            relation = swizzle_relation(node.fields)
+            variable = self.solver.variable({ row[1] for row in relation.rows })
+            self.solver.constrain(relation, (source, variable))
+            return variable
 
-            yield from itertools.product(*result.values())
+        if isinstance(node, (IRBinaryOperation, IRUnaryOperation)):
+            operator_clazz = node.operator.__class__
+            variable = self.solver.variable(operator_clazz.OVERLOADS.result_types())
+            self.solver.constrain(operator_relation(operator_clazz), (*operands, variable))
+            return variable
 
-    def analyze_UnaryOperation(self, node):
-        for operand_type in node.operator.opcode.overloads():
-            argument_types = self.validate(node.operand, operand_type)
+        if isinstance(node, IRCall):
+            # NOTE only constructors results are known, arguments are left to the constraints computing them
+            constructor = self.constructors.get(node.function, node.function) if isinstance(node.function, str) else node.function
+            return self.solver.variable({ constructor } if constructor in _NUMERICAL_SHAPES else IR_ANY_NUMERICAL_TYPES)
 
-            if len(argument_types) == 0:
-                logger.debug(f'invalid program with operator {node.operator.opcode}({operand_type}) for ({dump(node.operand)})')
+        raise TranspilerError(f'Expression unsupported in type inference', node)
+
+    def overloads(self):
+        """Feasible parameter types, a tuple per overload"""
+        for argument, variable in zip(self.function.arguments, self.parameters):
+            domain = self.solver.domains[variable]
+            if (variable in self.read) or (len(domain) <= 1):
                 continue
+            # NOTE any type would do, the default value one (else a float) is kept instead of an overload per type
+            value_type = constant_type(argument.expression.value) if isinstance(argument.expression, IRConstant) else IRNumericalTypes.Float1
+            self.solver.domains[variable] = frozenset({ value_type if value_type in domain else min(domain, key=lambda _: _.value) })
+
+        overloads = list(self.solver.solutions(self.parameters))
+        logger.debug(f'{self.function.identifier} : {len(overloads)} overloads, {self.solver.revisions} constraint revisions')
+        return overloads
 
-            # aggregate result
-
-            result = dict(argument_types)
-            # fill unresolved/missing parameter entries
-
-            for key, value in self.initial_argument_types.items():
-                if key not in result:
-                    result[key] = value
-
-            yield from itertools.product(*result.values())
-
-    def validate(self, node, returntype):
-        if isinstance(node, AST):
-            validation = getattr(self, f'validate{node.__class__.__name__}', None)
-            if validation is None:
-                raise NotImplementedError(f'No type validation for {node}')
-
-            return validation(node, returntype)
-        else:
-            raise NotImplementedError
-
-    def validateGet(self, node, returntype):
-        if self.initial_argument_types[node.symbol] is None:
-            logger.debug(f'return type {returntype} - valid program because {dump(node)} is variant')
-            return {
-                node.symbol: { returntype }
-            }
-        elif returntype in self.initial_argument_types[node.symbol]:
-            logger.debug(f'return type {returntype} - valid program because {dump(node)} is of the same type')
-            return {
-                node.symbol: { returntype }
-            }
-        else:
-            return { }
-
-def iterate_inferred_argument_types(node, parameters, content):
-    # logger.debug(f'resolving... {dump(node)}')
-
-    resolver = ArgumentTypeInference({
-        parameter.identifier: { parameter.type } if parameter.type else None
-        for parameter in parameters
-    })
-    return resolver.analyze(content)
+def infer_argument_types(function, parameter_types=None, constructors=None, domain=IR_ANY_NUMERICAL_TYPES):
+    """Feasible parameter types of an IR function, see ArgumentTypeInference"""
+    return ArgumentTypeInference(function, parameter_types, constructors, domain).overloads()
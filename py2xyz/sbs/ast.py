@@ -3,6 +3,8 @@ import ast
 import abc
 import enum
 
+from py2xyz.slotted import SlottedAST
+
 from py2xyz.ir.ast import (
     Assign                    as IRAssign,
     Attribute                 as IRAttribute,
@@ -72,7 +74,7 @@ ANY_VECTOR_TYPES = ANY_VECTOR_INTEGRAL_TYPES | ANY_VECTOR_FLOAT_TYPES
 
 ANY_TYPES = ANY_TEXT_TYPES | ANY_LOGICAL_TYPES | ANY_NUMERICAL_TYPES
 
-class AST(ast.AST, abc.ABC):
+class AST(SlottedAST, abc.ABC):
     pass
 
 class Package(AST):
@@ -157,6 +159,12 @@ class ConstFloat4(FunctionNode):
         'w',
     )
 
+class Swizzle1(FunctionNode):
+    _fields = (
+        '_0',
+        'from_node',
+    )
+
 class Swizzle2(FunctionNode):
     _fields = (
         '_0',
@@ -204,3 +212,14 @@ class Mul(BinaryOperation):
 
 class Div(BinaryOperation):
     pass
+
+class UnaryOperation(FunctionNode, abc.ABC):
+    _fields = (
+        'a',
+    )
+
+class Neg(UnaryOperation):
+    pass
+
+class Pow2(UnaryOperation):
+    pass
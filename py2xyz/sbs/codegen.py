@@ -9,7 +9,7 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
-from py2xyz import dump, TranspilerError
+from py2xyz import LazyDump, LazyFormat, TranspilerError
 
 from py2xyz.sbs.ast import (
     Package            as SBSPackage,
@@ -69,7 +69,7 @@ class PackageGenerator(Generator):
             sbs.setDescription(node.description)
 
         self.sbs = sbs
-        logger.debug(f'Substance document created from {dump(node)}')
+        logger.debug('Substance document created from %s', LazyDump(node))
 
         for subnode in node.content:
             self.visit(subnode)
@@ -95,13 +95,13 @@ class FunctionGraphGenerator(Generator):
         for subnode in node.parameters:
             subgenerator_parameters.visit(subnode)
 
-        self.logger.debug(f'symtable after parameters: {pformat(symboltable)}')
+        self.logger.debug('symtable after parameters: %s', LazyFormat(pformat, symboltable))
 
         subgenerator_nodes = FunctionGraphNodesGenerator(self.graph, symboltable)
         for subnode in node.nodes:
             subgenerator_nodes.visit(subnode)
 
-        self.logger.debug(f'symtable after nodes: {pformat(symboltable)}')
+        self.logger.debug('symtable after nodes: %s', LazyFormat(pformat, symboltable))
 
         for sbsnode in ( symboltable[_.node] for _ in node.outputs ):
             self.graph.setOutputNode(sbsnode)
@@ -133,7 +133,7 @@ class FunctionGraphParametersGenerator(Generator):
         self.symboltable.update({
             node.identifier: sbsparameter
         })
-        self.logger.debug(f'{dump(node, depth=2)} -> {sbsparameter}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=2), sbsparameter)
         return sbsparameter
 
 class FunctionGraphNodesGenerator(Generator):
@@ -143,17 +143,29 @@ class FunctionGraphNodesGenerator(Generator):
         self.graph = graph
         self.symboltable = symboltable
 
-    def visit_GetFloat2(self, node):
+    def __visit_Get(self, node, functionenum):
         sbsnode = self.graph.createFunctionNode(
-            aFunction=FunctionEnum.GET_FLOAT2,
+            aFunction=functionenum,
             aParameters={
-                FunctionEnum.GET_FLOAT2: node.variable
+                functionenum: node.variable
             }
         )
-        self.logger.debug(f'{dump(node, depth=1)} -> {sbsnode}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
         self.symboltable[node] = sbsnode
         return sbsnode
 
+    def visit_GetFloat1(self, node):
+        return self.__visit_Get(node, FunctionEnum.GET_FLOAT1)
+
+    def visit_GetFloat2(self, node):
+        return self.__visit_Get(node, FunctionEnum.GET_FLOAT2)
+
+    def visit_GetFloat3(self, node):
+        return self.__visit_Get(node, FunctionEnum.GET_FLOAT3)
+
+    def visit_GetFloat4(self, node):
+        return self.__visit_Get(node, FunctionEnum.GET_FLOAT4)
+
     def __visit_Const(self, node, functionenum):
         sbsnode = self.graph.createFunctionNode(
             aFunction=functionenum,
@@ -164,7 +176,7 @@ class FunctionGraphNodesGenerator(Generator):
                 ]
             }
         )
-        self.logger.debug(f'{dump(node, depth=1)} -> {sbsnode}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
         self.symboltable[node] = sbsnode
         return sbsnode
 
@@ -189,7 +201,22 @@ class FunctionGraphNodesGenerator(Generator):
             }
         )
         self.graph.connectNodes(lnode, sbsnode)
-        self.logger.debug(f'{dump(node, depth=1)} -> {sbsnode}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
+        self.symboltable[node] = sbsnode
+        return sbsnode
+
+    def visit_Swizzle1(self, node):
+        lnode = self.symboltable[node.from_node]
+        sbsnode = self.graph.createFunctionNode(
+            aFunction=FunctionEnum.SWIZZLE1,
+            aParameters={
+                FunctionEnum.SWIZZLE1: [
+                    node._0,
+                ]
+            }
+        )
+        self.graph.connectNodes(lnode, sbsnode, FunctionInputEnum.VECTOR)
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
         self.symboltable[node] = sbsnode
         return sbsnode
 
@@ -205,7 +232,42 @@ class FunctionGraphNodesGenerator(Generator):
             }
         )
         self.graph.connectNodes(lnode, sbsnode, FunctionInputEnum.VECTOR)
-        self.logger.debug(f'{dump(node, depth=1)} -> {sbsnode}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
+        self.symboltable[node] = sbsnode
+        return sbsnode
+
+    def visit_Swizzle3(self, node):
+        lnode = self.symboltable[node.from_node]
+        sbsnode = self.graph.createFunctionNode(
+            aFunction=FunctionEnum.SWIZZLE3,
+            aParameters={
+                FunctionEnum.SWIZZLE3: [
+                    node._0,
+                    node._1,
+                    node._2,
+                ]
+            }
+        )
+        self.graph.connectNodes(lnode, sbsnode, FunctionInputEnum.VECTOR)
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
+        self.symboltable[node] = sbsnode
+        return sbsnode
+
+    def visit_Swizzle4(self, node):
+        lnode = self.symboltable[node.from_node]
+        sbsnode = self.graph.createFunctionNode(
+            aFunction=FunctionEnum.SWIZZLE4,
+            aParameters={
+                FunctionEnum.SWIZZLE4: [
+                    node._0,
+                    node._1,
+                    node._2,
+                    node._3,
+                ]
+            }
+        )
+        self.graph.connectNodes(lnode, sbsnode, FunctionInputEnum.VECTOR)
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
         self.symboltable[node] = sbsnode
         return sbsnode
 
@@ -218,7 +280,18 @@ class FunctionGraphNodesGenerator(Generator):
         self.graph.connectNodes(anode, sbsnode, FunctionInputEnum.A)
         self.graph.connectNodes(bnode, sbsnode, FunctionInputEnum.B)
 
-        self.logger.debug(f'{dump(node, depth=1)} -> {sbsnode}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
+        self.symboltable[node] = sbsnode
+        return sbsnode
+
+    def __visit_UnaryOperation(self, node, functionenum):
+        anode = self.symboltable[node.a]
+
+        sbsnode = self.graph.createFunctionNode(functionenum)
+
+        self.graph.connectNodes(anode, sbsnode, FunctionInputEnum.A)
+
+        self.logger.debug('%s -> %s', LazyDump(node, depth=1), sbsnode)
         self.symboltable[node] = sbsnode
         return sbsnode
 
@@ -233,3 +306,9 @@ class FunctionGraphNodesGenerator(Generator):
 
     def visit_Div(self, node):
         return self.__visit_BinaryOperation(node, FunctionEnum.DIV)
+
+    def visit_Neg(self, node):
+        return self.__visit_UnaryOperation(node, FunctionEnum.NEG)
+
+    def visit_Pow2(self, node):
+        return self.__visit_UnaryOperation(node, FunctionEnum.POW2)
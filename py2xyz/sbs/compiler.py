@@ -1,5 +1,6 @@
 
 import ast
+import types
 import logging
 import itertools
 
@@ -7,10 +8,15 @@ from pprint import pformat
 
 logger = logging.getLogger(__name__)
 
-from py2xyz import dump, TranspilerError
+from py2xyz import dump, LazyDump, LazyFormat, TranspilerError
+
+from py2xyz.traversal import NodeTransformer
+
+from py2xyz.ir import swizzle
 
 from py2xyz.ir.ast import (
     Constant          as IRConstant,
+    Expression        as IRExpression,
     Reference         as IRReference,
 )
 
@@ -27,15 +33,23 @@ from py2xyz.sbs.ast import (
 
     Set               as SBSSet,
 
+    ConstFloat1       as SBSConstFloat1,
+    ConstFloat2       as SBSConstFloat2,
+    ConstFloat3       as SBSConstFloat3,
+    ConstFloat4       as SBSConstFloat4,
+
     Add               as SBSAdd,
     Sub               as SBSSub,
     Mul               as SBSMul,
     Div               as SBSDiv,
+    Neg               as SBSNeg,
+    Pow2              as SBSPow2,
 
     GetFloat1         as SBSGetFloat1,
     GetFloat2         as SBSGetFloat2,
     GetFloat3         as SBSGetFloat3,
     GetFloat4         as SBSGetFloat4,
+    Swizzle1          as SBSSwizzle1,
     Swizzle2          as SBSSwizzle2,
     Swizzle3          as SBSSwizzle3,
     Swizzle4          as SBSSwizzle4,
@@ -43,13 +57,18 @@ from py2xyz.sbs.ast import (
 
 _DEBUG_DEPTH = 2
 
-class Transpiler(ast.NodeTransformer):
+def _format_symboltable(symboltable):
+    return pformat({ (k, dump(v)) for k,v in symboltable.items()})
+
+class Transpiler(NodeTransformer):
     def __init__(self):
         self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
 
     def generic_visit(self, node):
         raise TranspilerError(node=node)
 
+    generic_visit_steps = generic_visit
+
 class PackageTranspiler(Transpiler):
 
     def visit_Module(self, node):
@@ -73,11 +92,11 @@ class FunctionGraphTranspiler(Transpiler):
         parameter_transpiler = FunctionGraphParametersTranspiler(symboltable)
         sbsparameters = list(map(parameter_transpiler.visit, node.arguments))
 
-        self.logger.debug(f'symtable after parameters {pformat({ (k, dump(v)) for k,v in symboltable.items()})}')
+        self.logger.debug('symtable after parameters %s', LazyFormat(_format_symboltable, symboltable))
 
         node_transpiler = FunctionGraphNodesTranspiler(symboltable)
 
-        self.logger.debug(f'symtable after nodes {pformat({ (k, dump(v)) for k,v in symboltable.items()})}')
+        self.logger.debug('symtable after nodes %s', LazyFormat(_format_symboltable, symboltable))
 
         sbsnode = SBSFunctionGraph(
             identifier=node.identifier,
@@ -91,7 +110,7 @@ class FunctionGraphTranspiler(Transpiler):
                 )
             )
         )
-        self.logger.debug(f'{node.__class__.__name__} -> {dump(sbsnode)}')
+        self.logger.debug('%s -> %s', node.__class__.__name__, LazyDump(sbsnode))
         return sbsnode
 
 class FunctionGraphParametersTranspiler(Transpiler):
@@ -119,42 +138,31 @@ class FunctionGraphParametersTranspiler(Transpiler):
 
 class FunctionGraphNodesTranspiler(Transpiler):
 
-    SWIZZLE_FIELDS_XYZW = 'xyzw'
-    SWIZZLE_FIELDS_RGBA = 'rgba'
-
-    SWIZZLE_LOOKUP_XYZW = {
-        **{
-            tuple(combination) : SBSSwizzle2
-            for combination in itertools.combinations_with_replacement(SWIZZLE_FIELDS_XYZW, 2)
-        },
-        **{
-            tuple(combination) : SBSSwizzle3
-            for combination in itertools.combinations_with_replacement(SWIZZLE_FIELDS_XYZW, 3)
-        },
-        **{
-            tuple(combination) : SBSSwizzle4
-            for combination in itertools.combinations_with_replacement(SWIZZLE_FIELDS_XYZW, 4)
-        }
+    # components -> swizzle node class
+    SWIZZLE_CLASSES = {
+        1: SBSSwizzle1,
+        2: SBSSwizzle2,
+        3: SBSSwizzle3,
+        4: SBSSwizzle4,
     }
 
-    SWIZZLE_LOOKUP_RGBA = {
-        **{
-            tuple(combination) : SBSSwizzle2
-            for combination in itertools.combinations_with_replacement(SWIZZLE_FIELDS_RGBA, 2)
-        },
-        **{
-            tuple(combination) : SBSSwizzle3
-            for combination in itertools.combinations_with_replacement(SWIZZLE_FIELDS_RGBA, 3)
-        },
-        **{
-            tuple(combination) : SBSSwizzle4
-            for combination in itertools.combinations_with_replacement(SWIZZLE_FIELDS_RGBA, 4)
-        }
+    CONSTANT_CLASSES = {
+        1: SBSConstFloat1,
+        2: SBSConstFloat2,
+        3: SBSConstFloat3,
+        4: SBSConstFloat4,
     }
 
     def __init__(self, symboltable):
         super().__init__()
         self.symboltable = symboltable
+        # (identifier, version) -> Set node, definitions of a function in SSA form (see py2xyz.ir.passes.StaticSingleAssignment)
+        self.definitions = {}
+
+        # NOTE IR expressions are hash-consed, an expression used several times is lowered to a single sbs node
+        self.lowered = {}
+        # (id(sbs node), components) -> swizzle node, whatever the IR spelling of the swizzle
+        self.swizzles = {}
 
         # sbs intrinsics
         self.symboltable.update({
@@ -165,6 +173,45 @@ class FunctionGraphNodesTranspiler(Transpiler):
     def generic_visit(self, node):
         raise NotImplementedError(dump(node))
 
+    generic_visit_steps = generic_visit
+
+    def visit_step(self, node):
+        if not isinstance(node, IRExpression):
+            return super().visit_step(node)
+
+        if node in self.lowered:
+            return self.lowered[node]
+
+        sbsnode = super().visit_step(node)
+        if isinstance(sbsnode, types.GeneratorType):
+            return self._lower_steps(node, sbsnode)
+
+        self.lowered[node] = sbsnode
+        return sbsnode
+
+    def _lower_steps(self, node, steps):
+        sbsnode = yield from steps
+        self.lowered[node] = sbsnode
+        return sbsnode
+
+    def lower_variable(self, node, variable, version=None):
+        if version:
+            # NOTE in SSA form a read refers to its definition, whatever was assigned to the variable since
+            if (variable, version) not in self.definitions:
+                raise TranspilerError(f'{variable} version {version} variable not bound', node)
+            return self.definitions[(variable, version)]
+
+        if variable not in self.symboltable:
+            raise TranspilerError(f'{variable} variable not bound', node)
+
+        sbsnode = self.symboltable[variable]
+        if isinstance(sbsnode, SBSFunctionParameter):
+            # NOTE parameters are read through a single Get node, shared by every reference
+            sbsnode = self.symboltable[variable] = self.visit(sbsnode)
+        return sbsnode
+
+    # NOTE handlers visiting subnodes are generators yielding them, so deep expressions are lowered on an explicit stack
+
     # SBS nodes
 
     def visit_GetFloat1(self, node):
@@ -203,84 +250,114 @@ class FunctionGraphNodesTranspiler(Transpiler):
     # IR nodes - Statements
 
     def visit_Return(self, node):
-        if isinstance(node.expression, IRReference):
-            if node.expression.variable not in self.symboltable:
-                raise TranspilerError(f'{node.expression.variable} variable not bound', node)
-
-            sbsnode = SBSOutput(
-                node=self.symboltable[node.expression.variable]
-            )
-            self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} -> {dump(sbsnode)}')
-            return (sbsnode, )
-        else:
-            raise NotImplementedError(dump(node))
+        # NOTE a returned variable is output through its Set node, constant folding may return a value instead
+        from_node = yield node.expression
+        sbsnode = SBSOutput(
+            node=from_node,
+        )
+        self.logger.debug('%s -> %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
+        return (sbsnode, )
 
     def visit_Assign(self, node):
+        from_node = yield node.expression
         sbsnode = SBSSet(
             value=node.identifier,
-            from_node=self.visit(node.expression),
+            from_node=from_node,
         )
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} -> {dump(sbsnode)}')
+        self.logger.debug('%s -> %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
 
+        if node.version is not None:
+            self.definitions[(node.identifier, node.version)] = sbsnode
+            return (sbsnode, )
+
+        if node.identifier in self.symboltable:
+            # NOTE not in SSA form, expressions lowered so far may read the previous binding under the same nodes
+            self.lowered.clear()
+            self.swizzles.clear()
         self.symboltable[node.identifier] = sbsnode
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} symtable update {pformat({ (k, dump(v)) for k,v in self.symboltable.items()})}')
+        self.logger.debug('%s symtable update %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyFormat(_format_symboltable, self.symboltable))
         return (sbsnode, )
 
+    def visit_For(self, node):
+        raise TranspilerError(f'Loop over {node.identifier} left after unrolling, function graphs have no loop construct', node)
+
     # IR nodes - Expressions
 
+    def visit_Constant(self, node):
+        components = node.value if isinstance(node.value, list) else [ node.value ]
+        if not all(isinstance(_, float) for _ in components):
+            raise TranspilerError(f'Only float constants are supported', node)
+        if len(components) not in self.CONSTANT_CLASSES:
+            raise TranspilerError(f'Constant size unsupported', node)
+
+        sbsnodeclass = self.CONSTANT_CLASSES[len(components)]
+        sbsnode = sbsnodeclass(**dict(zip(sbsnodeclass._fields, components)))
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
+        return sbsnode
+
     def visit_BinaryOperation(self, node):
         sbsnode = self.visit(node.operator)
-        sbsnode.a = self.visit(node.left)
-        sbsnode.b = self.visit(node.right)
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} -> {dump(sbsnode)}')
+        sbsnode.a = yield node.left
+        sbsnode.b = yield node.right
+        self.logger.debug('%s -> %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
         return sbsnode
 
     def visit_Addition(self, node):
         sbsnode = SBSAdd()
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} transpiling to {dump(sbsnode)}')
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
         return sbsnode
 
     def visit_Substraction(self, node):
         sbsnode = SBSSub()
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} transpiling to {dump(sbsnode)}')
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
         return sbsnode
 
     def visit_Multiplication(self, node):
         sbsnode = SBSMul()
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} transpiling to {dump(sbsnode)}')
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
         return sbsnode
 
     def visit_Division(self, node):
         sbsnode = SBSDiv()
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} transpiling to {dump(sbsnode)}')
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
+        return sbsnode
+
+    def visit_UnaryOperation(self, node):
+        sbsnode = self.visit(node.operator)
+        sbsnode.a = yield node.operand
+        self.logger.debug('%s -> %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
+        return sbsnode
+
+    def visit_Negation(self, node):
+        sbsnode = SBSNeg()
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
+        return sbsnode
+
+    def visit_Power2(self, node):
+        sbsnode = SBSPow2()
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
         return sbsnode
 
     def visit_Attribute(self, node):
-        if node.variable not in self.symboltable:
-            raise TranspilerError(f'{node.variable} variable not bound', node)
-
-        sbsnodevariable = self.visit(self.symboltable[node.variable])
-
-        # TODO preprocess GLSL swizzle at IR level
-        fields_as_tuple = tuple(node.fields)
-        if fields_as_tuple in self.SWIZZLE_LOOKUP_XYZW:
-            SBSSwizzleClass = self.SWIZZLE_LOOKUP_XYZW[fields_as_tuple]
-            Indexer = self.SWIZZLE_FIELDS_XYZW
-        elif fields_as_tuple in self.SWIZZLE_LOOKUP_RGBA:
-            SBSSwizzleClass = self.SWIZZLE_LOOKUP_RGBA[fields_as_tuple]
-            Indexer = self.SWIZZLE_FIELDS_RGBA
-        else:
+        sbsnodevariable = self.lower_variable(node, node.variable, node.version)
+
+        # NOTE swizzles are canonicalized at IR level (see py2xyz.ir.passes.CanonicalizeSwizzles), any spelling lowers here
+        components = swizzle.indices(node.fields)
+        if components is None:
             raise TranspilerError(f'{node.fields} unknown attribute fields for {dump(sbsnodevariable)}', node)
 
+        key = (id(sbsnodevariable), components)
+        if key in self.swizzles:
+            return self.swizzles[key]
+
+        SBSSwizzleClass = self.SWIZZLE_CLASSES[len(components)]
         sbsnode = SBSSwizzleClass(from_node=sbsnodevariable, **{
-            f'_{idx}': Indexer.index(fieldname)
-            for idx, fieldname in enumerate(node.fields)
+            f'_{idx}': component
+            for idx, component in enumerate(components)
         })
-        self.logger.debug(f'{dump(node, depth=_DEBUG_DEPTH)} transpiling to {dump(sbsnode)}')
+        self.swizzles[key] = sbsnode
+        self.logger.debug('%s transpiling to %s', LazyDump(node, depth=_DEBUG_DEPTH), LazyDump(sbsnode))
         return sbsnode
 
     def visit_Reference(self, node):
-        if node.variable not in self.symboltable:
-            raise TranspilerError(f'{node.variable} variable not bound', node)
-
-        return self.symboltable[node.variable]
+        return self.lower_variable(node, node.variable, node.version)
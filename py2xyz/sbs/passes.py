@@ -7,10 +7,12 @@ from pprint import pformat
 
 logger = logging.getLogger(__name__)
 
-from py2xyz import dump
+from py2xyz import dump, LazyDump
 
 from py2xyz import TranspilerError
 
+from py2xyz.traversal import SharingNodeTransformer, NodeVisitor
+
 from py2xyz.ir.ast import (
     Assign                    as IRAssign,
     Attribute                 as IRAttribute,
@@ -40,6 +42,10 @@ from py2xyz.ir.ast import (
     ANY_TYPES                 as IR_ANY_TYPES,
 )
 
+from py2xyz.ir.passes import (
+    ResolveGLSLTypeConstructor,
+)
+
 from py2xyz.sbs.ast import (
     ConstFloat2    as SBSConstFloat2,
     ConstFloat3    as SBSConstFloat3,
@@ -51,32 +57,23 @@ from py2xyz.sbs.ast import (
     FunctionNode   as SBSFunctionNode,
 )
 
-class Pass(ast.NodeTransformer):
-    def __init__(self):
-        self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
-
-class FoldPow2ExpressionPass(Pass):
-    def visit_BinaryOperation(self, node):
-        logger.debug(f'FoldPow2ExpressionPass - {dump(node)}')
-        if node.operator.opcode is NonNativeNumericalOperator.Pow:
-            # TODO fold constant pass before hand
-            left = self.visit(node.left)
-
-            if not isinstance(left, Constant):
-                raise TranspilerError(f'Cannot fold pow in pow2 : left operand is not Constan', left)
+class Pass(SharingNodeTransformer):
+    """See py2xyz.passmanager.PassManager for REQUIRES and PRESERVES"""
 
-            if left.value != 2:
-                raise TranspilerError(f'Cannot fold pow in pow2 : left operand is not equals to 2', left)
+    REQUIRES = ()
+    PRESERVES = ()
 
-            return UnaryOperation(
-                operator=Operator(opcode=NativeUnaryOperator.Pow2),
-                operand=node.right,
-            )
-        else:
-            return node
+    def __init__(self):
+        self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
+        self.manager = None
 
 class ResolveConstNode(Pass):
 
+    # NOTE IR post-pass, only runs before this stage ; type constructors must be resolved to fold them into const nodes
+    REQUIRES = (
+        ResolveGLSLTypeConstructor,
+    )
+
     LOOKUP_TABLE = {
         IRNumericalTypes.Float2: SBSConstFloat2,
         IRNumericalTypes.Float4: SBSConstFloat4,
@@ -84,11 +81,11 @@ class ResolveConstNode(Pass):
 
     def visit_Call(self, node):
         if node.function not in self.LOOKUP_TABLE:
-            self.logger.debug(f'something else than a const node \n{dump(node)}')
+            self.logger.debug('something else than a const node \n%s', LazyDump(node))
             return node
 
         if not all(map(lambda _: isinstance(_, IRConstant), node.args)):
-            self.logger.debug(f'arguments are not all constant \n{dump(node)}')
+            self.logger.debug('arguments are not all constant \n%s', LazyDump(node))
             return node
 
         sbsnodeclass = self.LOOKUP_TABLE[node.function]
@@ -108,6 +105,7 @@ class ResolveShaderToyIntrinsics(Pass):
         return IRAttribute(
             variable=self.LOOKUP_TABLE.get(node.variable, node.variable),
             fields=node.fields,
+            version=node.version,
         )
 
 class ResolveGraphStatements(Pass):
@@ -139,37 +137,95 @@ class ResolveGraphStatements(Pass):
             outputs=outputs,
         )
 
-class SBSFunctionGraphNodeResolvers(ast.NodeVisitor):
+class EliminateDeadNodes(Pass):
+    """Keep only the graph nodes an output depends on, a graph without output is left untouched"""
+
+    REQUIRES = (
+        ResolveGraphStatements,
+    )
+
+    def visit_FunctionGraph(self, node):
+        if not node.outputs:
+            self.logger.debug(f'{node.identifier} : no output, nothing to eliminate')
+            return node
+
+        node_resolvers = SBSFunctionGraphNodeResolvers()
+        for output in node.outputs:
+            node_resolvers.visit(output)
+        live = set(map(id, node_resolvers.nodes))
+
+        nodes = [ _ for _ in node.nodes if id(_) in live ]
+        self.logger.info(f'{node.identifier} : {len(node.nodes) - len(nodes)} dead nodes removed')
+
+        return SBSFunctionGraph(
+            identifier=node.identifier,
+            parameters=node.parameters,
+            _statements=[
+                statement
+                for statement in node._statements
+                if isinstance(statement, SBSOutput) or (id(statement) in live)
+            ],
+            nodes=nodes,
+            outputs=node.outputs,
+        )
+
+class SBSFunctionGraphNodeResolvers(NodeVisitor):
+    """Collect graph nodes, dependencies first
+
+    Handlers visiting subnodes are generators yielding them (see py2xyz.traversal), and nodes shared by several
+    statements are visited once, so the walk stays linear in the number of nodes whatever the depth.
+    """
+
     def __init__(self):
         self.nodes = list()
+        self.__added = set()
 
     def __add(self, node):
-        if node not in self.nodes:
+        if id(node) not in self.__added:
+            self.__added.add(id(node))
             self.nodes.append(node)
 
+    def visit_step(self, node):
+        if id(node) in self.__added:
+            return None
+        return super().visit_step(node)
+
     def __visit_BinaryOperation(self, node):
-        self.visit(node.a)
-        self.visit(node.b)
+        yield node.a
+        yield node.b
         self.__add(node)
 
-    def visit_Set(self, node):
-        self.visit(node.from_node)
+    def __visit_UnaryOperation(self, node):
+        yield node.a
+        self.__add(node)
+
+    def __visit_from_node(self, node):
+        yield node.from_node
         self.__add(node)
 
+    def visit_Set(self, node):
+        return self.__visit_from_node(node)
+
     def visit_Add(self, node):
-        self.__visit_BinaryOperation(node)
+        return self.__visit_BinaryOperation(node)
 
     def visit_Sub(self, node):
-        self.__visit_BinaryOperation(node)
+        return self.__visit_BinaryOperation(node)
 
     def visit_Mul(self, node):
-        self.__visit_BinaryOperation(node)
+        return self.__visit_BinaryOperation(node)
 
     def visit_Div(self, node):
-        self.__visit_BinaryOperation(node)
+        return self.__visit_BinaryOperation(node)
+
+    def visit_Neg(self, node):
+        return self.__visit_UnaryOperation(node)
+
+    def visit_Pow2(self, node):
+        return self.__visit_UnaryOperation(node)
 
     def visit_Output(self, node):
-        self.visit(node.node)
+        yield node.node
 
     def visit_GetFloat1(self, node):
         self.__add(node)
@@ -195,21 +251,23 @@ class SBSFunctionGraphNodeResolvers(ast.NodeVisitor):
     def visit_ConstFloat4(self, node):
         self.__add(node)
 
+    def visit_Swizzle1(self, node):
+        return self.__visit_from_node(node)
+
     def visit_Swizzle2(self, node):
-        self.visit(node.from_node)
-        self.__add(node)
+        return self.__visit_from_node(node)
 
     def visit_Swizzle3(self, node):
-        self.visit(node.from_node)
-        self.__add(node)
+        return self.__visit_from_node(node)
 
     def visit_Swizzle4(self, node):
-        self.visit(node.from_node)
-        self.__add(node)
+        return self.__visit_from_node(node)
 
     def generic_visit(self, node):
         raise NotImplementedError(dump(node))
 
+    generic_visit_steps = generic_visit
+
 DEFAULT_PRE_PASSES = [
     ResolveConstNode,
     ResolveShaderToyIntrinsics,
@@ -217,9 +275,6 @@ DEFAULT_PRE_PASSES = [
 
 DEFAULT_POST_PASSES = [
     ResolveGraphStatements,
+    EliminateDeadNodes,
     # ShaderToyIntrinsicPass,
-    # ResolveParameterTypeFromDefaultValue,
-    # FoldPow2ExpressionPass,
-    # ResolveFunctionOverloadSetPass,
-    # FlattenOverloadedFunctionsPass,
 ]
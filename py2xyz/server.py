@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import hmac
+import json
+import secrets
+import logging
+import logging.config
+import argparse
+import contextlib
+import traceback
+import http.server
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+import py2xyz
+
+from py2xyz import (
+    __version__ as moduleversion,
+    DUMP_STAGES,
+    dump,
+    dump_logger,
+)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8717
+
+def token_path(port=DEFAULT_PORT):
+    """File holding the token of the server listening on `port`, readable by its owner only"""
+    from py2xyz import cli
+    return cli.SETTINGS_FOLDER / f'server-{port}.token'
+
+def write_token(path):
+    token = secrets.token_urlsafe(32)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # NOTE created anew, so that a token file left by another user or with a wider mode is never reused
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as stream:
+        stream.write(token)
+    return token
+
+def read_token(path):
+    return path.read_text().strip()
+
+class _CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.setFormatter(logging.Formatter('[{levelname: >5}][{name}] {message}', style='{'))
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+@contextlib.contextmanager
+def _preserve_logging():
+    """Restore the logger levels and dump settings a command line run changes, e.g. with -v or --dump"""
+    loggers = [ logging.getLogger(py2xyz.__name__), *( dump_logger(_) for _ in DUMP_STAGES ) ]
+    levels = [ _.level for _ in loggers ]
+    depth = py2xyz._dump_depth
+    try:
+        yield
+    finally:
+        for _, level in zip(loggers, levels):
+            _.setLevel(level)
+        py2xyz._dump_depth = depth
+
+@contextlib.contextmanager
+def _capture_logs(*loggernames):
+    handler = _CaptureHandler()
+    loggers = [ logging.getLogger(_) for _ in loggernames ]
+    for _ in loggers:
+        _.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        for _ in loggers:
+            _.removeHandler(handler)
+
+class CompileRequestHandler(http.server.BaseHTTPRequestHandler):
+    """JSON over HTTP front-end of the compilation pipeline
+
+    GET  /status   : server version and pid
+    POST /compile  : { source, filename, target, output, passes } -> { status, output, dump, error, log }
+    POST /run      : { argv, cwd } -> { status, stdout, stderr, log }, i.e. a py2sbs command line run inside the server
+    POST /shutdown : stop the server
+
+    Every request must carry the server token (see token_path) as `Authorization: Bearer <token>`, POST requests must be
+    `application/json` : browsers cannot send such requests cross-origin without a preflight this server never answers.
+    """
+
+    server_version = f'py2xyz/{moduleversion}'
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} - {format % args}')
+
+    def _send_json(self, payload, code=200):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length).decode('utf-8')) if length else { }
+
+    def _authorized(self):
+        authorization = self.headers.get('Authorization', '')
+        if hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {self.server.token}'.encode('utf-8')):
+            return True
+        self._send_json({ 'error': 'missing or invalid server token' }, code=403)
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+
+        if self.path == '/status':
+            self._send_json({
+                'version': moduleversion,
+                'pid'    : os.getpid(),
+            })
+        else:
+            self._send_json({ 'error': f'unknown endpoint {self.path}' }, code=404)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.headers.get_content_type() != 'application/json':
+            self._send_json({ 'error': 'expected an application/json payload' }, code=415)
+            return
+
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json({ 'error': 'invalid JSON payload' }, code=400)
+            return
+
+        if self.path == '/compile':
+            self._send_json(self.compile(payload))
+        elif self.path == '/run':
+            self._send_json(self.run(payload))
+        elif self.path == '/shutdown':
+            self._send_json({ 'status': 0 })
+            self.server.shutdown_requested = True
+        else:
+            self._send_json({ 'error': f'unknown endpoint {self.path}' }, code=404)
+
+    def compile(self, payload):
+        from py2xyz.pipeline import compile_source, default_pass_managers
+
+        response = {
+            'status': 0,
+            'output': None,
+            'dump'  : None,
+            'error' : None,
+        }
+        with _capture_logs('py2xyz') as records:
+            try:
+                node = compile_source(
+                    payload['source'],
+                    filename=payload.get('filename', '<string>'),
+                    target=payload.get('target'),
+                    output=payload.get('output'),
+                    passes=payload.get('passes'),
+                    cache=self.server.cache,
+                    pass_managers=default_pass_managers(payload.get('passes'), memoize=True),
+                )
+            except (KeyError, ValueError, SyntaxError):
+                response.update(status=-1, error=f'Invalid DSL : {traceback.format_exc()}')
+            except Exception:
+                response.update(status=-1, error=f'Transpilation Failure : {traceback.format_exc()}')
+            else:
+                if payload.get('output') and payload.get('target'):
+                    response['output'] = str(payload['output'])
+                else:
+                    response['dump'] = dump(node)
+        response['log'] = records
+        return response
+
+    def run(self, payload):
+        from py2xyz import cli
+
+        argv = payload.get('argv', [])
+        if any(_ in ('-w', '--watch') for _ in argv):
+            return { 'status': 1, 'stdout': '', 'stderr': '--watch is not supported through the compile server\n', 'log': [] }
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        previous_cwd = os.getcwd()
+        with _preserve_logging(), _capture_logs('py2xyz') as records:
+            try:
+                os.chdir(payload.get('cwd', previous_cwd))
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    status = cli.main(argv)
+            except SystemExit as e:
+                status = e.code
+            except Exception:
+                stderr.write(traceback.format_exc())
+                status = -1
+            finally:
+                os.chdir(previous_cwd)
+
+        return {
+            'status': status or 0,
+            'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue(),
+            'log'   : records,
+        }
+
+class CompileServer(http.server.HTTPServer):
+    """Single-threaded on purpose : pysbs and the passes are not meant to be shared across threads"""
+
+    def __init__(self, address, token, cache=None):
+        super().__init__(address, CompileRequestHandler)
+        self.token = token
+        self.cache = cache
+        self.shutdown_requested = False
+
+    def serve_until_shutdown(self):
+        while not self.shutdown_requested:
+            self.handle_request()
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, cache=None):
+    # NOTE warm up : pay every import (backends included) once, before the first request
+    from py2xyz import cli
+    from py2xyz.pipeline import BACKENDS, load_backend
+
+    for target in BACKENDS:
+        try:
+            load_backend(target)
+        except ImportError as e:
+            logger.warning(f'{target} target is unavailable : {e}')
+
+    path = token_path(port)
+    token = write_token(path)
+    try:
+        with CompileServer((host, port), token, cache=cache) as server:
+            logger.info(f'compile server listening on http://{host}:{port}, token in {path}')
+            try:
+                server.serve_until_shutdown()
+            except KeyboardInterrupt:
+                pass
+            logger.info(f'compile server stopped')
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return 0
+
+def request(path, payload=None, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=None, token=None):
+    url = f'http://{host}:{port}{path}'
+    data = None if payload is None else json.dumps(payload).encode('utf-8')
+    headers = { 'Content-Type': 'application/json' }
+    if token is not None:
+        headers['Authorization'] = f'Bearer {token}'
+    http_request = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(http_request, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def main(argv=None):
+    from py2xyz import cli
+
+    parser = argparse.ArgumentParser(description='Long-running py2sbs compile server')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on (default: %(default)s)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help=f'Do not use the compilation cache ({cli.CACHE_FOLDER})')
+    arguments = parser.parse_args(argv)
+
+    logging.config.dictConfig(cli.LOGGING_CONFIG)
+
+    cache = None
+    if arguments.cache:
+        cache = cli.CompilationCache(cli.CACHE_FOLDER)
+
+    return serve(arguments.host, arguments.port, cache=cache)
+
+def client_main(argv=None):
+    """Forward a py2sbs command line to a running compile server"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--server-host', default=DEFAULT_HOST)
+    parser.add_argument('--server-port', type=int, default=DEFAULT_PORT)
+    arguments, forwarded = parser.parse_known_args(argv)
+
+    path = token_path(arguments.server_port)
+    try:
+        token = read_token(path)
+    except OSError as e:
+        sys.stderr.write(f'cannot read compile server token {path}, is the server running ? {e}\n')
+        return 1
+
+    try:
+        response = request(
+            '/run',
+            { 'argv': forwarded, 'cwd': os.getcwd() },
+            host=arguments.server_host,
+            port=arguments.server_port,
+            token=token,
+        )
+    except urllib.error.HTTPError as e:
+        sys.stderr.write(f'compile server on {arguments.server_host}:{arguments.server_port} refused the request : {e}\n')
+        return 1
+    except (urllib.error.URLError, ConnectionError) as e:
+        sys.stderr.write(f'cannot reach compile server on {arguments.server_host}:{arguments.server_port} : {e}\n')
+        return 1
+
+    for record in response['log']:
+        print(record)
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import ast
+import abc
+
+class SlottedMeta(abc.ABCMeta):
+    """Generate `__slots__` from the `_fields` a class declares on top of its bases'"""
+
+    def __new__(metaclass, name, bases, namespace, **kwargs):
+        if '__slots__' not in namespace:
+            inherited = {
+                slot
+                for base in bases
+                for klass in base.__mro__
+                for slot in getattr(klass, '__slots__', ())
+            }
+            namespace['__slots__'] = tuple(
+                field
+                for field in namespace.get('_fields', ())
+                if field not in inherited
+            )
+        return super().__new__(metaclass, name, bases, namespace, **kwargs)
+
+class SlottedAST(metaclass=SlottedMeta):
+    """Compact tree node : fields are slots, no per-instance `__dict__`
+
+    Follows the ast.AST protocol (`_fields`, `_attributes`, positional or keyword fields, unset fields raising
+    AttributeError) so ast.NodeVisitor, ast.iter_fields, py2xyz.traversal and py2xyz.dump handle both kinds of nodes.
+    """
+    __slots__ = ()
+
+    _fields = ()
+    _attributes = ()
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(self._fields):
+            raise TypeError(f'{self.__class__.__name__} constructor takes at most {len(self._fields)} positional argument{"" if len(self._fields) == 1 else "s"}')
+
+        for field, value in zip(self._fields, args):
+            setattr(self, field, value)
+
+        for field, value in kwargs.items():
+            try:
+                setattr(self, field, value)
+            except AttributeError:
+                raise TypeError(f'{self.__class__.__name__} got an unexpected keyword argument {field!r}') from None
+
+# NOTE for isinstance checks of code walking both Python and py2xyz trees
+NODE_TYPES = (
+    ast.AST,
+    SlottedAST,
+)
@@ -0,0 +1,114 @@
+import ast
+import types
+
+from py2xyz.slotted import NODE_TYPES
+
+def trampoline(result, visit_step):
+    """Run visitor handlers with an explicit stack instead of Python recursion
+
+    A handler may be written as a generator : it yields the child nodes it needs visited and receives their result back,
+    its return value being its own result. `visit_step(child)` calls the handler of `child` and returns either its result
+    or such a generator, which is then driven here. Traversal depth is only bound by memory, not by the recursion limit.
+    """
+    if not isinstance(result, types.GeneratorType):
+        return result
+
+    stack = [ result ]
+    value = None
+    while stack:
+        try:
+            child = stack[-1].send(value)
+        except StopIteration as e:
+            stack.pop()
+            value = e.value
+            continue
+
+        value = visit_step(child)
+        if isinstance(value, types.GeneratorType):
+            stack.append(value)
+            value = None
+    return value
+
+class NodeVisitor(ast.NodeVisitor):
+    """ast.NodeVisitor whose generic visit, and handlers written as generators, run on an explicit stack"""
+
+    def visit(self, node):
+        return trampoline(self.visit_step(node), self.visit_step)
+
+    def visit_step(self, node):
+        handler = getattr(self, f'visit_{node.__class__.__name__}', None)
+        if handler is None:
+            return self.generic_visit_steps(node)
+        return handler(node)
+
+    def generic_visit(self, node):
+        return trampoline(self.generic_visit_steps(node), self.visit_step)
+
+    def generic_visit_steps(self, node):
+        for _, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, NODE_TYPES):
+                        yield item
+            elif isinstance(value, NODE_TYPES):
+                yield value
+
+class NodeTransformer(NodeVisitor, ast.NodeTransformer):
+    """ast.NodeTransformer whose generic visit, and handlers written as generators, run on an explicit stack"""
+
+    def generic_visit_steps(self, node):
+        for field, old_value in ast.iter_fields(node):
+            if isinstance(old_value, list):
+                new_values = []
+                for value in old_value:
+                    if isinstance(value, NODE_TYPES):
+                        value = yield value
+                        if value is None:
+                            continue
+                        elif not isinstance(value, NODE_TYPES):
+                            new_values.extend(value)
+                            continue
+                    new_values.append(value)
+                old_value[:] = new_values
+            elif isinstance(old_value, NODE_TYPES):
+                new_node = yield old_value
+                if new_node is None:
+                    delattr(node, field)
+                else:
+                    setattr(node, field, new_node)
+        return node
+
+class SharingNodeTransformer(NodeTransformer):
+    """NodeTransformer for trees whose subtrees are shared (see py2xyz.ir.interning)
+
+    A node reached from several parents is transformed once per visit and every parent gets the same result, so rewriting
+    an expression keeps it shared instead of duplicating it per use. Handlers must thus not depend on where a node is.
+    """
+
+    transformed = None
+
+    def visit(self, node):
+        if self.transformed is not None:
+            return super().visit(node)
+
+        self.transformed = {}
+        try:
+            return super().visit(node)
+        finally:
+            self.transformed = None
+
+    def visit_step(self, node):
+        if node in self.transformed:
+            return self.transformed[node]
+
+        result = super().visit_step(node)
+        if isinstance(result, types.GeneratorType):
+            return self._transform_steps(node, result)
+
+        self.transformed[node] = result
+        return result
+
+    def _transform_steps(self, node, steps):
+        result = yield from steps
+        self.transformed[node] = result
+        return result
@@ -0,0 +1,138 @@
+import time
+import logging
+import traceback
+
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+from py2xyz import LazyDump, dump_logger, TranspilerError
+
+from py2xyz.ir.compiler import (
+    ModuleTranspiler as IRModuleTranspiler,
+)
+
+from py2xyz.ir.ast import (
+    Function as IRFunction,
+    Module   as IRModule,
+)
+
+from py2xyz.sbs.ast import (
+    Package as SBSPackage,
+)
+
+from py2xyz.passmanager import fingerprint as structural_fingerprint
+
+from py2xyz.pipeline import (
+    parse,
+    make_pass_managers,
+    lower_function,
+    generate_package,
+    output_path,
+)
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+class IncrementalCompiler:
+    """Keep the compiled module in memory and only lower again top-level functions whose IR changed
+
+    The whole module is transpiled to IR and its module passes run (e.g. inlining, which depends on sibling functions),
+    functions are then fingerprinted on their resulting IR, so moving a function or editing another one it does not call
+    does not invalidate it. Post-passes are run per function, which assumes they do not depend on sibling functions.
+    """
+
+    def __init__(self, filename='<string>', target=None, passes=None, options=None):
+        self.filename = filename
+        self.target = target
+        self.pass_managers = make_pass_managers(passes, memoize=True, options=options)
+        self.transpiler = IRModuleTranspiler()
+
+        # identifier -> (fingerprint, compiled node)
+        self.functions = { }
+        self.module = None
+
+    @staticmethod
+    def fingerprint(node):
+        return structural_fingerprint(node)
+
+    def compile_function(self, ir_function):
+        compiled, _ = lower_function(ir_function, target=self.target, pass_managers=self.pass_managers)
+        return compiled
+
+    def update(self, source):
+        """Recompile `source`, return the identifiers of the functions that were rebuilt"""
+        ast_source = parse(source, filename=self.filename)
+        ast_source = self.pass_managers.py_post.run(ast_source)
+        ast_source = self.pass_managers.ir_pre.run(ast_source)
+
+        ast_ir = self.transpiler.visit(ast_source)
+        ast_ir = self.pass_managers.ir_module.run(ast_ir)
+
+        functions = { }
+        content = [ ]
+        rebuilt = [ ]
+        for subnode in ast_ir.content:
+            if not isinstance(subnode, IRFunction):
+                # NOTE non-function top-level statements are cheap, they are kept as transpiled
+                content.append(subnode)
+                continue
+
+            fingerprint = self.fingerprint(subnode)
+            previous_fingerprint, compiled = self.functions.get(subnode.identifier, (None, None))
+            if (fingerprint is None) or (previous_fingerprint != fingerprint):
+                logger.info(f'{subnode.identifier} changed, recompiling it')
+                compiled = self.compile_function(subnode)
+                rebuilt.append(subnode.identifier)
+
+            functions[subnode.identifier] = (fingerprint, compiled)
+            content.append(compiled)
+
+        removed = self.functions.keys() - functions.keys()
+        if removed:
+            logger.info(f'{", ".join(sorted(removed))} removed')
+
+        self.functions = functions
+        ModuleClazz = SBSPackage if self.target == 'sbs' else IRModule
+        self.module = ModuleClazz(
+            description=ast_ir.description,
+            content=content,
+        )
+        return rebuilt
+
+def watch(source_path, target=None, output=None, passes=None, interval=DEFAULT_POLL_INTERVAL, options=None):
+    """Poll `source_path` and recompile it on change, until interrupted"""
+    source_path = Path(source_path)
+    if output:
+        output = output_path(output)
+    compiler = IncrementalCompiler(filename=str(source_path), target=target, passes=passes, options=options)
+
+    logger.info(f'watching {source_path} (Ctrl+C to stop)')
+
+    last_mtime = None
+    try:
+        while True:
+            try:
+                mtime = source_path.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+
+            if (mtime is not None) and (mtime != last_mtime):
+                last_mtime = mtime
+                started = time.perf_counter()
+                try:
+                    rebuilt = compiler.update(source_path.read_text(encoding='utf-8'))
+                except (ValueError, SyntaxError):
+                    logger.error(f'Invalid DSL : {traceback.format_exc()}')
+                except (TranspilerError, NotImplementedError):
+                    logger.error(f'Transpilation Failure : {traceback.format_exc()}')
+                else:
+                    dump_logger('sbs' if target == 'sbs' else 'ir').debug('module\n%s', LazyDump(compiler.module))
+                    if output and (target == 'sbs'):
+                        generate_package(compiler.module, output)
+                    logger.info(f'rebuilt {len(rebuilt)} of {len(compiler.functions)} functions in {time.perf_counter() - started:.3f}s')
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info(f'stop watching {source_path}')
+
+    return 0
@@ -0,0 +1,17 @@
+import pytest
+
+from py2xyz.pipeline import compile_source, make_pass_managers
+
+@pytest.fixture
+def compile_ir():
+    """IR module of a source, once every IR pass ran"""
+    def compile_ir(source, passes=None, options=None):
+        return compile_source(source, pass_managers=make_pass_managers(passes, memoize=False, options=options))
+    return compile_ir
+
+@pytest.fixture
+def compile_sbs():
+    """SBS package of a source, codegen excluded so pysbs is not required"""
+    def compile_sbs(source, passes=None, options=None):
+        return compile_source(source, target='sbs', pass_managers=make_pass_managers(passes, memoize=False, options=options))
+    return compile_sbs
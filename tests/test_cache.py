@@ -0,0 +1,62 @@
+import os
+
+from py2xyz import cache as cachemodule
+from py2xyz.cache import CompilationCache, package_digest
+
+def test_key_depends_on_every_input():
+    key = CompilationCache.make_key('source')
+    assert len({
+        key,
+        CompilationCache.make_key('other source'),
+        CompilationCache.make_key('source', passes=[ 'Constant' ]),
+        CompilationCache.make_key('source', target='sbs'),
+        CompilationCache.make_key('source', options={ 'unroll_budget': 1 }),
+        CompilationCache.make_key('source', version='0.0.0'),
+    }) == 6
+
+def test_package_digest_follows_sources(tmp_path):
+    (tmp_path / 'module.py').write_text('A = 1\n')
+    digest = package_digest(tmp_path)
+    package_digest.cache_clear()
+
+    (tmp_path / 'module.py').write_text('A = 2\n')
+    assert package_digest(tmp_path) != digest
+    package_digest.cache_clear()
+
+def test_entries_round_trip(tmp_path):
+    cache = CompilationCache(tmp_path)
+    cache.put('ab' * 32, 'ir', { 'node': [ 1, 2 ] })
+    assert cache.get('ab' * 32, 'ir') == { 'node': [ 1, 2 ] }
+    assert cache.get('cd' * 32, 'ir') is None
+
+def test_corrupted_entry_is_discarded(tmp_path):
+    cache = CompilationCache(tmp_path)
+    cache.put_bytes('ab' * 32, 'ir', b'not a pickle')
+    assert cache.get('ab' * 32, 'ir') is None
+    assert not cache.path('ab' * 32, 'ir').exists()
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = CompilationCache(tmp_path, max_size=350)
+    keys = [ f'{_:02}' * 32 for _ in range(3) ]
+    for idx, key in enumerate(keys):
+        cache.put_bytes(key, 'ir', b'x' * 100)
+        os.utime(cache.path(key, 'ir'), (idx, idx))
+
+    cache.get_bytes(keys[0], 'ir')
+    cache.put_bytes('ff' * 32, 'ir', b'x' * 100)
+
+    assert [ cache.path(_, 'ir').exists() for _ in keys ] == [ True, False, True ]
+    assert cache.size == 300
+
+def test_folder_is_not_scanned_on_every_store(tmp_path, monkeypatch):
+    cache = CompilationCache(tmp_path)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: scans.append(None) or evict())
+
+    for idx in range(cachemodule.SCAN_PERIOD * 2):
+        cache.put_bytes(f'{idx:064x}', 'ir', b'x')
+
+    # NOTE the first store scans for the initial size
+    assert len(scans) == 3
+    assert cache.size == cachemodule.SCAN_PERIOD * 2
@@ -0,0 +1,42 @@
+import pytest
+
+from py2xyz import cli
+
+def test_unsupported_source_is_a_failure_in_every_mode(tmp_path):
+    source = tmp_path / 'unsupported.py'
+    source.write_text('def f(p: float):\n    return p // 2.0\n')
+
+    assert cli.compile_file(source, cache=None).status == -1
+    assert cli.main([ '--no-cache', str(source) ]) == -1
+
+def test_invalid_dsl_is_a_failure_in_every_mode(tmp_path):
+    source = tmp_path / 'invalid.py'
+    source.write_text('def f(p: float:\n')
+
+    result = cli.compile_file(source, cache=None)
+    assert (result.status == -1) and result.error.startswith('Invalid DSL')
+    assert cli.main([ '--no-cache', str(source) ]) == -1
+
+def test_compiler_bugs_propagate_in_every_mode(tmp_path, monkeypatch):
+    source = tmp_path / 'valid.py'
+    source.write_text('def f(p: float):\n    return p * 2.0\n')
+
+    def compile_source(*args, **kwargs):
+        raise KeyError('bug')
+    monkeypatch.setattr(cli, 'compile_source', compile_source)
+
+    with pytest.raises(KeyError):
+        cli.compile_file(source, cache=None)
+    with pytest.raises(KeyError):
+        cli.main([ '--no-cache', str(source) ])
+
+def test_compiler_bugs_are_reported_per_file_in_batch_mode(tmp_path, caplog):
+    (tmp_path / 'valid.py').write_text('def f(p: float):\n    return p * 2.0\n')
+    # NOTE keyword arguments reach the front-end unsupported, failing with a TypeError rather than a TranspilerError
+    (tmp_path / 'keyword.py').write_text('def f(p: float):\n    return sin(x=p)\n')
+
+    caplog.set_level('INFO', logger='py2xyz.cli')
+    assert cli.compile_batch([ str(tmp_path) ], jobs=2) == -1
+
+    assert 'Internal Error' in caplog.text
+    assert '2 files' in caplog.text and '1 succeeded, 1 failed' in caplog.text
@@ -0,0 +1,36 @@
+import ast
+
+import pytest
+
+from py2xyz import TranspilerError
+
+from py2xyz.ir.compiler import ModuleTranspiler
+
+def transpile(source):
+    return ModuleTranspiler().visit(ast.parse(source))
+
+def test_top_level_functions_are_transpiled():
+    function, = transpile('''
+def f(x: float):
+    return x * 2.0
+''').content
+    assert function.identifier == 'f'
+
+@pytest.mark.parametrize('source', [
+    '''
+def f(x: float):
+    def g(y):
+        return y
+    return g(x)
+''',
+    '''
+def f(x: float):
+    for i in range(2):
+        def g(y):
+            return y
+    return x
+''',
+])
+def test_nested_function_definition_is_an_error(source):
+    with pytest.raises(TranspilerError, match='Nested function definition'):
+        transpile(source)
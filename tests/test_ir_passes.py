@@ -0,0 +1,397 @@
+import pytest
+
+from py2xyz import TranspilerError
+
+from py2xyz.pipeline import compile_source, make_pass_managers
+from py2xyz.ir.passes import CanonicalizeSwizzles, DeadCodeElimination, UnrollLoops, Vectorization
+
+from py2xyz.ir.ast import (
+    Assign          as IRAssign,
+    BinaryOperation as IRBinaryOperation,
+    Call            as IRCall,
+    Constant        as IRConstant,
+    For             as IRFor,
+    Reference       as IRReference,
+
+    NumericalTypes  as IRNumericalTypes,
+)
+
+def function_body(module):
+    function, = module.content
+    return function.body
+
+def calls(statements):
+    stack, found = list(statements), []
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, IRCall):
+            found.append(node)
+            stack.extend(node.args)
+        elif hasattr(node, '_fields'):
+            stack.extend(getattr(node, _, None) for _ in node._fields)
+    return found
+
+def functions(module):
+    return { _.identifier: _ for _ in module.content }
+
+def returned(body):
+    return body[-1].expression
+
+def reads(expression):
+    stack, found = [ expression ], set()
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif hasattr(node, 'version') and hasattr(node, 'variable'):
+            found.add((node.variable, node.version))
+        elif hasattr(node, '_fields'):
+            stack.extend(getattr(node, _, None) for _ in node._fields)
+    return found
+
+# Static single assignment
+
+def test_definitions_are_numbered_and_reads_refer_to_the_reaching_one(compile_ir):
+    first, second, returned = function_body(compile_ir('''
+def f(p: float):
+    a = p
+    a = a * 2.0
+    return a + p
+''', [ 'StaticSingleAssignment' ]))
+    assert (first.identifier, first.version) == ('a', 1)
+    assert (second.identifier, second.version) == ('a', 2)
+    assert reads(second.expression) == { ('a', 1) }
+    assert reads(returned.expression) == { ('a', 2), ('p', 0) }
+
+# Constant folding
+
+FOLDING_PASSES = [ 'ConstantFolding' ]
+
+def test_integer_division_is_folded_as_true_division(compile_ir):
+    expression = returned(function_body(compile_ir('''
+def f(p: float):
+    return p * (1 / 2)
+''', FOLDING_PASSES)))
+    assert isinstance(expression.right, IRConstant) and (expression.right.value == 0.5)
+
+def test_folded_integer_division_lowers_to_sbs(compile_sbs):
+    graph, = compile_sbs('''
+def f(p: float):
+    return p * (1 / 2)
+''').content
+    assert graph._statements
+
+def test_constants_are_propagated_through_variables(compile_ir):
+    expression = returned(function_body(compile_ir('''
+def f(p: float):
+    a = 2.0
+    b = a * 3.0 - 1.0
+    return p * b
+''', FOLDING_PASSES)))
+    assert isinstance(expression.right, IRConstant) and (expression.right.value == 5.0)
+
+def test_modulo_is_floored(compile_ir):
+    expression = returned(function_body(compile_ir('''
+def f(p: float):
+    return p + (-7.0 % 2.0)
+''', FOLDING_PASSES)))
+    assert isinstance(expression.right, IRConstant) and (expression.right.value == 1.0)
+
+def test_vector_constants_are_folded_componentwise(compile_ir):
+    body = function_body(compile_ir('''
+def f(p: vec2):
+    a = vec2(1.0, 2.0) * 2.0
+    return p + a.yx
+''', FOLDING_PASSES))
+    assert isinstance(body[0].expression, IRConstant) and (body[0].expression.value == [ 2.0, 4.0 ])
+    assert returned(body).right.value == [ 4.0, 2.0 ]
+
+def test_division_by_zero_is_not_folded(compile_ir):
+    expression = returned(function_body(compile_ir('''
+def f(p: float):
+    return p * (1.0 / 0.0)
+''', FOLDING_PASSES)))
+    assert isinstance(expression.right, IRBinaryOperation)
+
+# Algebraic simplification
+
+def test_identities_are_removed_and_divisions_by_constants_reduced(compile_ir):
+    expression = returned(function_body(compile_ir('''
+def f(p: float):
+    return -(-p) * 1.0 + 0.0 - (p / 4.0)
+''', [ 'AlgebraicSimplification' ])))
+    assert isinstance(expression.left, IRReference) and (expression.left.variable == 'p')
+    assert (expression.right.left.variable, expression.right.right.value) == ('p', 0.25)
+
+def test_integer_divisions_are_not_reduced(compile_ir):
+    expression = returned(function_body(compile_ir('''
+def f(p: float):
+    return p / 4
+''', [ 'AlgebraicSimplification' ])))
+    assert expression.right.value == 4
+
+# Dead code elimination
+
+def test_assignments_not_reaching_a_return_are_removed(compile_ir):
+    body = function_body(compile_ir('''
+def f(p: float):
+    a = p * 2.0
+    b = a + 1.0
+    c = p - 1.0
+    return b
+''', [ 'DeadCodeElimination' ]))
+    assert [ _.identifier for _ in body if isinstance(_, IRAssign) ] == [ 'a', 'b' ]
+
+def test_dead_code_elimination_runs_without_pass_manager(compile_ir):
+    module = compile_ir('''
+def f(p: float):
+    a = p * 2.0
+    return p
+''', [ 'StaticSingleAssignment' ])
+    body = function_body(DeadCodeElimination().visit(module))
+    assert not [ _ for _ in body if isinstance(_, IRAssign) ]
+
+# Inlining
+
+INLINING_SOURCE = '''
+DECORATOR
+def g(x):
+    return x * 2.0
+
+def f(p: float):
+    return g(p) + 1.0
+'''
+
+def test_small_functions_are_inlined(compile_ir):
+    module = compile_ir(INLINING_SOURCE.replace('DECORATOR', ''), [ 'InlineFunctions' ])
+    function, = module.content
+    assert function.identifier == 'f'
+    assert not calls(function.body)
+
+def test_noinline_functions_are_called(compile_ir):
+    module = functions(compile_ir(INLINING_SOURCE.replace('DECORATOR', '@noinline'), [ 'InlineFunctions' ]))
+    assert list(module) == [ 'g', 'f' ]
+    assert [ _.function for _ in calls(module['f'].body) ] == [ 'g' ]
+
+# Common subexpression elimination
+
+CSE_PASSES = [ 'ResolveGLSLParameterType', 'CommonSubexpressionElimination' ]
+
+def test_cse_reuses_value_held_by_live_variable(compile_ir):
+    body = function_body(compile_ir('''
+def f(p: vec2):
+    a = p.x * 2.0
+    c = p.x * 2.0
+    return c + a
+''', CSE_PASSES))
+    assert isinstance(body[1].expression, IRReference)
+    assert (body[1].expression.variable, body[1].expression.version) == ('a', 1)
+
+def test_cse_does_not_reuse_value_of_redefined_variable(compile_ir):
+    body = function_body(compile_ir('''
+def f(p: vec2):
+    a = p.x * 2.0
+    a = p.y
+    c = p.x * 2.0
+    return c + a
+''', CSE_PASSES))
+    definition_c = body[2]
+    assert isinstance(definition_c.expression, IRBinaryOperation)
+    assert ('a', 1) not in reads(body[2:])
+
+def test_cse_does_not_look_through_copy_of_redefined_variable(compile_ir):
+    body = function_body(compile_ir('''
+def f(p: vec2, q: float):
+    a = p.x * q
+    b = a
+    a = p.y
+    return b + a
+''', CSE_PASSES))
+    assert ('a', 1) not in reads(body[-1])
+
+# Swizzles
+
+SWIZZLE_PASSES = [ 'ResolveGLSLParameterType', 'CanonicalizeSwizzles' ]
+
+def test_swizzles_of_swizzled_variable_are_composed(compile_ir):
+    body = function_body(compile_ir('''
+def f(v: vec3):
+    b = v.bgr
+    return b.xy
+''', SWIZZLE_PASSES))
+    returned = body[-1].expression
+    assert (returned.variable, returned.version, returned.fields) == ('v', 0, 'zy')
+
+def test_identity_swizzle_is_a_reference(compile_ir):
+    body = function_body(compile_ir('''
+def f(v: vec2):
+    return v.xy
+''', SWIZZLE_PASSES))
+    assert isinstance(body[-1].expression, IRReference)
+
+def test_swizzles_are_not_composed_across_redefinition_of_their_source(compile_ir):
+    body = function_body(compile_ir('''
+def f(v: vec3, w: vec3):
+    b = v.zyx
+    v = w * 2.0
+    return b.xy + v.xy
+''', SWIZZLE_PASSES))
+    assert reads(body[-1]) == { ('b', 1), ('v', 1) }
+
+def test_swizzle_canonicalization_runs_without_pass_manager(compile_ir):
+    module = compile_ir('''
+def f(v: vec2):
+    return v.xy
+''', [ 'ResolveGLSLParameterType', 'StaticSingleAssignment' ])
+    body = function_body(CanonicalizeSwizzles().visit(module))
+    assert isinstance(body[-1].expression, IRReference)
+
+# Vectorization
+
+VECTORIZATION_PASSES = [ 'ResolveGLSLParameterType', 'Vectorization' ]
+
+def test_isomorphic_lanes_are_vectorized(compile_ir):
+    body = function_body(compile_ir('''
+def f(a: vec2, b: vec2):
+    x = a.x * b.x + 1.0
+    y = a.y * b.y + 2.0
+    return vec2(x, y)
+''', VECTORIZATION_PASSES))
+    returned = body[-1].expression
+    assert isinstance(returned, IRBinaryOperation)
+    assert (returned.left.left.fields, returned.left.right.fields, returned.right.value) == ('xy', 'xy', [ 1.0, 2.0 ])
+
+def test_lanes_are_not_looked_through_past_a_redefinition(compile_ir):
+    body = function_body(compile_ir('''
+def f(a: vec2, b: vec2):
+    x = a.x * b.x
+    y = a.y * b.y
+    a = b * 2.0
+    return vec2(x, y)
+''', VECTORIZATION_PASSES))
+    assert reads(body[-1]) == { ('x', 1), ('y', 1) }
+
+def test_vectorization_runs_without_pass_manager(compile_ir):
+    module = compile_ir('''
+def f(a: vec2, b: vec2):
+    return vec2(a.x * b.x, a.y * b.y)
+''', [ 'ResolveGLSLParameterType', 'StaticSingleAssignment' ])
+    body = function_body(Vectorization().visit(module))
+    assert isinstance(body[-1].expression, IRBinaryOperation)
+
+def test_integer_vector_lanes_are_not_packed_into_float_constructor(compile_ir):
+    body = function_body(compile_ir('''
+def f(i: ivec2):
+    return vec2(i.x, i.y)
+''', VECTORIZATION_PASSES))
+    assert isinstance(body[-1].expression, IRCall)
+
+# Loop unrolling
+
+LOOP_SOURCE = '''
+def f(p: float):
+    x = p
+    for i in range(N):
+        x = x * p + i
+    return x
+'''
+
+def test_loop_is_unrolled_with_float_indices(compile_ir):
+    body = function_body(compile_ir(LOOP_SOURCE.replace('N', '3'), [ 'UnrollLoops' ]))
+    assert not any(isinstance(_, IRFor) for _ in body)
+    assert [ _.expression.value for _ in body if isinstance(_, IRAssign) and (_.identifier == 'i') ] == [ 0.0, 1.0, 2.0 ]
+
+def test_unrolled_loop_lowers_to_sbs(compile_sbs):
+    graph, = compile_sbs(LOOP_SOURCE.replace('N', '3')).content
+    assert graph._statements
+
+def test_loop_over_budget_is_an_error(compile_ir):
+    with pytest.raises(TranspilerError, match='budget'):
+        compile_ir(LOOP_SOURCE.replace('N', '5000'))
+
+def test_loop_budget_is_an_option(compile_ir):
+    body = function_body(compile_ir(LOOP_SOURCE.replace('N', '1000'), options={ 'unroll_budget': 20000 }))
+    assert not any(isinstance(_, IRFor) for _ in body)
+
+def test_loop_budget_bounds_every_loop_of_a_function(compile_ir):
+    source = '''
+def f(p: float):
+    x = p
+    for i in range(300):
+        x = x * p + i
+    for j in range(300):
+        x = x * p + j
+    return x
+'''
+    compile_ir(source, options={ 'unroll_budget': 8000 })
+    with pytest.raises(TranspilerError, match='used by previous loops'):
+        compile_ir(source, options={ 'unroll_budget': 4000 })
+
+def test_memoized_passes_depend_on_options():
+    source = LOOP_SOURCE.replace('N', '500')
+    pass_managers = make_pass_managers(memoize=True, options={ 'unroll_budget': 10000 })
+    compile_source(source, pass_managers=pass_managers)
+
+    unroll, = [ _ for _ in pass_managers.ir_module.passes if isinstance(_, UnrollLoops) ]
+    unroll.NODE_BUDGET = 1000
+    with pytest.raises(TranspilerError, match='budget'):
+        compile_source(source, pass_managers=pass_managers)
+
+# Function overloads
+
+OVERLOADS_PASSES = [ 'ResolveFunctionOverloads' ]
+
+OVERLOADED_SOURCE = '''
+@noinline
+def add(x, y):
+    return x + y
+
+def main(p: vec2, q: float):
+    a = add(p, p)
+    return a.x + add(q, 1)
+'''
+
+def test_calls_are_resolved_to_the_overload_of_their_argument_types(compile_ir):
+    module = functions(compile_ir(OVERLOADED_SOURCE, OVERLOADS_PASSES))
+    assert 'add' not in module
+
+    assign, returned = module['main'].body
+    assert assign.expression.function == 'add_f2_f2'
+    assert returned.expression.right.function == 'add_f1_f1'
+    assert all(_ in module for _ in ( 'add_f1_f1', 'add_f2_f2' ))
+
+def test_calls_are_resolved_after_every_pass(compile_ir):
+    module = functions(compile_ir(OVERLOADED_SOURCE))
+    called = [ _.function for _ in calls(module['main'].body) ]
+    assert sorted(called) == [ 'add_f1_f1', 'add_f2_f2' ]
+
+def test_function_without_feasible_types_is_skipped(compile_ir, caplog):
+    module = functions(compile_ir('''
+def mod(x, y: int):
+    return x % y
+
+def main(p: float):
+    return p * 2.0
+''', OVERLOADS_PASSES))
+    assert list(module) == [ 'main' ]
+    assert 'mod skipped' in caplog.text
+
+def test_unread_parameter_does_not_fail_the_module(compile_ir):
+    module = functions(compile_ir('''
+def f(x, y):
+    return x * 2.0
+''', OVERLOADS_PASSES))
+    assert all(_.arguments[1].type == IRNumericalTypes.Float1 for _ in module.values())
+
+def test_call_to_skipped_function_is_an_error(compile_ir):
+    with pytest.raises(TranspilerError, match='no parameter types'):
+        compile_ir('''
+@noinline
+def mod(x, y: int):
+    return x % y
+
+def main(p: float):
+    return mod(p, 2)
+''', OVERLOADS_PASSES)
@@ -0,0 +1,34 @@
+from py2xyz import dump
+
+from py2xyz.pipeline import compile_source, default_pass_managers, make_pass_managers
+
+SOURCE = '''
+def f(p: vec2):
+    a = p.x * 2.0
+    b = a + 1.0
+    return b * p.y
+'''
+
+def test_pass_managers_do_not_memoize_by_default():
+    assert not any(_.memoize for _ in make_pass_managers())
+    assert not any(_.memoize for _ in default_pass_managers())
+
+def test_memoized_passes_restore_their_output(caplog):
+    pass_managers = make_pass_managers(memoize=True)
+    first = dump(compile_source(SOURCE, pass_managers=pass_managers))
+
+    caplog.set_level('INFO', logger='py2xyz.passmanager')
+    second = dump(compile_source(SOURCE, pass_managers=pass_managers))
+
+    assert 'input unchanged' in caplog.text
+    assert first == second
+
+def test_passes_run_without_memoization(caplog):
+    pass_managers = make_pass_managers()
+    compile_source(SOURCE, pass_managers=pass_managers)
+
+    caplog.set_level('INFO', logger='py2xyz.passmanager')
+    compile_source(SOURCE, pass_managers=pass_managers)
+
+    assert 'input unchanged' not in caplog.text
+    assert not any(_.memo for _ in pass_managers)
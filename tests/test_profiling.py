@@ -0,0 +1,42 @@
+import tracemalloc
+
+from py2xyz.profiling import Profiler, format_table
+
+def allocate(node):
+    return [ bytearray(1024) for _ in range(64) ]
+
+def test_times_are_recorded_without_tracing():
+    profiler = Profiler()
+    profiler.run('ir', 'allocate', allocate, None)
+
+    record, = profiler.records
+    assert (record.wall is not None) and (record.cpu is not None)
+    assert record.peak_memory is None
+
+def test_memory_is_traced_during_the_stage_only():
+    assert not tracemalloc.is_tracing()
+    profiler = Profiler(trace_memory=True)
+    profiler.run('ir', 'allocate', allocate, None)
+
+    record, = profiler.records
+    assert record.peak_memory >= 64 * 1024
+    assert (record.wall is None) and (record.cpu is None)
+    assert not tracemalloc.is_tracing()
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        profiler = Profiler(trace_memory=True)
+        profiler.run('ir', 'allocate', allocate, None)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+def test_table_formats_either_records():
+    profiler = Profiler()
+    profiler.run('ir', 'allocate', allocate, None)
+    assert '-' not in format_table(profiler.records).splitlines()[2].split()[3]
+
+    profiler = Profiler(trace_memory=True)
+    profiler.run('ir', 'allocate', allocate, None)
+    assert format_table(profiler.records).splitlines()[2].split()[3] == '-'
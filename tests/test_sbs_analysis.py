@@ -0,0 +1,63 @@
+import ast
+
+from py2xyz.ir.compiler import ModuleTranspiler
+from py2xyz.ir.ast import (
+    ANY_FLOAT_TYPES,
+    NumericalTypes,
+)
+from py2xyz.sbs.analysis import constant_types, infer_argument_types
+
+F1, F2, F3, F4 = NumericalTypes.Float1, NumericalTypes.Float2, NumericalTypes.Float3, NumericalTypes.Float4
+I1 = NumericalTypes.Integer1
+
+def function(source):
+    function, = ModuleTranspiler().visit(ast.parse(source)).content
+    return function
+
+def test_integer_constants_also_stand_for_floats():
+    assert constant_types(2) == { I1, F1 }
+    assert constant_types(2.0) == { F1 }
+    assert constant_types([ 1.0, 2 ]) == { F2 }
+    assert constant_types('text') == set()
+
+def test_operands_of_an_operator_share_their_type():
+    overloads = infer_argument_types(function('''
+def f(x, y):
+    return x + y
+'''), domain=ANY_FLOAT_TYPES)
+    assert sorted(overloads, key=str) == [ (F1, F1), (F2, F2), (F3, F3), (F4, F4) ]
+
+def test_swizzles_constrain_the_vector_size():
+    overloads = infer_argument_types(function('''
+def f(x):
+    return x.zy
+'''), domain=ANY_FLOAT_TYPES)
+    assert sorted(overloads, key=str) == [ (F3, ), (F4, ) ]
+
+def test_known_parameter_types_prune_the_others():
+    overloads = infer_argument_types(function('''
+def f(x, y):
+    a = x.x * y
+    return a + x.y
+'''), [ F2, None ], domain=ANY_FLOAT_TYPES)
+    assert overloads == [ (F2, F1) ]
+
+def test_unread_parameter_takes_the_type_of_its_default_value():
+    overloads = infer_argument_types(function('''
+def f(x, y=2.0):
+    return x * 2.0
+'''), domain={ F1 })
+    assert overloads == [ (F1, F1) ]
+
+def test_unread_parameter_without_default_value_is_a_float():
+    overloads = infer_argument_types(function('''
+def f(x, y):
+    return x
+'''), domain=ANY_FLOAT_TYPES)
+    assert sorted(overloads, key=str) == [ (F1, F1), (F2, F1), (F3, F1), (F4, F1) ]
+
+def test_infeasible_operations_have_no_overload():
+    assert infer_argument_types(function('''
+def f(x, y: int):
+    return x % y
+'''), [ None, I1 ], domain=ANY_FLOAT_TYPES) == []
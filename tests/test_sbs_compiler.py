@@ -0,0 +1,84 @@
+from py2xyz.ir.ast import (
+    Assign          as IRAssign,
+    Attribute       as IRAttribute,
+    BinaryOperation as IRBinaryOperation,
+    Constant        as IRConstant,
+    Function        as IRFunction,
+    Reference       as IRReference,
+    Return          as IRReturn,
+    TypedParameter  as IRTypedParameter,
+
+    Addition        as IRAddition,
+    Multiplication  as IRMultiplication,
+    NumericalTypes  as IRNumericalTypes,
+)
+
+from py2xyz.sbs.ast import (
+    Mul      as SBSMul,
+    Output   as SBSOutput,
+    Set      as SBSSet,
+    Swizzle1 as SBSSwizzle1,
+)
+
+from py2xyz.sbs.compiler import FunctionGraphTranspiler
+
+def make_function(body):
+    return IRFunction(
+        identifier='f',
+        arguments=[ IRTypedParameter(identifier='p', type=IRNumericalTypes.Float2, annotation='vec2', expression=None) ],
+        body=body,
+        returns=None,
+        decorators=[],
+    )
+
+def output_of(graph):
+    output, = [ _ for _ in graph._statements if isinstance(_, SBSOutput) ]
+    return output.node
+
+def test_read_of_older_version_lowers_to_its_definition():
+    graph = FunctionGraphTranspiler().visit(make_function([
+        IRAssign(identifier='a', expression=IRBinaryOperation(
+            left=IRAttribute(variable='p', fields='x', version=0),
+            operator=IRMultiplication(),
+            right=IRConstant(value=2.0),
+        ), version=1),
+        IRAssign(identifier='a', expression=IRAttribute(variable='p', fields='y', version=0), version=2),
+        IRReturn(expression=IRBinaryOperation(
+            left=IRReference(variable='a', version=1),
+            operator=IRAddition(),
+            right=IRReference(variable='a', version=2),
+        )),
+    ]))
+    first, second, _ = graph._statements
+
+    assert output_of(graph).a is first
+    assert output_of(graph).b is second
+
+def test_read_of_parameter_after_its_redefinition_lowers_to_parameter():
+    graph = FunctionGraphTranspiler().visit(make_function([
+        IRAssign(identifier='p', expression=IRConstant(value=[ 1.0, 2.0 ]), version=1),
+        IRReturn(expression=IRBinaryOperation(
+            left=IRAttribute(variable='p', fields='x', version=0),
+            operator=IRAddition(),
+            right=IRAttribute(variable='p', fields='x', version=1),
+        )),
+    ]))
+    definition, _ = graph._statements
+
+    assert output_of(graph).a.from_node.__class__.__name__ == 'GetFloat2'
+    assert output_of(graph).b.from_node is definition
+
+def test_redefinition_between_identical_expressions(compile_sbs):
+    package = compile_sbs('''
+def f(p: vec2):
+    a = p.x * 2.0
+    a = p.y
+    c = p.x * 2.0
+    return c + a
+''')
+    graph, = package.content
+    output = output_of(graph)
+
+    assert isinstance(output.a, SBSSet) and isinstance(output.a.from_node, SBSMul)
+    assert isinstance(output.b, SBSSet) and isinstance(output.b.from_node, SBSSwizzle1)
+    assert output.b.from_node._0 == 1
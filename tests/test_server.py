@@ -0,0 +1,66 @@
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from py2xyz import server
+
+TOKEN = 'secret'
+
+@pytest.fixture
+def address():
+    compile_server = server.CompileServer(('127.0.0.1', 0), TOKEN)
+    thread = threading.Thread(target=compile_server.serve_until_shutdown)
+    thread.start()
+    host, port = compile_server.server_address
+    try:
+        yield host, port
+    finally:
+        server.request('/shutdown', { }, host=host, port=port, token=TOKEN)
+        thread.join()
+        compile_server.server_close()
+
+def test_requests_require_the_token(address):
+    host, port = address
+    assert server.request('/status', host=host, port=port, token=TOKEN)['version']
+
+    for token in ( None, 'guess' ):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            server.request('/compile', { 'source': '' }, host=host, port=port, token=token)
+        assert e.value.code == 403
+
+def test_post_requests_must_be_json(address):
+    host, port = address
+    http_request = urllib.request.Request(
+        f'http://{host}:{port}/compile',
+        data=json.dumps({ 'source': '' }).encode('utf-8'),
+        headers={ 'Content-Type': 'text/plain', 'Authorization': f'Bearer {TOKEN}' },
+    )
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(http_request)
+    assert e.value.code == 415
+
+def test_compile_returns_the_ir(address):
+    host, port = address
+    response = server.request('/compile', { 'source': 'def f(p: float):\n    return p * 2.0\n' }, host=host, port=port, token=TOKEN)
+    assert response['status'] == 0
+    assert 'Multiplication' in response['dump']
+
+def test_run_restores_logger_levels(address, tmp_path):
+    host, port = address
+    level = logging.getLogger('py2xyz').level
+
+    response = server.request('/run', { 'argv': [ '-v', '--no-cache', str(tmp_path / 'missing.py') ], 'cwd': str(tmp_path) }, host=host, port=port, token=TOKEN)
+
+    assert response['status'] != 0
+    assert logging.getLogger('py2xyz').level == level
+
+def test_token_is_private_to_its_owner(tmp_path):
+    path = tmp_path / 'settings' / 'server.token'
+    token = server.write_token(path)
+    assert server.read_token(path) == token
+    assert (path.stat().st_mode & 0o777) == 0o600
+    assert server.write_token(path) != token